@@ -7,12 +7,25 @@
 #----------------------------------------------------------------------------
 from __future__ import print_function, division
 
+from bisect import bisect_left
 from collections import namedtuple
-from math import sqrt, trunc
+from math import sqrt, trunc, ceil, floor
+import copy
+
+# numpy is only needed for the batch simulation API (shipStates, simulate_batch)
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 StateVec = namedtuple('StateVec', 'phase distTraveled currVelocity fuelRemaining tEnd')
 
+# Results of the inverse solver (see DockSim.feasibleRegion() and DockSim.solve())
+BurnWindow = namedtuple('BurnWindow', 'tAft tForeMin tForeMax tCoastMin tCoastMax')
+Solution   = namedtuple('Solution', 'tAft tCoast tFore fuelUsed duration velocity')
+Solutions  = namedtuple('Solutions', 'minFuel minTime')
+
 #----------------------------------------------------------------------------
 class FlightParams(object):
     """ An object to hold the flight profile parameters
@@ -47,6 +60,16 @@ class FlightParams(object):
         self.vMax   = vMax
         self.vInit  = vInit
         self.tSim   = int(tSim)
+    
+    def key(self):
+        """ Return the normalized parameters as a hashable tuple.
+        
+            Two FlightParams with the same key produce the same simulation,
+            so the key can be used to cache results.
+        """
+        return (self.tAft, self.tCoast, self.tFore, self.aAft, self.aFore,
+                self.rFuel, self.qFuel, self.dist, self.vMin, self.vMax,
+                self.vInit, self.tSim)
 
 #----------------------------------------------------------------------------
 class DockSim(object):
@@ -64,6 +87,10 @@ class DockSim(object):
     # (TODO: should come from MS Settings table)
     MAX_FLIGHT_DURATION_S = 1000 * 60  # 1000 minutes
     
+    # Largest user time (tAft, tCoast, tFore) allowed by the ddd.d format,
+    # in tenths of a second
+    MAX_USER_TENTHS = 9999
+    
     # Flight phases
     START_PHASE = 0
     ACCEL_PHASE = 1
@@ -124,6 +151,42 @@ class DockSim(object):
             raise ValueError("Fore thruster (nose maneuvering jets) acceleration must be greater than 0")
         if self.aAft <= 0.0:
             raise ValueError("Aft thruster (rear engine) acceleration must be greater than 0")
+        
+        # Precompute the state at each phase breakpoint so shipState() does
+        # not have to replay the whole flight from t=0 on every call
+        self.buildPhaseTable()
+    
+    def buildPhaseTable(self):
+        """ Precompute the ship state at the start of each flight phase.
+        
+            Runs the phase sequence once, computing each phase up to its
+            ending time, and stores the resulting StateVec for each phase
+            breakpoint in self._phaseStates.  self._phaseStarts holds the
+            time each successive phase begins, as a running maximum so that it
+            stays sorted (and searchable) even if a user time is negative.
+            The table stops early if the flight ends (dest reached or DNF)
+            before all of the phases have run.
+            
+            Call this again if any of the flight parameters are changed after
+            the DockSim is constructed.
+        """
+        stateVec = StateVec(phase=self.START_PHASE,
+                            distTraveled=0.0,
+                            currVelocity=self.v0,
+                            fuelRemaining=self.qFuel,
+                            tEnd=0.0)
+        
+        # The ending time of each flight phase (accel, coast, decel)
+        phaseTimes = [self.tAft, self.tAft + self.tCoast, self.tAft + self.tCoast + self.tFore]
+        
+        self._phaseStarts = []
+        self._phaseStates = [stateVec]
+        for tPhase in phaseTimes:
+            self._phaseStarts.append(max([tPhase] + self._phaseStarts[-1:]))
+            if stateVec.phase == self.END_PHASE:
+                continue
+            stateVec = self.computePhase(tPhase, stateVec)
+            self._phaseStates.append(stateVec)
     
     def outcome(self, state):
         """ Determine the nature of the failure from the final state """
@@ -462,28 +525,548 @@ class DockSim(object):
         """ Return ship state vector for time t.
             t is time in seconds since the start of the maneuver.
             Returns a StateVec containing (phase, distTraveled, currVelocity, fuelRemaining, tEnd)
+            
+            Looks up the last phase breakpoint at or before t in the table
+            built by buildPhaseTable(), then computes the remaining partial
+            phase in a single step.
         """
-        # Create initial stateVec
-        stateVec = StateVec(phase=self.START_PHASE,
-                            distTraveled=0.0,
-                            currVelocity=self.v0,
-                            fuelRemaining=self.qFuel,
-                            tEnd=0.0)
+        # Number of phases that end before t
+        nPhases = bisect_left(self._phaseStarts, t)
+        
+        # If the flight ended during one of those phases, the state is frozen
+        lastState = self._phaseStates[-1]
+        if nPhases >= len(self._phaseStates) - 1 and lastState.phase == self.END_PHASE:
+            return lastState
+        
+        # Compute the final time segment from the start of the current phase
+        return self.computePhase(t, self._phaseStates[nPhases])
+    
+    def shipStates(self, times):
+        """ Return ship state vectors for an array of times.
+            times is a sequence or numpy array of times in seconds since the
+            start of the maneuver.
+            Returns a numpy structured array of STATE_DTYPE, with one element
+            per time.  Each element holds the same values shipState() would
+            return for that time.
+            
+            Raises ImportError if numpy is not installed.
+        """
+        _requireNumpy()
+        times = np.asarray(times, dtype=np.float64)
+        params = np.empty(times.shape, dtype=FLIGHT_PARAMS_DTYPE)
+        params["tAft"]   = self.tAft
+        params["tCoast"] = self.tCoast
+        params["tFore"]  = self.tFore
+        params["aAft"]   = self.aAft
+        params["aFore"]  = self.aFore
+        params["rFuel"]  = self.rFuel
+        params["qFuel"]  = self.qFuel
+        params["dist"]   = self.dist
+        params["vMin"]   = self.vMin
+        params["vMax"]   = self.vMax
+        params["vInit"]  = self.v0
+        params["tSim"]   = 0
+        return _shipStateArrays(params.ravel(), times.ravel()).reshape(times.shape)
 
-        # Create an array containing the ending time of each flight phase (accel, coast, decel)
-        phaseTimes = [self.tAft, self.tAft + self.tCoast, self.tAft + self.tCoast + self.tFore]
+
+    #------------------------------------------------------------------------
+    # Inverse solver
+    #
+    # The user times are quantized to 0.1 sec (see FlightParams), so the
+    # solver works in integer tenths of a second and reports times of the
+    # form k/10.0.  The boundaries are computed analytically, then checked
+    # with the forward simulation so they agree exactly with outcome().
+    #------------------------------------------------------------------------
+    def _trial(self, tAft, tCoast, tFore):
+        """ Return a copy of this DockSim with different user times """
+        trial = copy.copy(self)
+        trial.tAft, trial.tCoast, trial.tFore = tAft, tCoast, tFore
+        trial.buildPhaseTable()
+        return trial
+    
+    def _docks(self, tAft, tCoast, tFore):
+        """ Return True if the user times produce OUTCOME_SUCCESS """
+        trial = self._trial(tAft, tCoast, tFore)
+        return trial.outcome(trial.shipState(self.MAX_FLIGHT_DURATION_S)) == self.OUTCOME_SUCCESS
+    
+    def _solution(self, tAft, tCoast, tFore):
+        """ Return a Solution for the user times, or None if they do not dock """
+        trial = self._trial(tAft, tCoast, tFore)
+        finalState = trial.shipState(self.MAX_FLIGHT_DURATION_S)
+        if trial.outcome(finalState) != self.OUTCOME_SUCCESS:
+            return None
+        return Solution(tAft, tCoast, tFore,
+                        self.qFuel - finalState.fuelRemaining,
+                        finalState.tEnd,
+                        finalState.currVelocity)
+    
+    @classmethod
+    def _ceilTenths(cls, t):
+        """ Round a time up to a whole number of tenths, within the user range """
+        return min(cls.MAX_USER_TENTHS, max(0, int(ceil(t * 10 - 1e-6))))
+    
+    @classmethod
+    def _floorTenths(cls, t):
+        """ Round a time down to a whole number of tenths, within the user range """
+        return min(cls.MAX_USER_TENTHS, max(0, int(floor(t * 10 + 1e-6))))
+    
+    def coastWindow(self, tAft, tFore):
+        """ Return the range of coast times that dock successfully.
         
-        # Sequentially calculate the flight phases until the simulation state reaches END_PHASE
-        while stateVec.phase != self.END_PHASE:
-            if phaseTimes and t > phaseTimes[0]:
-                stateVec = self.computePhase(phaseTimes[0], stateVec)
-                phaseTimes = phaseTimes[1:]
-            else:
-                # Compute the final time segment
-                stateVec = self.computePhase(t, stateVec)
+            tAft and tFore are the burn durations, in seconds.
+            
+            Returns (tCoastMin, tCoastMax), in seconds, or None if no coast
+            time results in OUTCOME_SUCCESS.  Every coast time in the range
+            (in 0.1 sec steps) docks successfully.
+        """
+        maxCoast = self.MAX_USER_TENTHS/10.0
+        
+        # Use the simulation's own interval computation for the burns, so that
+        # running out of fuel is handled exactly as the forward simulation does
+        d1,v1,fuel1,_,status = self.computeTravelInterval(tAft, self.v0, self.aAft, self.dist, self.qFuel)
+        
+        # If the ship docks under acceleration, or the fuel is used up, the
+        # coast time makes no difference
+        if status == self.INTERVAL_DEST or tAft >= self.timeUntilFuelRunsOut(self.qFuel):
+            return (0.0, maxCoast) if self._docks(tAft, 0.0, tFore) else None
+        if v1 <= 0.0:
+            return None
+        
+        # Collect the ranges of r, the distance remaining when the decel burn
+        # starts, that result in a successful dock.  The terminal velocity
+        # never decreases as r decreases (i.e., as the coast time increases),
+        # so the ranges are contiguous.
+        ranges = []
+        
+        # Dock before the decel burn starts
+        if self.safeDockingVelocity(v1):
+            ranges.append((float("-inf"), 0.0))
+        
+        # Complete the decel burn (or run out of fuel), then glide in
+        rDecel,v3,fuel3,_,status = self.computeTravelInterval(tFore, v1, -self.aFore, float("inf"), fuel1)
+        glide = StateVec(self.GLIDE_PHASE, 0.0, v3, fuel3, 0.0)
+        if status != self.INTERVAL_DNF and self.outcome(glide) == self.OUTCOME_SUCCESS:
+            ranges.append((rDecel, float("inf")))
+        
+        # Dock during the decel burn, with v**2 = v1**2 - 2 * aFore * r
+        rLo = max(0.0, (v1**2 - self.vMax**2)/(2.0 * self.aFore))
+        rHi = min(rDecel, (v1**2 - self.vMin**2)/(2.0 * self.aFore))
+        if rLo <= rHi:
+            ranges.append((rLo, rHi))
+        
+        if not ranges:
+            return None
+        
+        # Convert to coast times, in tenths
+        rMin = min(r[0] for r in ranges)
+        rMax = max(r[1] for r in ranges)
+        # (r above the distance left means no coasting; below zero means
+        # docking before the decel burn, with no upper limit)
+        coastMax = maxCoast if rMin < 0.0 else (self.dist - d1 - rMin)/v1
+        if coastMax < 0.0:
+            return None
+        lo = self._ceilTenths(max(0.0, (self.dist - d1 - min(rMax, self.dist))/v1))
+        hi = self._floorTenths(min(coastMax, maxCoast))
+        
+        # Nudge the ends inward until the forward simulation agrees
+        for _ in range(3):
+            if lo > hi or self._docks(tAft, lo/10.0, tFore):
+                break
+            lo += 1
+        for _ in range(3):
+            if lo > hi or self._docks(tAft, hi/10.0, tFore):
                 break
+            hi -= 1
+        if lo > hi or not self._docks(tAft, lo/10.0, tFore) or not self._docks(tAft, hi/10.0, tFore):
+            return None
+        return (lo/10.0, hi/10.0)
+    
+    def feasibleRegion(self, tAft=None):
+        """ Return the set of user times that dock successfully.
+        
+            tAft is an acceleration burn duration in seconds.  If it is None,
+            every tAft (in 0.1 sec steps) up to the point where the fuel runs
+            out or the ship docks under acceleration is included; longer tAft
+            fly the same as the last one.
+            
+            Returns a list of BurnWindow(tAft, tForeMin, tForeMax, tCoastMin,
+            tCoastMax).  Each BurnWindow says that for the given tAft, every
+            tFore from tForeMin to tForeMax docks successfully with every
+            tCoast from tCoastMin to tCoastMax.  The capsule parameters
+            (aAft, aFore, rFuel, qFuel, dist, vMin, vMax, vInit) are taken
+            from this DockSim; its own user times are ignored.
+        """
+        if tAft is not None:
+            aftTenths = [self._floorTenths(tAft)]
+        else:
+            # All of the tAft longer than the fuel supply, or longer than the
+            # time to dock under acceleration, fly the same
+            tLast = self.timeUntilFuelRunsOut(self.qFuel)
+            tArrive = self.timeToTravel(self.dist, self.v0, self.aAft)
+            if tArrive is not None and tArrive >= 0.0:
+                tLast = min(tLast, tArrive)
+            aftTenths = range(self._ceilTenths(tLast) + 1)
+        
+        windows = []
+        for kAft in aftTenths:
+            tA = kAft/10.0
+            d1,v1,fuel1,_,status = self.computeTravelInterval(tA, self.v0, self.aAft, self.dist, self.qFuel)
+            
+            # Once tFore is long enough to stop the ship (or use up the fuel),
+            # a longer burn makes no difference, so the last window extends
+            # to the maximum tFore
+            if status == self.INTERVAL_DEST or v1 <= 0.0:
+                foreCap = 0
+            else:
+                foreCap = self._ceilTenths(min(v1/self.aFore, self.timeUntilFuelRunsOut(fuel1)))
+            
+            run = None  # [kForeMin, kForeMax, window]
+            for kFore in range(foreCap + 1):
+                window = self.coastWindow(tA, kFore/10.0)
+                if run and run[2] == window:
+                    run[1] = kFore
+                    continue
+                if run and run[2]:
+                    windows.append(BurnWindow(tA, run[0]/10.0, run[1]/10.0, run[2][0], run[2][1]))
+                run = [kFore, kFore, window]
+            if run and run[2]:
+                windows.append(BurnWindow(tA, run[0]/10.0, self.MAX_USER_TENTHS/10.0, run[2][0], run[2][1]))
+        return windows
+    
+    def _solutionsForAft(self, tAft):
+        """ Return the candidate Solutions for a tAft.
+        
+            For each of the interesting decel burns (the shortest one that
+            glides in, and one long enough to dock during the burn), the
+            shortest and longest coast times are tried.
+        """
+        v1 = self.velocity(tAft, self.v0, self.aAft)
+        kGlide = self._ceilTenths((v1 - self.vMax)/self.aFore)
+        foreTenths = set((kGlide, kGlide + 1, self._ceilTenths(v1/self.aFore)))
+        
+        solutions = []
+        for kFore in sorted(foreTenths):
+            window = self.coastWindow(tAft, kFore/10.0)
+            if window:
+                for tCoast in window:
+                    solutions.append(self._solution(tAft, tCoast, kFore/10.0))
+        return [sol for sol in solutions if sol]
+    
+    def minFuelSolution(self):
+        """ Return the Solution that uses the least fuel, or None if no
+            flight profile can dock successfully.
+            
+            Any successful dock has to reach vMin, so the shortest tAft that
+            does so uses the least fuel (decelerating only burns more).
+        """
+        kAft = self._ceilTenths((self.vMin - self.v0)/self.aAft)
+        solutions = self._solutionsForAft(kAft/10.0) + self._solutionsForAft((kAft + 1)/10.0)
+        if not solutions:
+            return None
+        return min(solutions, key=lambda sol: (sol.fuelUsed, sol.duration))
+    
+    def minTimeSolution(self, searchTenths=2):
+        """ Return the Solution that docks soonest, or None if no flight
+            profile can dock successfully.
             
-        return stateVec
+            The fastest flight accelerates to a peak velocity v1, coasts, and
+            decelerates to arrive at vMax.  Flight time decreases as v1
+            increases, until either there is no coasting left or the burns use
+            all of the fuel.  The 0.1 sec user times around that peak (within
+            searchTenths) are checked with the forward simulation.
+        """
+        k = 1.0/(2.0 * self.aAft) + 1.0/(2.0 * self.aFore)
+        vPeak = sqrt((self.dist + self.v0**2/(2.0 * self.aAft) + self.vMax**2/(2.0 * self.aFore))/k)
+        tFuel = self.timeUntilFuelRunsOut(self.qFuel)
+        vFuel = (tFuel + self.v0/self.aAft + self.vMax/self.aFore)/(2.0 * k)
+        v1 = max(self.v0, min(vPeak, vFuel))
+        kAft = self._floorTenths((v1 - self.v0)/self.aAft)
+        
+        solutions = []
+        for kA in range(max(0, kAft - searchTenths), kAft + searchTenths + 2):
+            solutions += self._solutionsForAft(kA/10.0)
+        if not solutions:
+            return None
+        return min(solutions, key=lambda sol: (sol.duration, sol.fuelUsed))
+    
+    def solve(self):
+        """ Return Solutions(minFuel, minTime) for the capsule parameters.
+            Either is None if no flight profile can dock successfully.
+        """
+        return Solutions(self.minFuelSolution(), self.minTimeSolution())
+    
+    def isFeasible(self):
+        """ Return True if any flight profile can dock successfully """
+        return self.minFuelSolution() is not None
+
+#----------------------------------------------------------------------------
+# Batch (numpy) simulation
+#
+# These functions evaluate many (flight profile, time) pairs at once.  Each
+# one mirrors the corresponding scalar DockSim method operation for
+# operation, so that the results are bit-identical to the scalar path.
+#----------------------------------------------------------------------------
+
+# Fields of a structured array of flight profiles (see FlightParams)
+FLIGHT_PARAMS_DTYPE = [("tAft", "f8"), ("tCoast", "f8"), ("tFore", "f8"),
+                       ("aAft", "f8"), ("aFore", "f8"), ("rFuel", "f8"),
+                       ("qFuel", "f8"), ("dist", "f8"), ("vMin", "f8"),
+                       ("vMax", "f8"), ("vInit", "f8"), ("tSim", "i8")]
+
+# Fields of a structured array of ship states (see StateVec)
+STATE_DTYPE = [("phase", "i1"), ("distTraveled", "f8"), ("currVelocity", "f8"),
+               ("fuelRemaining", "f8"), ("tEnd", "f8")]
+
+# Fields of a structured array of simulation results (see simulate_batch)
+RESULT_DTYPE = STATE_DTYPE + [("outcome", "U16"), ("flightDuration", "f8"),
+                              ("success", "?")]
+
+def _requireNumpy():
+    """ Raise ImportError if numpy is not available """
+    if np is None:
+        raise ImportError("numpy is required for batch simulation")
+
+def flightParamsArray(profiles):
+    """ Convert a sequence of FlightParams to a structured array.
+        If profiles is already an array of FLIGHT_PARAMS_DTYPE it is returned
+        unchanged.
+    """
+    _requireNumpy()
+    if isinstance(profiles, np.ndarray) and profiles.dtype.names:
+        return profiles
+    params = np.empty(len(profiles), dtype=FLIGHT_PARAMS_DTYPE)
+    for i, fp in enumerate(profiles):
+        params[i] = (fp.tAft, fp.tCoast, fp.tFore, fp.aAft, fp.aFore, fp.rFuel,
+                     fp.qFuel, fp.dist, fp.vMin, fp.vMax, fp.vInit, fp.tSim)
+    return params
+
+def _validateParams(params):
+    """ Apply the DockSim constructor validation to every profile """
+    checks = (("rFuel", "Fuel consumption rate must be greater than 0 if you hope to get anywhere"),
+              ("qFuel", "Fuel quantity must be greater than 0 if you hope to get anywhere"),
+              ("dist",  "Distance to travel must be greater than 0"),
+              ("aFore", "Fore thruster (nose maneuvering jets) acceleration must be greater than 0"),
+              ("aAft",  "Aft thruster (rear engine) acceleration must be greater than 0"))
+    for field, msg in checks:
+        bad = np.flatnonzero(params[field] <= 0.0)
+        if bad.size:
+            raise ValueError("{} (profile {})".format(msg, bad[0]))
+
+def _noThrustTravelArrays(dt, v0, distToDest, qFuel):
+    """ Array version of DockSim.computeNoThrustTravelInterval() """
+    n = len(dt)
+    d = np.zeros(n)
+    tRemaining = dt.copy()
+    status = np.full(n, DockSim.INTERVAL_END, dtype=np.int8)
+    
+    # Are we there already?
+    there = distToDest <= 0.0
+    status[there] = DockSim.INTERVAL_DEST
+    
+    # The destination will never be reached if the velocity is 0
+    stopped = ~there & (v0 == 0.0)
+    status[stopped] = DockSim.INTERVAL_DNF
+    
+    moving = ~(there | stopped)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tDest = distToDest/v0
+    
+    # Destination was reached within this time interval
+    reached = moving & (tDest < dt)
+    d[reached] = distToDest[reached]
+    tRemaining[reached] = dt[reached] - tDest[reached]
+    status[reached] = DockSim.INTERVAL_DEST
+    
+    # Reached end of time interval before reaching dest
+    ended = moving & ~reached
+    d[ended] = (v0[ended] + 0.5 * 0.0 * dt[ended]) * dt[ended]
+    tRemaining[ended] = 0.0
+    
+    return d, v0.copy(), qFuel.copy(), tRemaining, status
+
+def _travelIntervalArrays(dt, v0, a, distToDest, qFuel, rFuel):
+    """ Array version of DockSim.computeTravelInterval() """
+    n = len(dt)
+    d = np.zeros(n)
+    v = v0.copy()
+    fuel = qFuel.copy()
+    tRemaining = dt.copy()
+    status = np.full(n, DockSim.INTERVAL_END, dtype=np.int8)
+    
+    # Already at (or past) dest, or no time in the interval
+    there = distToDest <= 0.0
+    status[there] = DockSim.INTERVAL_DEST
+    done = there | (dt <= 0.0)
+    if np.any(~done & (v0 < 0.0)):
+        raise ValueError("v0 must be >= 0.0")
+    
+    # No acceleration or deceleration
+    coast = np.flatnonzero(~done & (a == 0.0))
+    if coast.size:
+        cd, cv, cq, ct, cs = _noThrustTravelArrays(dt[coast], v0[coast], distToDest[coast], qFuel[coast])
+        d[coast], v[coast], fuel[coast], tRemaining[coast], status[coast] = cd, cv, cq, ct, cs
+    
+    burn = np.flatnonzero(~done & (a != 0.0))
+    if not burn.size:
+        return d, v, fuel, tRemaining, status
+    
+    dt, v0, a, distToDest, qFuel, rFuel = dt[burn], v0[burn], a[burn], distToDest[burn], qFuel[burn], rFuel[burn]
+    bd, bv, bq, bt = np.zeros(len(burn)), np.empty(len(burn)), np.empty(len(burn)), np.empty(len(burn))
+    bs = np.full(len(burn), DockSim.INTERVAL_END, dtype=np.int8)
+    
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Time until fuel runs out, and until velocity goes to 0
+        tFuel = qFuel/rFuel
+        tStop = np.where(a < 0.0, -v0/a, DockSim.MAX_FLIGHT_DURATION_S)
+        tAccel = np.minimum(tFuel, tStop)
+        distTraveled = (v0 + 0.5 * a * tAccel) * tAccel
+        
+        # Dest reached while the engines are firing
+        arrive = distTraveled >= distToDest
+        disc = v0**2 - 2.0 * a * (-distToDest)
+        tArrive = np.where(disc < 0.0,
+                           v0/a,
+                           (-v0 + np.sqrt(np.where(disc < 0.0, 0.0, disc))) / a)
+        tAccel = np.where(arrive, tArrive, tAccel)
+    
+    # End of the interval occurs while still accelerating
+    accel = dt < tAccel
+    bd[accel] = (v0[accel] + 0.5 * a[accel] * dt[accel]) * dt[accel]
+    bv[accel] = v0[accel] + a[accel] * dt[accel]
+    bq[accel] = qFuel[accel] - dt[accel] * rFuel[accel]
+    bt[accel] = 0.0
+    
+    # Velocity went to zero before fuel ran out
+    dnf = ~accel & (tAccel == tStop)
+    bd[dnf] = (v0[dnf] + 0.5 * a[dnf] * tStop[dnf]) * tStop[dnf]
+    bv[dnf] = 0.0
+    bq[dnf] = qFuel[dnf] - tStop[dnf] * rFuel[dnf]
+    bt[dnf] = dt[dnf] - tStop[dnf]
+    bs[dnf] = DockSim.INTERVAL_DNF
+    
+    # Dest reached or fuel ran out, continue at constant velocity
+    rest = np.flatnonzero(~(accel | dnf))
+    if rest.size:
+        ta = tAccel[rest]
+        dAccel = (v0[rest] + 0.5 * a[rest] * ta) * ta
+        cd, cv, cq, ct, cs = _noThrustTravelArrays(dt[rest] - ta,
+                                                   v0[rest] + a[rest] * ta,
+                                                   distToDest[rest] - dAccel,
+                                                   np.where(tFuel[rest] < ta, 0.0, qFuel[rest] - ta * rFuel[rest]))
+        bd[rest], bv[rest], bq[rest], bt[rest], bs[rest] = dAccel + cd, cv, cq, ct, cs
+    
+    d[burn], v[burn], fuel[burn], tRemaining[burn], status[burn] = bd, bv, bq, bt, bs
+    return d, v, fuel, tRemaining, status
+
+def _computePhaseArrays(t, state, params):
+    """ Array version of DockSim.computePhase().  Updates state in place. """
+    phase = np.minimum(state["phase"] + 1, DockSim.END_PHASE).astype(np.int8)
+    accel = np.zeros(len(t))
+    accel[phase == DockSim.ACCEL_PHASE] = params["aAft"][phase == DockSim.ACCEL_PHASE]
+    accel[phase == DockSim.DECEL_PHASE] = -params["aFore"][phase == DockSim.DECEL_PHASE]
+    dt = t - state["tEnd"]
+    distRemaining = params["dist"] - state["distTraveled"]
+    
+    d, v, fuelRemaining, tRemaining, intervalStatus = _travelIntervalArrays(
+        dt, state["currVelocity"], accel, distRemaining, state["fuelRemaining"], params["rFuel"])
+    
+    phase[intervalStatus != DockSim.INTERVAL_END] = DockSim.END_PHASE
+    state["tEnd"] = state["tEnd"] + dt - tRemaining
+    state["phase"] = phase
+    state["distTraveled"] = d + state["distTraveled"]
+    state["currVelocity"] = v
+    state["fuelRemaining"] = fuelRemaining
+
+def _shipStateArrays(params, t):
+    """ Array version of DockSim.shipState().
+        params is a 1-D array of FLIGHT_PARAMS_DTYPE and t is a 1-D array of
+        times of the same length.  Returns a 1-D array of STATE_DTYPE.
+    """
+    state = np.zeros(len(t), dtype=STATE_DTYPE)
+    state["phase"] = DockSim.START_PHASE
+    state["currVelocity"] = params["vInit"]
+    state["fuelRemaining"] = params["qFuel"]
+    
+    phaseTimes = [params["tAft"],
+                  params["tAft"] + params["tCoast"],
+                  params["tAft"] + params["tCoast"] + params["tFore"]]
+    
+    # Step every profile through its flight phases together; a profile drops
+    # out once it reaches its requested time or the END_PHASE
+    active = np.arange(len(t))
+    for tPhase in phaseTimes + [None]:
+        if not active.size:
+            break
+        tActive = t[active]
+        if tPhase is None:
+            more = np.zeros(len(active), dtype=bool)
+        else:
+            more = tActive > tPhase[active]
+            tActive = np.where(more, tPhase[active], tActive)
+        
+        s = state[active]
+        _computePhaseArrays(tActive, s, params[active])
+        state[active] = s
+        active = active[more & (s["phase"] != DockSim.END_PHASE)]
+    
+    return state
+
+def _outcomeArrays(state, params):
+    """ Array version of DockSim.outcome() """
+    v = state["currVelocity"]
+    return np.select([v <= 0.0,
+                      state["fuelRemaining"] <= 0.0,
+                      v < params["vMin"],
+                      v > params["vMax"]],
+                     [DockSim.OUTCOME_DNF,
+                      DockSim.OUTCOME_NO_FUEL,
+                      DockSim.OUTCOME_TOO_SLOW,
+                      DockSim.OUTCOME_TOO_FAST],
+                     DockSim.OUTCOME_SUCCESS)
+
+def simulate_batch(params_array):
+    """ Simulate many flight profiles at once.
+    
+        params_array is a sequence of FlightParams, or a structured array of
+        FLIGHT_PARAMS_DTYPE (see flightParamsArray()).
+        
+        Returns a structured array of RESULT_DTYPE, one element per profile:
+            phase .. tEnd   the final state, as shipState(MAX_FLIGHT_DURATION_S)
+            outcome         the outcome string, as outcome() of the final state
+            flightDuration  as flightDuration(), or NaN where that is None
+            success         as dockIsSuccessful(), or False where
+                            flightDuration() is None
+        
+        Raises ValueError if any profile would be rejected by DockSim(), and
+        ImportError if numpy is not installed.
+    """
+    params = flightParamsArray(params_array).ravel()
+    _validateParams(params)
+    n = len(params)
+    result = np.zeros(n, dtype=RESULT_DTYPE)
+    
+    # Final state and outcome
+    finalState = _shipStateArrays(params, np.full(n, float(DockSim.MAX_FLIGHT_DURATION_S)))
+    for field in finalState.dtype.names:
+        result[field] = finalState[field]
+    result["outcome"] = _outcomeArrays(finalState, params)
+    
+    # Flight duration: the end of the decel phase, plus any glide time
+    burnEnd = _shipStateArrays(params, params["tAft"] + params["tCoast"] + params["tFore"])
+    ended = burnEnd["phase"] == DockSim.END_PHASE
+    gliding = ~ended & (burnEnd["currVelocity"] > 0.0)
+    duration = np.full(n, np.nan)
+    duration[ended] = burnEnd["tEnd"][ended]
+    duration[gliding] = burnEnd["tEnd"][gliding] + \
+        (params["dist"][gliding] - burnEnd["distTraveled"][gliding]) / burnEnd["currVelocity"][gliding]
+    result["flightDuration"] = duration
+    
+    # Docking success from the terminal velocity
+    finished = np.flatnonzero(ended | gliding)
+    v = _shipStateArrays(params[finished], duration[finished])["currVelocity"]
+    result["success"][finished] = (v >= params["vMin"][finished]) & (v <= params["vMax"][finished])
+    
+    return result
 
 
 #----------------------------------------------------------------------------
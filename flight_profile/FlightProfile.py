@@ -14,6 +14,8 @@ import sys
 import os.path
 import math
 import itertools
+import time
+from array import array
 import pygame.sprite
 import pygame.image
 import pygame.font
@@ -38,6 +40,29 @@ class Colors(object):
     ORANGE  = (255, 128,   0)
     LIGHT_ORANGE = (255, 180,  52)
 
+#----------------------------------------------------------------------------
+class FontCache(object):
+    """ A process-wide cache of pygame Fonts.
+    
+        Creating a Font loads and parses the font file, so Text sprites share
+        one Font per (name, size) instead of each creating its own.
+    """
+    fonts = {}  # (name, size) -> Font
+    
+    @classmethod
+    def font(cls, name, size):
+        """ Return the Font for name and size, loading it the first time """
+        key = (name, size)
+        font = cls.fonts.get(key)
+        if font is None:
+            font = cls.fonts[key] = pygame.font.Font(name, size)
+        return font
+    
+    @classmethod
+    def clear(cls):
+        """ Discard all cached fonts (call before pygame.font.quit()) """
+        cls.fonts.clear()
+
 #----------------------------------------------------------------------------
 class Text(pygame.sprite.DirtySprite):
     """ A displayable text object """
@@ -60,7 +85,7 @@ class Text(pygame.sprite.DirtySprite):
         self.pos = pt
         self.pointSize = size
         self.fontName = font
-        self.font = pygame.font.Font(font, self.pointSize)
+        self.font = FontCache.font(font, self.pointSize)
         self.justify = justify
         self.color = color
         self.image = None # required by sprite.draw()
@@ -84,6 +109,8 @@ class Text(pygame.sprite.DirtySprite):
     
     def setValue(self, value, color=None):
         """ Set the text string value, and optionally set the color """
+        if value == self._value and (not color or color == self.color) and self.image:
+            return  # unchanged, so keep the current image
         self._value = value
         if color:
             self.color = color
@@ -95,7 +122,7 @@ class Text(pygame.sprite.DirtySprite):
             if self.shrinkToWidth == 0 or textWidth <= self.shrinkToWidth:
                 break
             self.pointSize = int(self.pointSize * self.shrinkToWidth/textWidth)
-            self.font = pygame.font.Font(self.fontName, self.pointSize)
+            self.font = FontCache.font(self.fontName, self.pointSize)
         self.image = self.font.render(self._value, True, self.color)
         #print("Text.value: '{}'".format(self._value))
 
@@ -122,7 +149,7 @@ class Text(pygame.sprite.DirtySprite):
         t = pygame.time.get_ticks()
         while t >= self.toggleTimeMs:
             self.visible = (self.visible + 1) % 2  # toggle between 0 and 1
-            self.dirty = self.visible + 1  # set to 2 (always dirty) when visible
+            self.dirty = 1
             self.toggleTimeMs = t + next(self.intervalsMs)
     
 #----------------------------------------------------------------------------
@@ -184,8 +211,17 @@ class Clock(Text):
     def setValue(self, value=None):
         """ Set the value of the clock in seconds
         """
+        super(Clock, self).setValue(self.format(value))
+    
+    def setText(self, text):
+        """ Set the clock to a string already produced by format() """
+        super(Clock, self).setValue(text)
+    
+    @staticmethod
+    def format(value):
+        """ Return the clock display string for a time in seconds """
         tSeconds = float(value)
-        super(Clock, self).setValue("{:02d}:{:02d}:{:02d}.{:02d}".format(int(tSeconds//3600), int((tSeconds%3600)//60), int(tSeconds%60), int((tSeconds%1) * 100)))
+        return "{:02d}:{:02d}:{:02d}.{:02d}".format(int(tSeconds//3600), int((tSeconds%3600)//60), int(tSeconds%60), int((tSeconds%1) * 100))
 
 
 #----------------------------------------------------------------------------
@@ -291,7 +327,9 @@ class QrImgObj(ImgObj):
         # Return a PIL image object
         img = qr.make_image().convert("RGB")
 #         img = qrcode.make(qrText).convert("RGB")
-        return pygame.image.fromstring(img.tostring(), img.size, img.mode)
+        # (newer versions of PIL renamed tostring() to tobytes())
+        data = img.tobytes() if hasattr(img, "tobytes") else img.tostring()
+        return pygame.image.fromstring(data, img.size, img.mode)
         
 #----------------------------------------------------------------------------
 class AnimGroup(pygame.sprite.LayeredDirty):
@@ -301,7 +339,7 @@ class AnimGroup(pygame.sprite.LayeredDirty):
     """
 
     def __init__(self):
-        self.sequences = []  # list of iterators; each iterator sequences through a list of sprites
+        self.sequences = []  # [iterator, visible sprite] pairs; each iterator cycles through a list of sprites
         super(AnimGroup, self).__init__()
     
     def add(self, seq=None):
@@ -314,34 +352,231 @@ class AnimGroup(pygame.sprite.LayeredDirty):
                 s.visible = 0
             
             # Add an iterator that cycles through the sequence
-            self.sequences.append(itertools.cycle(seq))
+            self.sequences.append([itertools.cycle(seq), None])
             super(AnimGroup, self).add(*seq)
     
-    def draw(self, surface):
-        """ Activate the next image in each sequence and draw. """
-        visibleSprites = []
-        
-        # Make the next sprite in each sequence visible
+    def advance(self):
+        """ Make the next image in each sequence the visible one """
         for s in self.sequences:
-            sp = next(s)
-            sp.visible = 1
-            sp.dirty = 1
-            visibleSprites.append(sp)
-        
-        # Draw the visible sprites
-        rects = super(AnimGroup, self).draw(surface)
-        
-        # Make them invisible again
-        for sp in visibleSprites:
-            sp.visible = 0
-        
-        return rects
+            if s[1] is not None:
+                s[1].visible = 0
+            s[1] = next(s[0])
+            s[1].visible = 1
     
     def empty(self):
         """ Clear the list of sprite iterators """
         super(AnimGroup, self).empty()
         self.sequences = []
 
+#----------------------------------------------------------------------------
+def mergeRects(rects):
+    """ Replace rects that overlap with the Rect that bounds them.
+        Returns a list of Rects, none of which overlap, with the empty
+        ones left out.
+    """
+    merged = []
+    for r in rects:
+        if r.w <= 0 or r.h <= 0:
+            continue
+        r = pygame.Rect(r)
+        i = r.collidelist(merged)
+        while i >= 0:
+            r.union_ip(merged.pop(i))
+            i = r.collidelist(merged)
+        merged.append(r)
+    return merged
+
+#----------------------------------------------------------------------------
+class Compositor(object):
+    """ Draws a scene by only redrawing the parts of the screen that changed.
+    
+        The static sprites (background, labels, QR codes, and station) are
+        drawn once into a background Surface, which is redrawn only when
+        the static group changes.  The other sprites are compared with how
+        they were drawn the last time: a sprite that moved, changed its
+        image, was hidden, shown, removed, or marked dirty invalidates the
+        area it covered and the area it covers now.  Those areas are
+        restored from the background, the sprites that overlap them are
+        redrawn in order, and only those areas are sent to the display.
+    """
+    
+    def __init__(self):
+        self.canvas = None
+        self.background = None
+        self.staticKey = None
+        self.drawn = {}  # sprite -> (rect, image) for each sprite on the screen
+        
+        # What the last draw() sent to the display
+        self.rectsPushed = 0
+        self.pixelsPushed = 0
+        self.fullRedraw = False
+    
+    def invalidate(self):
+        """ Redraw the whole screen on the next draw() """
+        self.staticKey = None
+    
+    @staticmethod
+    def staticKeyOf(staticGroup):
+        """ Return a value that changes when the static group looks different """
+        return [(sp, sp.image, tuple(sp.rect)) for sp in staticGroup.sprites()]
+    
+    def draw(self, canvas, staticGroup, groups):
+        """ Bring canvas and the display up to date.
+        
+            staticGroup is drawn as the background, and groups are drawn
+            over it in order.
+            
+            Returns:
+                The list of Rects sent to the display
+        """
+        sprites = [sp for g in groups for sp in g.sprites()]
+        screen = canvas.get_rect()
+        
+        drawn = {}
+        for sp in sprites:
+            if getattr(sp, "visible", 1) and sp.image:
+                drawn[sp] = (pygame.Rect(sp.rect), sp.image)
+        
+        staticKey = self.staticKeyOf(staticGroup)
+        self.fullRedraw = canvas is not self.canvas or staticKey != self.staticKey
+        if self.fullRedraw:
+            self.canvas = canvas
+            self.staticKey = staticKey
+            self.background = pygame.Surface(canvas.get_size(), 0, canvas)
+            staticGroup.draw(self.background)
+            canvas.blit(self.background, (0, 0))
+            dirty = [screen]
+            for sp in sprites:
+                if sp in drawn:
+                    canvas.blit(sp.image, sp.rect)
+        else:
+            # Find the areas to redraw
+            changed = []
+            for sp, last in self.drawn.items():
+                if drawn.get(sp) != last or getattr(sp, "dirty", 0):
+                    changed.append(last[0])
+            for sp, now in drawn.items():
+                if self.drawn.get(sp) != now or getattr(sp, "dirty", 0):
+                    changed.append(now[0])
+            dirty = mergeRects(r.clip(screen) for r in changed)
+            
+            # Erase them, and redraw the sprites that overlap them
+            for r in dirty:
+                canvas.blit(self.background, r, r)
+            for sp in sprites:
+                if sp in drawn:
+                    for r in dirty:
+                        clip = sp.rect.clip(r)
+                        if clip.w and clip.h:
+                            canvas.blit(sp.image, clip, clip.move(-sp.rect.x, -sp.rect.y))
+        
+        for sp in sprites:
+            if getattr(sp, "dirty", 0) == 1:
+                sp.dirty = 0
+        self.drawn = drawn
+        
+        if dirty:
+            pygame.display.update(dirty)
+        self.rectsPushed = len(dirty)
+        self.pixelsPushed = sum(r.w * r.h for r in dirty)
+        return dirty
+
+#----------------------------------------------------------------------------
+class PlaybackTrack(object):
+    """ The display values for every frame of a flight, computed in advance.
+    
+        Frame i shows the simulation at time i * missionTimeScale/frameRate,
+        so playing the track back at frameRate shows the whole flight in
+        simDuration seconds.  The last frame is the END_PHASE state.
+        
+        The numbers are kept in arrays, and the stats text is formatted
+        ahead of time, so showing a frame is just a lookup.
+    """
+    # Flame animations shown with each frame
+    NO_FLAME    = 0
+    REAR_FLAME  = 1
+    FRONT_FLAME = 2
+    
+    def __init__(self, dockSim, profile, missionTimeScale, frameRate, pathStart, pathEnd):
+        self.frameRate = frameRate
+        self.missionTimeScale = missionTimeScale
+        
+        self.x = array('d')          # capsule pivot position
+        self.y = array('d')
+        self.phase = array('b')      # DockSim phase
+        self.flame = array('b')      # NO_FLAME, REAR_FLAME, or FRONT_FLAME
+        self.safeVelocity = array('b')  # velocity is within the docking limits
+        self.hasFuel = array('b')    # fuel remaining > 0
+        self.clocks = []             # (simulated, actual) Clock strings
+        self.stats = []              # (distance, velocity, vmax, acceleration, fuel, phase) strings
+        self.finalState = None
+        
+        # Step through the flight exactly as the display would, one frame at a time
+        maxVelocity = 0.0
+        outOfFuel = False
+        simPhase = DockSim.START_PHASE
+        flame = self.NO_FLAME
+        i = 0
+        while True:
+            t = i/frameRate * missionTimeScale
+            state = dockSim.shipState(t)
+            
+            maxVelocity = max(maxVelocity, state.currVelocity)
+            if state.currVelocity >= 0.01:
+                velocity = "{:0.2f} m/sec".format(state.currVelocity)
+            else:  # show more decimal places
+                velocity = "{:0.6f} m/sec".format(state.currVelocity)
+            accel = (0.0,
+                     profile.aAft if not outOfFuel else 0.0,
+                     0.0,
+                     -profile.aFore if not outOfFuel else 0.0,
+                     0.0,
+                     0.0)[state.phase]
+            self.clocks.append((Clock.format(state.tEnd/missionTimeScale), Clock.format(state.tEnd)))
+            self.stats.append(("{:0.2f} m".format(profile.dist - state.distTraveled),
+                               velocity,
+                               "{:0.2f} m/sec".format(maxVelocity),
+                               "{:0.2f} m/sec^2".format(accel),
+                               "{:0.2f} kg".format(state.fuelRemaining),
+                               DockSim.PHASE_STR[state.phase]))
+            self.safeVelocity.append(dockSim.safeDockingVelocity(state.currVelocity))
+            self.hasFuel.append(state.fuelRemaining > 0.0)
+            
+            # Update the flames when the phase changes or the fuel runs out
+            changeDetected = False
+            if not outOfFuel and state.fuelRemaining <= 0.0:
+                outOfFuel = True
+                changeDetected = True
+            if state.phase != simPhase:
+                simPhase = state.phase
+                changeDetected = True
+            if changeDetected:
+                flame = self.NO_FLAME
+                if state.phase == DockSim.ACCEL_PHASE and not outOfFuel:
+                    flame = self.REAR_FLAME
+                elif state.phase == DockSim.DECEL_PHASE and not outOfFuel:
+                    flame = self.FRONT_FLAME
+            self.flame.append(flame)
+            self.phase.append(state.phase)
+            
+            # Place the ship at the fraction of the total trip distance traveled
+            frac = state.distTraveled/profile.dist
+            self.x.append(float(pathEnd[0] - pathStart[0]) * frac + float(pathStart[0]))
+            self.y.append(float(pathEnd[1] - pathStart[1]) * frac + float(pathStart[1]))
+            
+            if state.phase == DockSim.END_PHASE or t >= DockSim.MAX_FLIGHT_DURATION_S:
+                self.finalState = state
+                break
+            i += 1
+    
+    def __len__(self):
+        return len(self.phase)
+    
+    def frameAt(self, tSec):
+        """ Return the frame index to show tSec seconds into the playback """
+        # (the small offset keeps tSec = i/frameRate from rounding down to i - 1)
+        return min(int(tSec * self.frameRate + 1e-6), len(self) - 1)
+
 #----------------------------------------------------------------------------
 class FlightProfileApp(object):
     """ The app reads and displays flight profile information from the Master Server.
@@ -430,17 +665,21 @@ class FlightProfileApp(object):
         self.dockUrl = ""
         self.latchUrl = ""
         
-        self.maxVelocity = 0.0
         self.simPhase = DockSim.START_PHASE
-        self.outOfFuel = False
+        self.track = None
+        self.flame = PlaybackTrack.NO_FLAME
+        self.passFailShown = False
         
         self.staticGroup = pygame.sprite.LayeredUpdates()
         self.statsGroup  = pygame.sprite.LayeredDirty()
         self.blinkingTextGroup = pygame.sprite.LayeredDirty()
         self.movingGroup = pygame.sprite.OrderedUpdates()
         self.animGroup   = AnimGroup()
+        self.compositor  = Compositor()
         
         self.workQueue = None  # work queue for multiprocess mode
+        self.channel = None    # RenderChannel for multiprocess mode
+        self.commandLatency = None  # reported with the first frame drawn for a command
         self.stationCallbackObj = None
 
     def initPygame(self):
@@ -624,8 +863,6 @@ class FlightProfileApp(object):
         # Create a simulation object initialized with the flight profile
         self.dockSim = DockSim(self.profile)
         
-        self.maxVelocity = 0.0
-        
         # Get the total time of flight
         self.duration = self.dockSim.flightDuration()
         if self.duration is None:  # flight did not complete (0 or neg. velocity)
@@ -642,7 +879,12 @@ class FlightProfileApp(object):
         print("success:", self.dockSim.dockIsSuccessful())
     
         self.simPhase = DockSim.START_PHASE  # set phase to initial simulation phase
-        self.outOfFuel = False
+        
+        # Compute everything the display needs for each frame of the flight
+        self.track = PlaybackTrack(self.dockSim, self.profile, self.missionTimeScale, self.frameRate,
+                                   self.FLIGHT_PATH_START, self.FLIGHT_PATH_END)
+        self.flame = PlaybackTrack.NO_FLAME
+        self.passFailShown = False
     
     def createReadyText(self):
         GIANT_TEXT = 300
@@ -756,90 +998,75 @@ class FlightProfileApp(object):
         pass
     
     def draw(self):
-        # Draw background and labels (should only do when necessary)
-        rectList = self.staticGroup.draw(self.canvas)
+        # Show the next flame image
+        self.animGroup.advance()
         
-        # Draw changing text fields
-        rectList += self.statsGroup.draw(self.canvas)
+        # Redraw changing text fields and graphical objects (capsule and flames)
+        # over the background and labels, and copy only the modified parts
+        # of the canvas to the display
+        self.compositor.draw(self.canvas, self.staticGroup,
+                             (self.statsGroup, self.animGroup, self.movingGroup, self.blinkingTextGroup))
         
-        # Draw graphical objects (capsule and station)
-        rectList += self.animGroup.draw(self.canvas)
-        rectList += self.movingGroup.draw(self.canvas)
-        rectList += self.blinkingTextGroup.draw(self.canvas)
-        
-        # Only copy the modified parts of the canvas to the display
-        pygame.display.update(rectList)
+        # Report how long the last command took to reach the screen
+        if self.commandLatency is not None:
+            if self.channel:
+                self.channel.firstFrame(self.commandLatency)
+            self.commandLatency = None
         
     def update(self):
         """ Update the simulation """
-        # Get the current elapsed time
-        t = self.timer.elapsedSec()
+        # Show the precomputed frame for the current elapsed time
+        self.showFrame(self.track.frameAt(self.timer.elapsedSec()))
         
-        # Compute the simulation state values for the current time
-        state = self.dockSim.shipState(t * self.missionTimeScale)
+        # Update any text objects that might be animated
+        for sp in self.blinkingTextGroup.sprites():
+            sp.update()
+    
+    def showFrame(self, frame):
+        """ Set the display to frame number frame of the PlaybackTrack.
+            Frames can be shown in any order, so the flight can be replayed
+            or scrubbed.
+        """
+        track = self.track
+        phase = track.phase[frame]
         
         # Update stats
-        if state.phase == DockSim.END_PHASE:
+        if phase == DockSim.END_PHASE:
             self.timer.stop()
-
-        self.simulatedTime.setValue(state.tEnd/self.missionTimeScale)
-        self.actualTime.setValue(state.tEnd)
-        
-        self.maxVelocity = max(self.maxVelocity, state.currVelocity)
-        self.distance.setValue("{:0.2f} m".format(self.profile.dist - state.distTraveled))
-        if state.currVelocity >= 0.01:
-            self.velocity.setValue("{:0.2f} m/sec".format(state.currVelocity), color=Colors.GREEN if self.dockSim.safeDockingVelocity(state.currVelocity) else Colors.RED)
-        else:  # show more decimal places
-            self.velocity.setValue("{:0.6f} m/sec".format(state.currVelocity), color=Colors.GREEN if self.dockSim.safeDockingVelocity(state.currVelocity) else Colors.RED)
-        self.vmax.setValue("{:0.2f} m/sec".format(self.maxVelocity))
-        self.acceleration.setValue("{:0.2f} m/sec^2".format((0.0,
-                                                             self.profile.aAft if not self.outOfFuel else 0.0,
-                                                             0.0,
-                                                             -self.profile.aFore if not self.outOfFuel else 0.0,
-                                                             0.0,
-                                                             0.0)[state.phase]))
-        self.fuelRemaining.setValue("{:0.2f} kg".format(state.fuelRemaining), color=Colors.GREEN if state.fuelRemaining > 0.0 else Colors.RED)
-        self.phase.setValue(DockSim.PHASE_STR[state.phase])
-        
-        # Update graphics
-        changeDetected = False
-        
-        # Detect running out of fuel
-        if not self.outOfFuel and state.fuelRemaining <= 0.0:
-            self.outOfFuel = True
-            changeDetected = True
-            
-        # Detect a phase change
-        if state.phase != self.simPhase:
-            self.simPhase = state.phase
-            changeDetected = True
-        
-        # If a phase change was detected or the ship ran out of fuel,
-        # update the ship graphics to reflect the new state
-        if changeDetected:
-            self.animGroup.empty()
-            if state.phase == DockSim.ACCEL_PHASE:
-                if not self.outOfFuel:
-                    self.animGroup.add(self.rearFlame)
-            elif state.phase == DockSim.DECEL_PHASE:
-                if not self.outOfFuel:
-                    self.animGroup.add(self.frontFlameUp)
-                    self.animGroup.add(self.frontFlameDown)
-            elif state.phase == DockSim.END_PHASE:
-                passed = self.dockSim.dockIsSuccessful()
-#                 msg = self.outcomeMessage(state)
-                result = self.dockSim.outcome(state)
-                self.createPassFailText(passed=passed, msg=self.OUTCOMES[result])
-                self.reportPassFail(passed, state.tEnd, result)
-        
-        # Compute the fraction of the total trip distance that has been traversed,
-        # and place the ship at that location
-        frac = state.distTraveled/self.profile.dist
-        self.capsule.moveBetween(self.FLIGHT_PATH_START, self.FLIGHT_PATH_END, frac)
         
-        # Update any text objects that might be animated
-        for sp in self.blinkingTextGroup.sprites():
-            sp.update()
+        simulated, actual = track.clocks[frame]
+        self.simulatedTime.setText(simulated)
+        self.actualTime.setText(actual)
+        
+        distance, velocity, vmax, acceleration, fuel, phaseStr = track.stats[frame]
+        self.distance.setValue(distance)
+        self.velocity.setValue(velocity, color=Colors.GREEN if track.safeVelocity[frame] else Colors.RED)
+        self.vmax.setValue(vmax)
+        self.acceleration.setValue(acceleration)
+        self.fuelRemaining.setValue(fuel, color=Colors.GREEN if track.hasFuel[frame] else Colors.RED)
+        self.phase.setValue(phaseStr)
+        self.simPhase = phase
+        
+        # Update the ship graphics if the flames changed
+        flame = track.flame[frame]
+        if flame != self.flame:
+            self.flame = flame
+            self.animGroup.empty()
+            if flame == PlaybackTrack.REAR_FLAME:
+                self.animGroup.add(self.rearFlame)
+            elif flame == PlaybackTrack.FRONT_FLAME:
+                self.animGroup.add(self.frontFlameUp)
+                self.animGroup.add(self.frontFlameDown)
+        
+        if phase == DockSim.END_PHASE and not self.passFailShown:
+            self.passFailShown = True
+            state = track.finalState
+            passed = self.dockSim.dockIsSuccessful()
+            result = self.dockSim.outcome(state)
+            self.createPassFailText(passed=passed, msg=self.OUTCOMES[result])
+            self.reportPassFail(passed, state.tEnd, result)
+        
+        self.capsule.moveTo((track.x[frame], track.y[frame]))
     
     def userQuit(self):
         # Retrieve queued events from mouse, keyboard, timers
@@ -862,9 +1089,7 @@ class FlightProfileApp(object):
         lastFrameMs = 0  # @UnusedVariable
         
         # Draw the whole background once
-#         self.draw()
-        self.staticGroup.draw(self.canvas)
-        pygame.display.update()
+        self.draw()
         
         # Start the simulation time clock
         self.timer.start()
@@ -908,13 +1133,13 @@ class FlightProfileApp(object):
         
         # Draw the whole background once
         self.setupBackgroundDisplay()
-        self.staticGroup.draw(self.canvas)
-        pygame.display.update()
+        self.draw()
     
     def clearBackground(self):
         self.staticGroup.empty()
         
     def takeDownDisplay(self):
+        FontCache.clear()
         pygame.quit()
         
     def showReadyScreen(self):
@@ -937,7 +1162,9 @@ class FlightProfileApp(object):
             Returns:
                 A string stating success or the reason for failure
         """
-        if self.stationCallbackObj:
+        if self.channel:
+            self.channel.sendEvent(self.channel.RESULT, (str(passed), str(simTime), msg))
+        elif self.stationCallbackObj:
             self.stationCallbackObj.args = (str(passed), str(simTime), msg)
             self.stationCallbackObj.State = State.PROCESSING_COMPLETED
         return msg
@@ -989,37 +1216,71 @@ class FlightProfileApp(object):
             is received, the process will shut down.
         """
         self.workQueue = queue
+        self.commandLoop(self.queuedCommand)
+    
+    def runFromChannel(self, channel):
+        """ This method is called to start the sim as a separate process.
+            Commands are received from a RenderChannel, and the pass/fail
+            result is sent back on it.  Between frames the process waits
+            on the channel, so a command is handled as soon as it arrives.
+            When "QUIT" is received, the process will shut down.
+        """
+        self.channel = channel
+        self.commandLoop(channel.waitCommand)
+    
+    def queuedCommand(self, timeoutSec):
+        """ Return the next (cmd, args, latency) from the work queue, or None.
+            If the queue is empty, wait for the next frame time.
+        """
+        try:
+            cmd,args = self.workQueue.get_nowait()
+            #print("Got work ({},{})".format(repr(cmd), repr(args)))
+            return cmd, args, None
+        except Queue.Empty:
+            self.frameClock.tick(self.frameRate)
+            return None
+    
+    def commandLoop(self, waitCommand):
+        """ Show the display, and respond to commands until "QUIT".
+        
+            waitCommand(timeoutSec) returns the next (cmd, args, latency)
+            command, or None if none arrives before timeoutSec has passed.
+        """
         self.initPygame()
         self.initScreen()
         self.loadImageObjects()
         self.setupBackgroundDisplay()
 #         self.createReadyText()
         self.showReadyScreen()
+        if self.channel:
+            self.channel.sendEvent(self.channel.STARTED)
 
         updateProc = self.updateBlinkingText
+        framePeriod = 1.0/self.frameRate if self.frameRate else 0.0
         
         done = False
         while not done:
-            cmd = None
-            while cmd is None:
-                try:
-                    cmd,args = self.workQueue.get_nowait()
-                    #print("Got work ({},{})".format(repr(cmd), repr(args)))
-                except Queue.Empty:
-                    pass
+            command = None
+            nextFrameTime = time.time()
+            while command is None:
                 updateProc()
                 self.draw()
                 if self.userQuit():
-                    cmd = self.QUIT_CMD
+                    command = (self.QUIT_CMD, "", None)
                     break
-                self.frameClock.tick(self.frameRate)
+                # Wait for a command until the next frame is due (if we are
+                # behind, draw the next frame right away instead of catching up)
+                nextFrameTime = max(nextFrameTime + framePeriod, time.time())
+                command = waitCommand(nextFrameTime - time.time())
+            cmd,args,latency = command
             
             self.clearDisplay()
+            self.commandLatency = latency
             if cmd == self.RUN_CMD:
                 #print("RUN_CMD")
+                self.setFlightProfile(args)  # precompute the flight before the countdown ends
                 self.countDown()  # blocks for 3 seconds while it counts down
                 self.clearDisplay()
-                self.setFlightProfile(args)
                 self.setupMissionTimeDisplay()
                 self.setupStatsDisplay()
                 self.setupSpaceshipDisplay()
@@ -1041,8 +1302,11 @@ class FlightProfileApp(object):
                 updateProc = self.updateBlinkingText
             elif cmd == self.QUIT_CMD:
                 #print("QUIT_CMD")
+                self.commandLatency = None
                 self.clearBackground()
                 self.takeDownDisplay()
+                if self.channel:
+                    self.channel.sendEvent(self.channel.STOPPED)
                 done = True
         
         
@@ -6,7 +6,9 @@
 #   Date: Jan 28, 2016
 #
 # Usage:
-#         python FlightService.py
+#         python FlightService.py [--port 8080] [--workers N --threads M]
+#  or, to measure a running server:
+#         python FlightService.py --bench [--requests 2000 --concurrency 20]
 #  then from another host:
 #         http --json POST http://localhost:8080/dockparams Content-type:application/json Accept:text/plain t_aft=0.1 t_coast=1 t_fore=13.1
 #
@@ -15,10 +17,33 @@ from __future__ import print_function, division
 
 import sys
 import cgi
+import errno
+import gzip
+import hashlib
+import io
 import json
+import os
 import os.path
+import random
+import re
+import signal
+import socket
+import threading
+import time
+from collections import OrderedDict
+from math import ceil
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler, make_server
 
-from DockSim import DockSim, FlightParams
+try:
+    import queue
+    from http.client import HTTPConnection
+    from urllib.parse import urlsplit
+except ImportError:  # Python 2
+    import Queue as queue
+    from httplib import HTTPConnection
+    from urlparse import urlsplit
+
+from DockSim import DockSim, FlightParams, StateVec, np, simulate_batch
 
 #JQUERY = "jquery.js"
 JQUERY = "jquery-2.2.1.min.js"
@@ -30,11 +55,178 @@ Final Velocity (m/s): {}
 Fuel Remaining (kg): {}
 """
 
-# Set up a simple page cache to hold static content
-# Note:  This could be easily extended to check the last
-#        modified time, but right now, it does not check.
-# Currently JQUERY is the only cached item.
-pageCache = {}
+# Request fields for each FlightParams argument: (argument, field, default, type)
+FLIGHT_PARAM_FIELDS = (("tAft",   "t_aft",   0.0,  float),
+                       ("tCoast", "t_coast", 0.0,  float),
+                       ("tFore",  "t_fore",  0.0,  float),
+                       ("aAft",   "a_aft",   0.15, float),
+                       ("aFore",  "a_fore",  0.09, float),
+                       ("rFuel",  "r_fuel",  0.7,  float),
+                       ("qFuel",  "q_fuel",  20.0, float),
+                       ("dist",   "dist",    15.0, float),
+                       ("vMin",   "v_min",   0.01, float),
+                       ("vMax",   "v_max",   0.1,  float),
+                       ("vInit",  "v_init",  0.0,  float),
+                       ("tSim",   "t_sim",   45,   int),
+                      )
+
+# Number of profiles simulated at a time by /dockparams/batch
+BATCH_CHUNK_SIZE = 1000
+
+# Trajectory sampling for /dockparams/trajectory: the default interval
+# between samples (sec), the most samples returned (dt is increased to fit),
+# and the number of samples computed at a time
+TRAJECTORY_DT = 0.5
+MAX_TRAJECTORY_SAMPLES = 100000
+TRAJECTORY_CHUNK_SIZE = 1000
+
+# Static content served from the script directory: URL path -> (file, content type)
+STATIC_FILES = {"/" + JQUERY: (JQUERY, "text/javascript")}
+
+#----------------------------------------------------------------------------
+class Template(object):
+    """ A web page with %NAME% placeholders, compiled once for fast rendering.
+    
+        The page is split into a list of literal text pieces and placeholder
+        names, so render() is a single join instead of one str.replace() pass
+        per placeholder.
+    """
+    PLACEHOLDER = re.compile(r"%([A-Z_]+)%")
+    
+    def __init__(self, text):
+        # re.split() alternates text, name, text, name, ..., text
+        self.parts = self.PLACEHOLDER.split(text)
+    
+    def render(self, **values):
+        """ Return the page text with each %NAME% replaced by values[NAME] """
+        parts = list(self.parts)
+        for i in range(1, len(parts), 2):
+            name = parts[i]
+            parts[i] = str(values[name]) if name in values else "%" + name + "%"
+        return "".join(parts)
+
+#----------------------------------------------------------------------------
+class StaticAsset(object):
+    """ The content of a static file, with a precomputed gzip body and ETag """
+    def __init__(self, body, contentType):
+        self.contentType = contentType
+        self.body = body
+        buf = io.BytesIO()
+        with gzip.GzipFile(fileobj=buf, mode="wb", mtime=0) as gz:
+            gz.write(body)
+        self.gzipBody = buf.getvalue()
+        digest = hashlib.md5(body).hexdigest()
+        self.etag = '"{}"'.format(digest)
+        self.gzipEtag = '"{}-gz"'.format(digest)
+
+#----------------------------------------------------------------------------
+class FileCache(object):
+    """ Holds objects built from files in the script directory, and rebuilds
+        an object when its file's modification time changes.
+    """
+    def __init__(self):
+        self._entries = {}  # path -> (mtime, object)
+        self._lock = threading.Lock()
+    
+    def get(self, fileName, build, mode="r"):
+        """ Return build(content of fileName), reloading it if the file changed """
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), fileName)
+        mtime = os.stat(path).st_mtime
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry is None or entry[0] != mtime:
+            with open(path, mode) as f:
+                entry = (mtime, build(f.read()))
+            with self._lock:
+                self._entries[path] = entry
+        return entry[1]
+
+fileCache = FileCache()
+
+def getTemplate(fileName):
+    """ Return the compiled Template for a web page """
+    return fileCache.get(fileName, Template)
+
+def getStaticAsset(fileName, contentType):
+    """ Return the StaticAsset for a file """
+    return fileCache.get(fileName, lambda body: StaticAsset(body, contentType), mode="rb")
+
+# Maximum number of /dockparams responses held in the resultCache
+RESULT_CACHE_SIZE = 4096
+
+#----------------------------------------------------------------------------
+class ResultCache(object):
+    """ A bounded least-recently-used cache of formatted /dockparams responses.
+    
+        FlightParams are truncated to 0.1 sec, so many teams submit identical
+        profiles.  Entries are keyed on the normalized FlightParams (plus
+        whatever else the response depends on), and hold the encoded response
+        body, so a hit skips both the simulation and the formatting.
+    """
+    def __init__(self, maxSize=RESULT_CACHE_SIZE):
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        """ Return the cached value for key, or None if it is not cached """
+        with self._lock:
+            value = self._entries.pop(key, None)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries[key] = value  # move to the most recently used end
+            self.hits += 1
+            return value
+    
+    def put(self, key, value):
+        """ Add a value to the cache, discarding the least recently used
+            entry if the cache is full.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = value
+            while len(self._entries) > self.maxSize:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        """ Discard all entries and reset the counters """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+    
+    def stats(self):
+        """ Return a dict of the cache statistics """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"size": len(self._entries),
+                    "max_size": self.maxSize,
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "hit_rate": self.hits/lookups if lookups else 0.0,
+                   }
+
+resultCache = ResultCache()
+
+# When this process (or worker) started serving, for /healthz
+START_TIME = time.time()
+
+#----------------------------------------------------------------------------
+def makeFlightParams(params, value=lambda v: v):
+    """ Build a FlightParams from request fields, using the default for
+        any field that is missing.
+        
+        params is a dict-like object (a JSON object or cgi.FieldStorage), and
+        value() extracts the value from one of its items.
+        Raises ValueError if a field cannot be converted to a number.
+    """
+    args = {}
+    for arg, field, default, kind in FLIGHT_PARAM_FIELDS:
+        args[arg] = kind(value(params[field]) if field in params else default)
+    return FlightParams(**args)
 
 #----------------------------------------------------------------------------
 def wsgiApp(environ, start_response):
@@ -47,8 +239,16 @@ def wsgiApp(environ, start_response):
         return handle_dock(environ, start_response)
     elif method == "POST" and path == "/dockparams":
         return handle_dockparams(environ, start_response)
-    elif method == "GET" and path == "/" + JQUERY:
-        return handle_jquery(environ, start_response)
+    elif method == "POST" and path == "/dockparams/batch":
+        return handle_dockparams_batch(environ, start_response)
+    elif method == "GET" and path == "/dockparams/trajectory":
+        return handle_trajectory(environ, start_response)
+    elif method in ("GET", "HEAD") and path in STATIC_FILES:
+        return handle_static(environ, start_response)
+    elif path == "/admin/cache":
+        return handle_admin_cache(environ, start_response)
+    elif method == "GET" and path == "/healthz":
+        return handle_healthz(environ, start_response)
     else:
         return handle_404(environ, start_response)
 
@@ -57,13 +257,10 @@ def wsgiApp(environ, start_response):
 def handle_dock(environ, start_response):
     """ Return the web page form for the user to enter parameters """
     thisHost = environ["HTTP_HOST"]  # host used to request this page
-    scriptDir = os.path.dirname(__file__)
-    with open(os.path.join(scriptDir, REQUEST_FORM), "r") as webForm:
-        html = webForm.read()
-    html = html.replace("%FLIGHT_SERVICE_HOST%", thisHost)
+    html = getTemplate(REQUEST_FORM).render(FLIGHT_SERVICE_HOST=thisHost)
     
     start_response("200 OK", [("Content-type", "text/html")])
-    return html.encode("utf-8")
+    return [html.encode("utf-8")]
     
 #----------------------------------------------------------------------------
 def handle_dockparams(environ, start_response):
@@ -77,71 +274,218 @@ def handle_dockparams(environ, start_response):
         # Content is JSON-encoded
         request_body = environ['wsgi.input'].read(request_body_size)
         params = json.loads(request_body)
-        fp = FlightParams(tAft=float(params["t_aft"] if "t_aft" in params else 0.0),
-                          tCoast=float(params["t_coast"] if "t_coast" in params else 0.0),
-                          tFore=float(params["t_fore"] if "t_fore" in params else 0.0),
-                          aAft=float(params["a_aft"] if "a_aft" in params else 0.15),
-                          aFore=float(params["a_fore"] if "a_fore" in params else 0.09),
-                          rFuel=float(params["r_fuel"] if "r_fuel" in params else 0.7),
-                          qFuel=float(params["q_fuel"] if "q_fuel" in params else 20.0),
-                          dist=float(params["dist"] if "dist" in params else 15.0),
-                          vMin=float(params["v_min"] if "v_min" in params else 0.01),
-                          vMax=float(params["v_max"] if "v_max" in params else 0.1),
-                          vInit=float(params["v_init"] if "v_init" in params else 0.0),
-                          tSim=int(params["t_sim"] if "t_sim" in params else 45),
-                         )
+        fp = makeFlightParams(params)
     else: # CONTENT-TYPE == "x-www-form-urlencoded"
         # Content is URL-encoded
         params = cgi.FieldStorage(environ['wsgi.input'], environ=environ)
-        fp = FlightParams(tAft=float(params["t_aft"].value if "t_aft" in params else 0.0),
-                          tCoast=float(params["t_coast"].value if "t_coast" in params else 0.0),
-                          tFore=float(params["t_fore"].value if "t_fore" in params else 0.0),
-                          aAft=float(params["a_aft"].value if "a_aft" in params else 0.15),
-                          aFore=float(params["a_fore"].value if "a_fore" in params else 0.09),
-                          rFuel=float(params["r_fuel"].value if "r_fuel" in params else 0.7),
-                          qFuel=float(params["q_fuel"].value if "q_fuel" in params else 20.0),
-                          dist=float(params["dist"].value if "dist" in params else 15.0),
-                          vMin=float(params["v_min"].value if "v_min" in params else 0.01),
-                          vMax=float(params["v_max"].value if "v_max" in params else 0.1),
-                          vInit=float(params["v_init"].value if "v_init" in params else 0.0),
-                          tSim=int(params["t_sim"].value if "t_sim" in params else 45),
-                         )
-    
-    # Compute the simulation and get the final state
-    ds = DockSim(fp)
-    finalState = ds.shipState(DockSim.MAX_FLIGHT_DURATION_S)
-    
-    # Format the response and insert the values into the response web page
+        fp = makeFlightParams(params, lambda field: field.value)
+    
+    # The response depends on the flight params, the response type, and
+    # (for the web page) the host name, so use all three as the cache key
     responseType = "text/html"
     if responseType in environ.get("HTTP_ACCEPT"):
-        scriptDir = os.path.dirname(__file__)
-        with open(os.path.join(scriptDir, RESPONSE_FORM), "r") as webForm:
-            resp = webForm.read()
         thisHost = environ["HTTP_HOST"]  # host used to request this page
-        resp = resp.replace("%FLIGHT_SERVICE_HOST%", thisHost)\
-                   .replace("%OUTCOME%",  ds.outcome(finalState))\
-                   .replace("%DURATION%", str(finalState.tEnd))\
-                   .replace("%V_END%",    str(finalState.currVelocity))\
-                   .replace("%Q_FUEL%",   str(finalState.fuelRemaining))
     else: # fall back to plain text
         responseType = "text/plain"
-        resp = RESPONSE_TEXT.format(ds.outcome(finalState), finalState.tEnd, finalState.currVelocity, finalState.fuelRemaining)
+        thisHost = None
+    cacheKey = (fp.key(), responseType, thisHost)
+    resp = resultCache.get(cacheKey)
+    
+    if resp is None:
+        # Compute the simulation and get the final state
+        ds = DockSim(fp)
+        finalState = ds.shipState(DockSim.MAX_FLIGHT_DURATION_S)
+        
+        # Format the response and insert the values into the response web page
+        if responseType == "text/html":
+            resp = getTemplate(RESPONSE_FORM).render(FLIGHT_SERVICE_HOST=thisHost,
+                                                     OUTCOME=ds.outcome(finalState),
+                                                     DURATION=finalState.tEnd,
+                                                     V_END=finalState.currVelocity,
+                                                     Q_FUEL=finalState.fuelRemaining)
+        else:
+            resp = RESPONSE_TEXT.format(ds.outcome(finalState), finalState.tEnd, finalState.currVelocity, finalState.fuelRemaining)
+        resp = resp.encode("utf-8")
+        resultCache.put(cacheKey, resp)
 
     # Return the web page response
     start_response("200 OK", [("Content-type", responseType)])
-    return resp.encode("utf-8")
+    return [resp]
+
+#----------------------------------------------------------------------------
+def resultDict(outcome, finalState):
+    """ Return the /dockparams values for a final state as a JSON-ready dict """
+    return {"outcome":  outcome,
+            "duration": float(finalState.tEnd),
+            "v_end":    float(finalState.currVelocity),
+            "q_fuel":   float(finalState.fuelRemaining),
+            "success":  outcome == DockSim.OUTCOME_SUCCESS,
+           }
+
+def batchResults(profiles):
+    """ Generate a result dict for each FlightParams in profiles.
+    
+        Profiles are simulated BATCH_CHUNK_SIZE at a time, with the numpy batch
+        simulation if it is available.  A profile that DockSim rejects gets
+        {"error": message} instead of a result.
+    """
+    for start in range(0, len(profiles), BATCH_CHUNK_SIZE):
+        chunk = profiles[start:start + BATCH_CHUNK_SIZE]
+        if np is not None:
+            try:
+                results = simulate_batch(chunk)
+            except ValueError:
+                pass  # fall back to one at a time to report the bad profile(s)
+            else:
+                for result in results:
+                    yield resultDict(str(result["outcome"]), StateVec(*result.tolist()[:len(StateVec._fields)]))
+                continue
+        
+        for fp in chunk:
+            try:
+                ds = DockSim(fp)
+            except ValueError as e:
+                yield {"error": str(e)}
+                continue
+            finalState = ds.shipState(DockSim.MAX_FLIGHT_DURATION_S)
+            yield resultDict(ds.outcome(finalState), finalState)
 
 #----------------------------------------------------------------------------
-def handle_jquery(environ, start_response):
-    """ Return the jQuery content from the pageCache """
-    scriptDir = os.path.dirname(__file__)
-    pagePath = os.path.join(scriptDir, JQUERY)
-    if pagePath not in pageCache:
-        # Read and cache the content
-        with open(pagePath, "r") as jquery:
-            pageCache[pagePath] = jquery.read()
-    start_response("200 OK", [("Content-type", "text/javascript")])
-    return pageCache[pagePath]
+def handle_dockparams_batch(environ, start_response):
+    """ Receive a JSON array of flight params, and return a JSON array of
+        results in the same order.
+        
+        Each result has the same values as a /dockparams response: outcome,
+        duration, v_end, q_fuel, plus success.  The response is generated a
+        chunk at a time, so it is not all held in memory.
+    """
+    try:
+        request_body_size = int(environ.get('CONTENT_LENGTH', 0))
+    except ValueError:
+        request_body_size = 0
+    
+    try:
+        body = json.loads(environ['wsgi.input'].read(request_body_size).decode("utf-8"))
+        if not isinstance(body, list) or not all(isinstance(params, dict) for params in body):
+            raise ValueError("expected a JSON array of parameter objects")
+        profiles = [makeFlightParams(params) for params in body]
+    except (ValueError, TypeError) as e:
+        return handle_400(environ, start_response, str(e))
+    
+    def generate():
+        yield b"["
+        sep = b"\n"
+        for result in batchResults(profiles):
+            yield sep + json.dumps(result, sort_keys=True).encode("utf-8")
+            sep = b",\n"
+        yield b"\n]\n"
+    
+    start_response("200 OK", [("Content-type", "application/json")])
+    return generate()
+
+#----------------------------------------------------------------------------
+def handle_trajectory(environ, start_response):
+    """ Stream the sampled trajectory for a flight profile as NDJSON.
+    
+        The flight params are given as query parameters (the same names as
+        /dockparams), plus dt, the time between samples.  Each line is a JSON
+        object with t, distance, velocity, fuel, and phase, from t = 0 to the
+        end of the flight.
+    """
+    params = cgi.FieldStorage(environ['wsgi.input'], environ=environ)
+    try:
+        fp = makeFlightParams(params, lambda field: field.value)
+        dt = float(params["dt"].value if "dt" in params else TRAJECTORY_DT)
+        if not (0.0 < dt < float('inf')):
+            raise ValueError("dt must be a finite number greater than 0")
+        ds = DockSim(fp)
+    except ValueError as e:
+        return handle_400(environ, start_response, str(e))
+    
+    tEnd = ds.shipState(DockSim.MAX_FLIGHT_DURATION_S).tEnd
+    nSamples = int(ceil(tEnd/dt)) + 1
+    if nSamples > MAX_TRAJECTORY_SAMPLES:
+        dt = tEnd/(MAX_TRAJECTORY_SAMPLES - 1)
+        nSamples = MAX_TRAJECTORY_SAMPLES
+    
+    def generate():
+        for start in range(0, nSamples, TRAJECTORY_CHUNK_SIZE):
+            times = [min(i * dt, tEnd) for i in range(start, min(start + TRAJECTORY_CHUNK_SIZE, nSamples))]
+            if np is not None:
+                states = [StateVec(*state) for state in ds.shipStates(times).tolist()]
+            else:
+                states = [ds.shipState(t) for t in times]
+            yield b"".join(json.dumps({"t": t,
+                                       "distance": state.distTraveled,
+                                       "velocity": state.currVelocity,
+                                       "fuel": state.fuelRemaining,
+                                       "phase": DockSim.PHASE_STR[state.phase],
+                                      }, sort_keys=True).encode("utf-8") + b"\n"
+                           for t, state in zip(times, states))
+    
+    start_response("200 OK", [("Content-type", "application/x-ndjson")])
+    return generate()
+
+#----------------------------------------------------------------------------
+def handle_admin_cache(environ, start_response):
+    """ Report the /dockparams result cache statistics as JSON.
+        A POST (or DELETE) empties the cache and resets the counters.
+    """
+    if environ["REQUEST_METHOD"] in ("POST", "DELETE"):
+        resultCache.clear()
+    start_response("200 OK", [("Content-type", "application/json")])
+    return [json.dumps(resultCache.stats(), sort_keys=True).encode("utf-8")]
+    
+#----------------------------------------------------------------------------
+def handle_static(environ, start_response):
+    """ Return static content from the fileCache.
+    
+        The content is gzip-compressed if the client accepts it, and a
+        request whose If-None-Match header has the current ETag gets a
+        304 Not Modified with no body.
+    """
+    fileName, contentType = STATIC_FILES[environ["PATH_INFO"]]
+    asset = getStaticAsset(fileName, contentType)
+    
+    if "gzip" in environ.get("HTTP_ACCEPT_ENCODING", ""):
+        body, etag = asset.gzipBody, asset.gzipEtag
+        headers = [("Content-Encoding", "gzip")]
+    else:
+        body, etag = asset.body, asset.etag
+        headers = []
+    headers += [("ETag", etag),
+                ("Vary", "Accept-Encoding"),
+                ("Cache-Control", "no-cache"),  # always revalidate with the ETag
+               ]
+    
+    ifNoneMatch = environ.get("HTTP_IF_NONE_MATCH", "")
+    if etag in ifNoneMatch or ifNoneMatch.strip() == "*":
+        start_response("304 Not Modified", headers)
+        return []
+    
+    headers = [("Content-type", asset.contentType),
+               ("Content-Length", str(len(body)))] + headers
+    start_response("200 OK", headers)
+    if environ["REQUEST_METHOD"] == "HEAD":
+        return []
+    return [body]
+    
+#----------------------------------------------------------------------------
+def handle_healthz(environ, start_response):
+    """ Report that this server process is up and answering requests """
+    health = {"status": "ok",
+              "pid": os.getpid(),
+              "uptime": time.time() - START_TIME,
+             }
+    start_response("200 OK", [("Content-type", "application/json"),
+                              ("Cache-Control", "no-cache")])
+    return [json.dumps(health, sort_keys=True).encode("utf-8")]
+    
+#----------------------------------------------------------------------------
+def handle_400(environ, start_response, message):
+    """ Reject a request whose parameters could not be used """
+    start_response("400 Bad Request", [("Content-type", "text/plain")])
+    return ["400 Bad Request.\n{}\n".format(message).encode("utf-8")]
     
 #----------------------------------------------------------------------------
 def handle_404(environ, start_response):
@@ -159,13 +503,281 @@ check the URL of your request and try again.
         resp = "404 Not Found.\nCheck the URL of your request and try again."
 
     start_response("404 Not Found", [("Content-type", responseType)])
-    return resp.encode("utf-8")
+    return [resp.encode("utf-8")]
 
 
+#----------------------------------------------------------------------------
+# Concurrent server
+#
+# A parent process opens the listening socket and forks --workers worker
+# processes that all accept() on it.  Each worker hands its connections to a
+# pool of --threads threads, so a slow client only ties up one thread.  The
+# parent restarts workers that die, and on SIGHUP re-executes itself (picking
+# up any code changes) while the old workers finish their current requests.
+#----------------------------------------------------------------------------
+class QuietHandler(WSGIRequestHandler):
+    """ Request handler that does not log every request to stderr """
+    def log_message(self, format, *args):
+        pass
+
+class PooledWSGIServer(WSGIServer):
+    """ A WSGIServer that handles requests with a fixed pool of threads.
+    
+        If listenSocket is given, it is used instead of binding a new socket
+        (so that several worker processes can share one).
+    """
+    def __init__(self, server_address, application, threads, listenSocket=None, quiet=True):
+        WSGIServer.__init__(self, server_address, QuietHandler if quiet else WSGIRequestHandler,
+                            bind_and_activate=listenSocket is None)
+        if listenSocket is not None:
+            self.socket.close()
+            self.socket = listenSocket
+            self.server_address = listenSocket.getsockname()
+            self.server_name = socket.getfqdn(self.server_address[0])
+            self.server_port = self.server_address[1]
+            self.setup_environ()
+        self.set_app(application)
+        self.requests = queue.Queue()
+        self.threads = [threading.Thread(target=self.processRequests) for _ in range(max(1, threads))]
+        for thread in self.threads:
+            thread.daemon = True
+            thread.start()
+    
+    def process_request(self, request, client_address):
+        """ Queue the request for the next free thread """
+        self.requests.put((request, client_address))
+    
+    def processRequests(self):
+        """ Thread main loop: handle queued requests until None is received """
+        while True:
+            item = self.requests.get()
+            if item is None:
+                break
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+    
+    def drain(self):
+        """ Wait for the queued and in-progress requests to finish """
+        for _ in self.threads:
+            self.requests.put(None)
+        for thread in self.threads:
+            thread.join()
+
+def openListenSocket(port):
+    """ Return a non-blocking listening socket shared by the workers.
+        (Non-blocking, so that a worker that loses the race to accept() a
+        connection goes back to waiting instead of blocking.)
+    """
+    fd = os.environ.get("FLIGHT_SERVICE_FD")
+    if fd is not None:
+        # Inherited across a SIGHUP reload
+        sock = socket.fromfd(int(fd), socket.AF_INET, socket.SOCK_STREAM)
+        os.close(int(fd))
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(("", port))
+        sock.listen(128)
+    sock.setblocking(False)
+    return sock
+
+def runWorker(sock, threads):
+    """ Worker process main: serve until SIGTERM, then finish up and exit """
+    global START_TIME
+    START_TIME = time.time()
+    httpd = PooledWSGIServer(None, wsgiApp, threads, listenSocket=sock)
+    
+    def stop(signum, frame):
+        # shutdown() waits for serve_forever() to return, so call it from
+        # another thread
+        threading.Thread(target=httpd.shutdown).start()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the parent handles ^C
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    
+    try:
+        httpd.serve_forever()
+        httpd.drain()
+    finally:
+        os._exit(0)
+
+def serve(port, workers, threads):
+    """ Run the prefork server: workers processes of threads threads each """
+    sock = openListenSocket(port)
+    children = set()
+    state = {"running": True, "reload": False}
+    
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            runWorker(sock, threads)
+        children.add(pid)
+    
+    def onStop(signum, frame):
+        state["running"] = False
+    def onReload(signum, frame):
+        state["reload"] = True
+    signal.signal(signal.SIGTERM, onStop)
+    signal.signal(signal.SIGINT, onStop)
+    signal.signal(signal.SIGHUP, onReload)
+    
+    for _ in range(workers):
+        spawn()
+    print("Serving on port {} with {} workers x {} threads (pid {})...".format(port, workers, threads, os.getpid()))
+    
+    # Restart any worker that dies.  (Poll, since a blocking waitpid() is
+    # not interrupted by the signal handlers in Python 3.)
+    while state["running"] and not state["reload"]:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except OSError as e:
+            if e.errno not in (errno.EINTR, errno.ECHILD):
+                raise
+            pid = 0
+        if pid == 0:
+            time.sleep(0.2)
+        elif pid in children:
+            children.discard(pid)
+            if state["running"] and not state["reload"]:
+                print("Worker {} exited with status {}, restarting".format(pid, status))
+                spawn()
+    
+    # Stop the workers.  Each finishes the requests it has already accepted.
+    for pid in children:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except OSError:
+            pass
+    
+    if state["reload"]:
+        # Re-execute with the same listening socket, so no connections are
+        # refused while the new workers start
+        print("Reloading...")
+        fd = os.dup(sock.fileno())
+        if hasattr(os, "set_inheritable"):
+            os.set_inheritable(fd, True)
+        os.environ["FLIGHT_SERVICE_FD"] = str(fd)
+        os.execv(sys.executable, [sys.executable] + sys.argv)
+    
+    for pid in children:
+        try:
+            os.waitpid(pid, 0)
+        except OSError:
+            pass
+
+#----------------------------------------------------------------------------
+# Load generator
+#----------------------------------------------------------------------------
+def percentile(sortedValues, pct):
+    """ Return the pct percentile (nearest rank) of a sorted list """
+    if not sortedValues:
+        return float("nan")
+    rank = int(ceil(pct/100.0 * len(sortedValues)))
+    return sortedValues[max(0, min(len(sortedValues), rank) - 1)]
+
+def bench(url, nRequests, concurrency, distinct):
+    """ POST random flight profiles to url from concurrency threads, and
+        return a dict of the throughput and latency (in ms) statistics.
+        
+        distinct is the number of different profiles to choose from, which
+        controls the result cache hit rate.
+    """
+    parts = urlsplit(url)
+    rand = random.Random(0)
+    bodies = [json.dumps({"t_aft": rand.randint(0, 150)/10.0,
+                          "t_coast": rand.randint(0, 300)/10.0,
+                          "t_fore": rand.randint(0, 200)/10.0}).encode("utf-8")
+              for _ in range(distinct)]
+    headers = {"Content-type": "application/json", "Accept": "text/plain"}
+    latencies = []
+    errors = [0]
+    counter = iter(range(nRequests))
+    lock = threading.Lock()
+    
+    def client():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            t0 = time.time()
+            try:
+                conn = HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+                conn.request("POST", parts.path or "/", bodies[i % distinct], headers)
+                resp = conn.getresponse()
+                resp.read()
+                conn.close()
+                ok = resp.status == 200
+            except (socket.error, IOError):
+                ok = False
+            elapsed = time.time() - t0
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+    
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.time() - start
+    
+    latencies.sort()
+    return {"requests": nRequests,
+            "errors": errors[0],
+            "seconds": duration,
+            "requests_per_sec": len(latencies)/duration if duration else 0.0,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p90_ms": percentile(latencies, 90) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "max_ms": latencies[-1] * 1000 if latencies else float("nan"),
+           }
+
 #----------------------------------------------------------------------------
 if __name__ == '__main__':
-    from wsgiref.simple_server import make_server
+    import argparse
     
-    httpd = make_server("", 8080, wsgiApp)
-    print("Serving on port 8080...")
-    httpd.serve_forever()
+    parser = argparse.ArgumentParser(description="Flight profile simulation web service")
+    parser.add_argument("--port", type=int, default=8080,
+                        help="port to listen on (default 8080)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="number of worker processes (default: serve from this process)")
+    parser.add_argument("--threads", type=int, default=1,
+                        help="number of request threads per process (default 1)")
+    parser.add_argument("--bench", action="store_true",
+                        help="run the load generator against a running server instead of serving")
+    parser.add_argument("--url", default=None,
+                        help="URL for --bench (default http://localhost:PORT/dockparams)")
+    parser.add_argument("--requests", type=int, default=2000,
+                        help="number of requests for --bench (default 2000)")
+    parser.add_argument("--concurrency", type=int, default=20,
+                        help="number of concurrent clients for --bench (default 20)")
+    parser.add_argument("--distinct", type=int, default=500,
+                        help="number of different flight profiles for --bench (default 500)")
+    args = parser.parse_args()
+    
+    if args.bench:
+        url = args.url or "http://localhost:{}/dockparams".format(args.port)
+        print("Benchmarking {} ({} requests, {} clients)...".format(url, args.requests, args.concurrency))
+        results = bench(url, args.requests, args.concurrency, max(1, args.distinct))
+        print("""Requests:   {requests} ({errors} errors) in {seconds:.2f} sec
+Throughput: {requests_per_sec:.1f} requests/sec
+Latency:    p50 {p50_ms:.1f} ms, p90 {p90_ms:.1f} ms, p99 {p99_ms:.1f} ms, max {max_ms:.1f} ms""".format(**results))
+    elif args.workers > 0:
+        serve(args.port, args.workers, args.threads)
+    elif args.threads > 1:
+        httpd = PooledWSGIServer(("", args.port), wsgiApp, args.threads, quiet=False)
+        print("Serving on port {} with {} threads...".format(args.port, args.threads))
+        httpd.serve_forever()
+    else:
+        httpd = make_server("", args.port, wsgiApp)
+        print("Serving on port {}...".format(args.port))
+        httpd.serve_forever()
@@ -0,0 +1,102 @@
+#!/usr/bin/python
+#
+#   File: RenderChannel.py
+#   Date: Oct 18, 2026
+#----------------------------------------------------------------------------
+"""
+A two-way channel between the Dock station and the FlightProfile render
+process.
+
+Commands (READY, WELCOME, RUN, ...) go from the station to the render
+process, and events (the pass/fail result, frame telemetry) come back.
+The channel is a multiprocessing Pipe, so the render loop can wait on it
+with select() until its next frame is due instead of polling a Queue, and
+the result is handled in the station process, where the station state
+lives.
+
+Every command carries the time the station received the request that
+caused it, so the render process can report how long it took to get the
+first frame of the new screen on the display.
+"""
+from __future__ import print_function, division
+
+import select
+import threading
+from multiprocessing import Pipe
+from time import time
+
+
+#----------------------------------------------------------------------------
+class RenderChannel(object):
+    """ The two ends of a Pipe, with the message formats used on each.
+
+        Create the channel before starting the render process.  The station
+        process uses sendCommand() and pollEvent(); the render process uses
+        waitCommand() and sendEvent().
+    """
+    # Events sent by the render process
+    STARTED     = "STARTED"      # data: None (the display is up)
+    FIRST_FRAME = "FIRST_FRAME"  # data: latency dict (see firstFrame())
+    RESULT      = "RESULT"       # data: (passed, simTime, msg) strings
+    STOPPED     = "STOPPED"      # data: None (sent on QUIT)
+
+    def __init__(self):
+        self._stationEnd, self._renderEnd = Pipe(duplex=True)
+        self._sendLock = threading.Lock()
+
+    # ---- station side ------------------------------------------------------
+    def sendCommand(self, cmd, args="", tRequest=None):
+        """ Send a command to the render process.
+
+            tRequest is when the request that caused the command arrived
+            (default: now).
+        """
+        tSent = time()
+        with self._sendLock:
+            self._stationEnd.send((cmd, args, tRequest or tSent, tSent))
+
+    def pollEvent(self, timeoutSec=None):
+        """ Wait up to timeoutSec for an event from the render process.
+
+            Returns:
+                (kind, data), or None if nothing arrived in time
+        """
+        if not self._stationEnd.poll(timeoutSec):
+            return None
+        return self._stationEnd.recv()
+
+    # ---- render side -------------------------------------------------------
+    def fileno(self):
+        """ The file descriptor the render process can select() on """
+        return self._renderEnd.fileno()
+
+    def waitCommand(self, timeoutSec=0.0):
+        """ Wait up to timeoutSec for a command from the station.
+
+            Returns:
+                (cmd, args, latency) where latency is a dict of the times
+                the command was requested, sent, and received, or None if
+                no command arrived in time
+        """
+        readable = select.select([self._renderEnd], [], [], max(0.0, timeoutSec))[0]
+        if not readable:
+            return None
+        cmd, args, tRequest, tSent = self._renderEnd.recv()
+        return cmd, args, {"cmd": cmd, "tRequest": tRequest, "tSent": tSent, "tReceived": time()}
+
+    def sendEvent(self, kind, data=None):
+        """ Send an event to the station """
+        self._renderEnd.send((kind, data))
+
+    def firstFrame(self, latency):
+        """ Report that the first frame after a command is on the display.
+
+            latency is the dict returned by waitCommand().  The event adds
+            tFirstFrame, and the intervals in ms: queueMs (request to
+            receipt), renderMs (receipt to first frame), and totalMs.
+        """
+        latency = dict(latency, tFirstFrame=time())
+        latency["queueMs"] = (latency["tReceived"] - latency["tRequest"]) * 1000.0
+        latency["renderMs"] = (latency["tFirstFrame"] - latency["tReceived"]) * 1000.0
+        latency["totalMs"] = (latency["tFirstFrame"] - latency["tRequest"]) * 1000.0
+        self.sendEvent(self.FIRST_FRAME, latency)
@@ -0,0 +1,517 @@
+#!/usr/bin/python
+#
+#   File: bench_render.py
+#   Date: Oct 18, 2026
+#
+# Usage:
+#         PYTHONPATH=/opt/designchallenge2016/brata.station python flight_profile/bench_render.py --outDir=data/bench_render
+#
+#----------------------------------------------------------------------------
+"""
+Benchmark the FlightProfile display without a screen.
+
+FlightProfileApp is run from a work queue, just as the dock station runs
+it, and is sent READY, WELCOME, and RUN commands.  It goes through the
+countdown and the flight, shows the pass/fail screen, and is then sent
+QUIT.  SDL's dummy video driver is used by default, so no display is
+needed.
+
+Every frame's update(), draw(), and pygame.display.update() time is
+recorded, along with the number and area of the dirty rects sent to the
+display.  The results are written to outDir:
+
+    report.txt     per-stage percentiles, and a per-function breakdown
+    frames.csv     one row per frame
+    render.folded  sampled call stacks, one per line with a count, which
+                   flamegraph.pl or speedscope turn into a flame graph
+
+The call stacks are sampled from a background thread while a frame is
+being computed, so time spent waiting for the next frame is not counted.
+"""
+from __future__ import print_function, division
+
+import sys
+import os
+import csv
+import platform
+import threading
+import time
+from timeit import default_timer
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+import pygame
+import pygame.display
+
+from DockSim import DockSim, FlightParams
+from FlightProfile import FlightProfileApp
+from FlightService import percentile
+
+# Stages of the station display, in the order they are shown
+STAGES = ("ready", "welcome", "countdown", "run", "passfail")
+
+PERCENTILES = (50, 90, 95, 99)
+
+DEFAULT_SAMPLE_INTERVAL_MS = 1.0
+DEFAULT_TOP_FUNCTIONS = 25
+MIN_TREE_PCT = 1.0  # leave smaller branches out of the report's call tree
+
+REPORT_FILE = "report.txt"
+FRAMES_FILE = "frames.csv"
+FOLDED_FILE = "render.folded"
+
+
+#----------------------------------------------------------------------------
+def rectArea(rect):
+    """ Return the number of pixels covered by a Rect or (x, y, w, h) tuple """
+    return max(0, rect[2]) * max(0, rect[3])
+
+
+#----------------------------------------------------------------------------
+class Frame(object):
+    """ The measurements for one displayed frame """
+    FIELDS = ("index", "stage", "updateMs", "drawMs", "displayMs",
+              "workMs", "intervalMs", "rects", "pixels", "full")
+
+    def __init__(self, index, stage):
+        self.index = index
+        self.stage = stage
+        self.updateMs = 0.0
+        self.drawMs = 0.0     # includes displayMs
+        self.displayMs = 0.0
+        self.intervalMs = 0.0 # time since the previous frame was shown
+        self.rects = 0
+        self.pixels = 0
+        self.full = 0         # 1 if the whole screen was redrawn
+
+    @property
+    def workMs(self):
+        return self.updateMs + self.drawMs
+
+    def row(self):
+        return [getattr(self, f) for f in self.FIELDS]
+
+
+#----------------------------------------------------------------------------
+class FrameRecorder(object):
+    """ Collects Frame measurements and, optionally, sampled call stacks.
+
+        The BenchApp starts a Frame when update() or draw() is called, and
+        calls endFrame() after draw().  Stacks are only sampled in between.
+    """
+    def __init__(self, rootCodes=(), sampleIntervalMs=DEFAULT_SAMPLE_INTERVAL_MS):
+        self.frames = []
+        self.stage = STAGES[0]
+        self.current = None
+        self.lastFrameTime = None
+        self.fullUpdates = 0  # display.update() calls outside of draw()
+        self.budgetMs = 1000.0/30  # set from the app frame rate
+        self.rootCodes = frozenset(rootCodes)
+        self.sampleInterval = sampleIntervalMs/1000.0
+        self.samples = {}  # folded stack -> count
+        self.nSamples = 0
+        self._sampling = False
+        self._sampler = None
+        self._stop = threading.Event()
+        self._mainThreadId = None
+
+    def frame(self):
+        """ Return the Frame being measured, starting one if needed """
+        if self.current is None:
+            self.current = Frame(len(self.frames), self.stage)
+            self._sampling = True
+        return self.current
+
+    def endFrame(self):
+        """ Finish the current Frame """
+        self._sampling = False
+        frame = self.frame()
+        now = default_timer()
+        if self.lastFrameTime is not None:
+            frame.intervalMs = (now - self.lastFrameTime) * 1000.0
+        self.lastFrameTime = now
+        frame.stage = self.stage  # the stage may change during update()
+        self.frames.append(frame)
+        self.current = None
+
+    def displayUpdated(self, elapsedMs, rects):
+        """ Record a pygame.display.update() call """
+        if self.current is None:
+            self.fullUpdates += 1
+            return
+        self._sampling = False  # don't profile the bookkeeping
+        self.current.displayMs += elapsedMs
+        if rects is None:  # the whole screen
+            self.current.rects += 1
+            self.current.pixels += rectArea(pygame.display.get_surface().get_rect())
+        else:
+            self.current.rects += len(rects)
+            self.current.pixels += sum(rectArea(r) for r in rects if r)
+        self._sampling = True
+
+    def startSampling(self):
+        """ Start the stack sampling thread """
+        if self.sampleInterval <= 0:
+            return
+        if hasattr(sys, "setswitchinterval"):
+            sys.setswitchinterval(min(sys.getswitchinterval(), self.sampleInterval/2))
+        self._mainThreadId = threading.current_thread().ident
+        self._sampler = threading.Thread(target=self._sample, name="sampler")
+        self._sampler.daemon = True
+        self._sampler.start()
+
+    def stopSampling(self):
+        self._stop.set()
+        if self._sampler:
+            self._sampler.join()
+
+    def _sample(self):
+        while not self._stop.wait(self.sampleInterval):
+            if not self._sampling:
+                continue
+            frame = sys._current_frames().get(self._mainThreadId)
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            stack.reverse()
+            # Keep the part below the BenchApp update()/draw() wrapper
+            for i, code in enumerate(stack):
+                if code in self.rootCodes:
+                    break
+            else:
+                continue
+            if i + 1 == len(stack):  # in the wrapper itself
+                continue
+            key = ";".join(self.label(code) for code in stack[i+1:])
+            self.samples[key] = self.samples.get(key, 0) + 1
+            self.nSamples += 1
+
+    @staticmethod
+    def label(code):
+        """ Return the flame graph label for a code object """
+        return "{} ({}:{})".format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+
+#----------------------------------------------------------------------------
+class BenchApp(FlightProfileApp):
+    """ A FlightProfileApp that reports its frame times to a FrameRecorder """
+
+    def __init__(self, recorder, headless=True, throttle=True):
+        super(BenchApp, self).__init__()
+        self.recorder = recorder
+        self.headless = headless
+        self.throttle = throttle
+
+    def initScreen(self):
+        if not self.headless:
+            return super(BenchApp, self).initScreen()
+        # The dummy driver can't pick the width, so ask for the full screen size
+        self.canvas = pygame.display.set_mode(self.SCREEN_SIZE, 0, 32)
+        pygame.display.set_caption(self.WINDOW_TITLE)
+
+    def initPygame(self):
+        super(BenchApp, self).initPygame()
+        self.recorder.budgetMs = 1000.0/self.frameRate
+        if not self.throttle:
+            self.frameRate = 0  # Clock.tick(0) doesn't wait
+
+    def setFlightProfile(self, flightParams=None):
+        # Build the track at the real frame rate, even when running unthrottled
+        frameRate, self.frameRate = self.frameRate, self.frameRate or 30
+        super(BenchApp, self).setFlightProfile(flightParams)
+        self.frameRate = frameRate
+
+    def update(self):
+        frame = self.recorder.frame()
+        t0 = default_timer()
+        super(BenchApp, self).update()
+        frame.updateMs += (default_timer() - t0) * 1000.0
+
+    def updateBlinkingText(self):
+        frame = self.recorder.frame()
+        t0 = default_timer()
+        super(BenchApp, self).updateBlinkingText()
+        frame.updateMs += (default_timer() - t0) * 1000.0
+
+    def draw(self):
+        frame = self.recorder.frame()
+        t0 = default_timer()
+        super(BenchApp, self).draw()
+        frame.drawMs += (default_timer() - t0) * 1000.0
+        frame.full = int(self.compositor.fullRedraw)
+        self.recorder.endFrame()
+
+    def showReadyScreen(self):
+        self.recorder.stage = "ready"
+        super(BenchApp, self).showReadyScreen()
+
+    def showWelcomeScreen(self, teamName):
+        self.recorder.stage = "welcome"
+        super(BenchApp, self).showWelcomeScreen(teamName)
+
+    def countDown(self):
+        self.recorder.stage = "countdown"
+        super(BenchApp, self).countDown()
+        self.recorder.stage = "run"
+
+    def showFrame(self, frame):
+        super(BenchApp, self).showFrame(frame)
+        if self.passFailShown:
+            self.recorder.stage = "passfail"
+
+    @classmethod
+    def rootCodes(cls):
+        """ Return the code objects where sampled stacks are cut off """
+        return [getattr(f, "__func__", f).__code__
+                for f in (cls.update, cls.updateBlinkingText, cls.draw)]
+
+
+#----------------------------------------------------------------------------
+class StationCallback(object):
+    """ Stands in for the station object that FlightProfileApp reports to """
+    def __init__(self):
+        self.args = None
+        self.State = None
+
+
+def feedCommands(workQueue, callback, flightParams, teamName,
+                 readySec, welcomeSec, passFailSec, timeoutSec):
+    """ Send the app the commands the dock station would, then QUIT """
+    workQueue.put((FlightProfileApp.READY_CMD, ""))
+    time.sleep(readySec)
+    workQueue.put((FlightProfileApp.WELCOME_CMD, teamName))
+    time.sleep(welcomeSec)
+    workQueue.put((FlightProfileApp.RUN_CMD, flightParams))
+    deadline = time.time() + timeoutSec
+    while callback.args is None and time.time() < deadline:
+        time.sleep(0.05)
+    time.sleep(passFailSec)
+    workQueue.put((FlightProfileApp.QUIT_CMD, ""))
+
+
+def runBenchmark(flightParams, teamName="Benchmark", readySec=2.0, welcomeSec=2.0,
+                 passFailSec=3.0, headless=True, throttle=True,
+                 sampleIntervalMs=DEFAULT_SAMPLE_INTERVAL_MS):
+    """ Run the app through one docking attempt.
+
+        Returns:
+            The FrameRecorder, and the StationCallback holding the
+            pass/fail report (its args are None if the flight timed out)
+    """
+    recorder = FrameRecorder(BenchApp.rootCodes(), sampleIntervalMs)
+    app = BenchApp(recorder, headless=headless, throttle=throttle)
+    app.stationCallbackObj = StationCallback()
+
+    # Time every display.update(), including the ones outside of draw()
+    displayUpdate = pygame.display.update
+    def timedDisplayUpdate(*args):
+        t0 = default_timer()
+        displayUpdate(*args)
+        recorder.displayUpdated((default_timer() - t0) * 1000.0, args[0] if args else None)
+    pygame.display.update = timedDisplayUpdate
+
+    workQueue = queue.Queue()
+    timeoutSec = 4.0 + DockSim.MAX_FLIGHT_DURATION_S + 30.0  # countdown + longest flight
+    feeder = threading.Thread(target=feedCommands, name="feeder",
+                              args=(workQueue, app.stationCallbackObj, flightParams, teamName,
+                                    readySec, welcomeSec, passFailSec, timeoutSec))
+    feeder.daemon = True
+    recorder.startSampling()
+    feeder.start()
+    try:
+        app.runFromQueue(workQueue)
+    finally:
+        recorder.stopSampling()
+        pygame.display.update = displayUpdate
+    return recorder, app.stationCallbackObj
+
+
+#----------------------------------------------------------------------------
+def stageStats(frames, budgetMs):
+    """ Return a dict of summary statistics for a list of Frames """
+    stats = {"frames": len(frames)}
+    for field in ("updateMs", "drawMs", "displayMs", "workMs", "intervalMs"):
+        values = sorted(getattr(f, field) for f in frames)
+        for pct in PERCENTILES:
+            stats[(field, pct)] = percentile(values, pct)
+        stats[(field, "max")] = values[-1] if values else float("nan")
+        stats[(field, "mean")] = sum(values)/len(values) if values else float("nan")
+    stats["overBudget"] = sum(1 for f in frames if f.workMs > budgetMs)
+    stats["rects"] = sum(f.rects for f in frames)/len(frames) if frames else 0.0
+    stats["maxRects"] = max(f.rects for f in frames) if frames else 0
+    stats["pixels"] = sum(f.pixels for f in frames)/len(frames) if frames else 0.0
+    return stats
+
+
+def callTree(samples):
+    """ Merge folded stacks into a tree of {label: [count, children]} """
+    root = {}
+    for stack, count in samples.items():
+        level = root
+        for label in stack.split(";"):
+            node = level.setdefault(label, [0, {}])
+            node[0] += count
+            level = node[1]
+    return root
+
+
+def functionTotals(samples):
+    """ Return {label: [inclusive, self]} sample counts per function """
+    totals = {}
+    for stack, count in samples.items():
+        labels = stack.split(";")
+        for label in set(labels):  # count recursive functions once
+            totals.setdefault(label, [0, 0])[0] += count
+        totals[labels[-1]][1] += count
+    return totals
+
+
+def formatReport(recorder, callback, flightParams, topFunctions=DEFAULT_TOP_FUNCTIONS):
+    """ Return the benchmark report as a list of lines """
+    budgetMs = recorder.budgetMs
+    lines = []
+    screen = FlightProfileApp.SCREEN_SIZE
+    lines.append("FlightProfile render benchmark")
+    lines.append("  python {}, pygame {}, SDL video driver '{}'".format(
+        platform.python_version(), pygame.version.ver, os.environ.get("SDL_VIDEODRIVER", "default")))
+    lines.append("  screen {}x{}, frame budget {:.1f} ms".format(screen[0], screen[1], budgetMs))
+    lines.append("  profile tAft={0.tAft} tCoast={0.tCoast} tFore={0.tFore} tSim={0.tSim}".format(flightParams))
+    if callback.args:
+        lines.append("  result passed={} simTime={} ({})".format(*callback.args))
+    else:
+        lines.append("  result: the flight did not finish")
+    lines.append("  {} frames, {} full-screen redraws, {} display updates outside of draw()".format(
+        len(recorder.frames), sum(f.full for f in recorder.frames), recorder.fullUpdates))
+    lines.append("")
+
+    # Per-stage summary
+    groups = [(s, [f for f in recorder.frames if f.stage == s]) for s in STAGES]
+    groups.append(("all", recorder.frames))
+    header = "{:<10} {:>6} {:>15} {:>15} {:>15} {:>23} {:>6} {:>11} {:>9}".format(
+        "stage", "frames", "update p50/p99", "draw p50/p99", "display p50/p99",
+        "work p90/p99/max", "slow", "rects avg/max", "Mpx/frame")
+    lines.append("Frame times in ms (slow = work over the frame budget)")
+    lines.append(header)
+    lines.append("-" * len(header))
+    for name, frames in groups:
+        if not frames:
+            continue
+        st = stageStats(frames, budgetMs)
+        lines.append("{:<10} {:>6} {:>7.2f}/{:<7.2f} {:>7.2f}/{:<7.2f} {:>7.2f}/{:<7.2f} {:>7.2f}/{:>7.2f}/{:<7.2f} {:>6} {:>5.1f}/{:<5} {:>9.3f}".format(
+            name, st["frames"],
+            st[("updateMs", 50)], st[("updateMs", 99)],
+            st[("drawMs", 50)], st[("drawMs", 99)],
+            st[("displayMs", 50)], st[("displayMs", 99)],
+            st[("workMs", 90)], st[("workMs", 99)], st[("workMs", "max")],
+            st["overBudget"], st["rects"], st["maxRects"], st["pixels"]/1e6))
+    lines.append("")
+
+    # Full percentiles over all frames
+    st = stageStats(recorder.frames, budgetMs)
+    header = "{:<11}".format("all frames") + "".join("{:>9}".format("p{}".format(p)) for p in PERCENTILES) + "{:>9}{:>9}".format("max", "mean")
+    lines.append(header)
+    lines.append("-" * len(header))
+    for field in ("updateMs", "drawMs", "displayMs", "workMs", "intervalMs"):
+        lines.append("{:<11}".format(field) +
+                     "".join("{:>9.2f}".format(st[(field, p)]) for p in PERCENTILES) +
+                     "{:>9.2f}{:>9.2f}".format(st[(field, "max")], st[(field, "mean")]))
+    lines.append("")
+
+    if not recorder.nSamples:
+        return lines
+
+    # Per-function breakdown of the sampled stacks
+    n = recorder.nSamples
+    totals = functionTotals(recorder.samples)
+    lines.append("Top {} functions by inclusive time ({} samples)".format(topFunctions, n))
+    lines.append("{:>7} {:>7}  {}".format("incl%", "self%", "function"))
+    ranked = sorted(totals.items(), key=lambda item: (-item[1][0], -item[1][1], item[0]))
+    for label, (incl, own) in ranked[:topFunctions]:
+        lines.append("{:>7.1f} {:>7.1f}  {}".format(100.0*incl/n, 100.0*own/n, label))
+    lines.append("")
+
+    lines.append("Call tree (branches under {:.0f}% left out)".format(MIN_TREE_PCT))
+    def addNodes(level, depth):
+        for label, (count, children) in sorted(level.items(), key=lambda item: -item[1][0]):
+            pct = 100.0*count/n
+            if pct < MIN_TREE_PCT:
+                continue
+            lines.append("{:>7.1f}  {}{}".format(pct, "  " * depth, label))
+            addNodes(children, depth + 1)
+    addNodes(callTree(recorder.samples), 0)
+    return lines
+
+
+def writeResults(outDir, recorder, reportLines):
+    """ Write the report, the frame table, and the folded stacks to outDir """
+    if not os.path.isdir(outDir):
+        os.makedirs(outDir)
+    with open(os.path.join(outDir, REPORT_FILE), "w") as f:
+        f.write("\n".join(reportLines) + "\n")
+    with open(os.path.join(outDir, FRAMES_FILE), "w") as f:
+        writer = csv.writer(f)
+        writer.writerow(Frame.FIELDS)
+        for frame in recorder.frames:
+            writer.writerow(frame.row())
+    with open(os.path.join(outDir, FOLDED_FILE), "w") as f:
+        for stack, count in sorted(recorder.samples.items()):
+            f.write("{} {}\n".format(stack, count))
+
+
+#============================================================================
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tAft",   type=float, default=8.2,  help="duration of acceleration burn phase, in sec")
+    parser.add_argument("--tCoast", type=float, default=1.0,  help="duration of coast phase, in sec")
+    parser.add_argument("--tFore",  type=float, default=13.1, help="duration of deceleration burn phase, in sec")
+    parser.add_argument("--aAft",   type=float, default=0.15, help="acceleration force, in m/sec^2")
+    parser.add_argument("--aFore",  type=float, default=0.09, help="deceleration force, in m/sec^2")
+    parser.add_argument("--rFuel",  type=float, default=0.7,  help="rate of fuel consumption, in kg/sec")
+    parser.add_argument("--qFuel",  type=float, default=20.0, help="initial fuel amount, in kg")
+    parser.add_argument("--dist",   type=float, default=15.0, help="initial dock distance, in m")
+    parser.add_argument("--vMin",   type=float, default=DockSim.MIN_V_DOCK, help="minimum velocity for successful dock, in m/sec")
+    parser.add_argument("--vMax",   type=float, default=DockSim.MAX_V_DOCK, help="maximum velocity for successful dock, in m/sec")
+    parser.add_argument("--vInit",  type=float, default=DockSim.INITIAL_V,  help="initial velocity, in m/sec")
+    parser.add_argument("--tSim",   type=int,   default=FlightProfileApp.MAX_SIM_DURATION_S, help="max simulation time, in sec (shorter runs faster)")
+    parser.add_argument("-o", "--outDir", default="bench_render", help="directory for the report files (default: bench_render)")
+    parser.add_argument("--team", default="Benchmark Team", help="team name shown on the welcome screen")
+    parser.add_argument("--ready",    type=float, default=2.0, help="seconds to show the READY screen")
+    parser.add_argument("--welcome",  type=float, default=2.0, help="seconds to show the WELCOME screen")
+    parser.add_argument("--passFail", type=float, default=3.0, help="seconds to show the pass/fail screen")
+    parser.add_argument("--driver", default="dummy", help="SDL video driver, e.g. x11 or fbcon to draw on a real screen (default: dummy)")
+    parser.add_argument("--unthrottled", action="store_true", help="draw frames as fast as possible instead of at the app frame rate")
+    parser.add_argument("--sampleMs", type=float, default=DEFAULT_SAMPLE_INTERVAL_MS, help="stack sampling interval in ms, or 0 for none (default: {})".format(DEFAULT_SAMPLE_INTERVAL_MS))
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP_FUNCTIONS, help="number of functions to list in the report")
+    args = parser.parse_args()
+
+    os.environ["SDL_VIDEODRIVER"] = args.driver  # read when the display starts
+
+    flightParams = FlightParams(tAft=args.tAft,
+                                tCoast=args.tCoast,
+                                tFore=args.tFore,
+                                aAft=args.aAft,
+                                aFore=args.aFore,
+                                rFuel=args.rFuel,
+                                qFuel=args.qFuel,
+                                dist=args.dist,
+                                vMin=args.vMin,
+                                vMax=args.vMax,
+                                vInit=args.vInit,
+                                tSim=args.tSim,
+                               )
+    recorder, callback = runBenchmark(flightParams, teamName=args.team,
+                                      readySec=args.ready, welcomeSec=args.welcome,
+                                      passFailSec=args.passFail,
+                                      headless=args.driver == "dummy",
+                                      throttle=not args.unthrottled,
+                                      sampleIntervalMs=args.sampleMs)
+    lines = formatReport(recorder, callback, flightParams, args.top)
+    writeResults(args.outDir, recorder, lines)
+    print("\n".join(lines))
+    print("\nWrote {}, {}, and {} to {}".format(REPORT_FILE, FRAMES_FILE, FOLDED_FILE, args.outDir))
+    sys.exit(0 if callback.args else 1)
@@ -0,0 +1,271 @@
+#!/usr/bin/python
+#
+#   File: sweep.py
+#   Date: Oct 18, 2026
+#
+# Usage:
+#         python flight_profile/sweep.py --tAft=0:100 --tCoast=1 --tFore=0:100 --outDir=data/sweep
+#
+#----------------------------------------------------------------------------
+"""
+Sweep a grid of user flight profiles (tAft, tCoast, tFore) and map the
+DockSim outcome of every one.
+
+The grid is evaluated in chunks on a multiprocessing pool.  The results are
+written to outDir as dense .npy arrays indexed [tAft, tCoast, tFore]:
+
+    tAft.npy, tCoast.npy, tFore.npy   the grid axis values, in seconds
+    outcome.npy                       index into OUTCOME_CODES (-1 = not done)
+    velocity.npy                      final velocity, in m/s
+    fuel.npy                          fuel remaining, in kg
+
+and optionally as one CSV row per profile.  Progress is recorded in a
+checkpoint file after every chunk, so an interrupted sweep picks up where
+it left off when it is rerun with the same arguments.
+"""
+from __future__ import print_function, division
+
+import sys
+import os.path
+import csv
+import json
+import signal
+import multiprocessing
+
+import numpy as np
+
+from DockSim import DockSim, FlightParams, FLIGHT_PARAMS_DTYPE, simulate_batch
+
+# Values stored in outcome.npy are indexes into this tuple
+OUTCOME_CODES = (DockSim.OUTCOME_SUCCESS,
+                 DockSim.OUTCOME_TOO_FAST,
+                 DockSim.OUTCOME_TOO_SLOW,
+                 DockSim.OUTCOME_NO_FUEL,
+                 DockSim.OUTCOME_DNF,
+                )
+NOT_DONE = -1
+
+# Capsule parameters used when none are specified (same as FlightService)
+DEFAULT_CAPSULE = { "aAft":  0.15,
+                    "aFore": 0.09,
+                    "rFuel": 0.7,
+                    "qFuel": 20.0,
+                    "dist":  15.0,
+                    "vMin":  0.01,
+                    "vMax":  0.1,
+                    "vInit": 0.0,
+                  }
+
+DEFAULT_CHUNK_SIZE = 50000  # profiles per work unit
+CHECKPOINT_FILE = "sweep.checkpoint"
+CSV_FILE = "sweep.csv"
+
+# Sweep spec for worker processes (set by _initWorker)
+_workerSpec = None
+
+#----------------------------------------------------------------------------
+def gridAxis(start, stop=None, step=0.1):
+    """ Return the grid values from start to stop (inclusive) as an array.
+        Values are snapped to the 0.1 sec resolution that FlightParams
+        enforces, so step must be a multiple of 0.1.
+    """
+    stop = start if stop is None else stop
+    tenths = int(round(step * 10))
+    if tenths <= 0 or abs(tenths - step * 10) > 1e-9:
+        raise ValueError("step must be a positive multiple of 0.1 sec")
+    return np.arange(int(round(start * 10)), int(round(stop * 10)) + 1, tenths)/10.0
+
+def parseAxis(text):
+    """ Parse an axis spec of the form START[:STOP[:STEP]] """
+    return gridAxis(*[float(v) for v in text.split(":")])
+
+def userTime(t):
+    """ Apply the FlightParams ddd.d truncation to an array of user times """
+    return (np.trunc(t * 10) % 10000)/10.0
+
+#----------------------------------------------------------------------------
+def _initWorker(spec):
+    """ Pool initializer: give each worker process the sweep spec once """
+    global _workerSpec
+    _workerSpec = spec
+    
+    # Leave Ctrl-C to the parent, which terminates the pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def _sweepChunk(work):
+    """ Simulate one chunk of the flattened grid in a worker process.
+        work is (chunkIndex, start, stop) for flat grid indexes [start, stop).
+        Returns (chunkIndex, start, outcomes, velocities, fuels).
+    """
+    chunk, start, stop = work
+    axes = _workerSpec["axes"]
+    iAft, iCoast, iFore = np.unravel_index(np.arange(start, stop), [len(a) for a in axes])
+
+    params = np.zeros(stop - start, dtype=FLIGHT_PARAMS_DTYPE)
+    params["tAft"]   = userTime(axes[0][iAft])
+    params["tCoast"] = userTime(axes[1][iCoast])
+    params["tFore"]  = userTime(axes[2][iFore])
+    for name, value in _workerSpec["capsule"].items():
+        params[name] = value
+
+    results = simulate_batch(params)
+    outcomes = np.full(len(results), NOT_DONE, dtype=np.int8)
+    for code, outcome in enumerate(OUTCOME_CODES):
+        outcomes[results["outcome"] == outcome] = code
+    return chunk, start, outcomes, results["currVelocity"], results["fuelRemaining"]
+
+#----------------------------------------------------------------------------
+def _loadCheckpoint(path, spec):
+    """ Return the set of chunks already done, or None if there is no checkpoint.
+        Raises ValueError if the checkpoint belongs to a different sweep.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        checkpoint = json.load(f)
+    if checkpoint["spec"] != spec:
+        raise ValueError("Checkpoint {} is for a different sweep; remove it or change outDir".format(path))
+    return set(checkpoint["done"])
+
+def _saveCheckpoint(path, spec, done):
+    """ Atomically rewrite the checkpoint file """
+    tmpPath = path + ".tmp"
+    with open(tmpPath, "w") as f:
+        json.dump({"spec": spec, "done": sorted(done)}, f)
+    os.rename(tmpPath, path)
+
+def writeCsv(path, axes, outcome, velocity, fuel):
+    """ Write the sweep results as one CSV row per profile """
+    with open(path, "w") as f:
+        writer = csv.writer(f)
+        writer.writerow(("tAft", "tCoast", "tFore", "outcome", "velocity", "fuel"))
+        for i, tAft in enumerate(axes[0]):
+            for j, tCoast in enumerate(axes[1]):
+                for k, tFore in enumerate(axes[2]):
+                    code = outcome[i, j, k]
+                    writer.writerow((tAft, tCoast, tFore,
+                                     OUTCOME_CODES[code] if code != NOT_DONE else "",
+                                     repr(float(velocity[i, j, k])),
+                                     repr(float(fuel[i, j, k]))))
+
+#----------------------------------------------------------------------------
+def sweep(tAft, tCoast, tFore, outDir, capsule=None, workers=None,
+          chunkSize=DEFAULT_CHUNK_SIZE, csvOutput=False, progress=None):
+    """ Simulate every combination of the tAft, tCoast, and tFore values.
+
+        tAft, tCoast, tFore  are sequences of user times (see gridAxis())
+        outDir               is the directory that receives the result files
+        capsule              is a dict of the remaining FlightParams values
+                             (aAft, aFore, rFuel, qFuel, dist, vMin, vMax,
+                             vInit); missing values come from DEFAULT_CAPSULE
+        workers              is the number of processes (default: all cores)
+        chunkSize            is the number of profiles per work unit
+        csvOutput            if True, also write outDir/sweep.csv
+        progress             is an optional callable(chunksDone, chunksTotal)
+
+        If outDir contains a checkpoint from an interrupted run of the same
+        sweep, only the unfinished chunks are computed.
+
+        Returns (outcome, velocity, fuel) arrays indexed [tAft, tCoast, tFore].
+    """
+    axes = [np.asarray(a, dtype=np.float64) for a in (tAft, tCoast, tFore)]
+    shape = tuple(len(a) for a in axes)
+    nCells = int(np.prod(shape))
+    nChunks = (nCells + chunkSize - 1)//chunkSize
+
+    fullCapsule = dict(DEFAULT_CAPSULE)
+    fullCapsule.update(capsule or {})
+    DockSim(FlightParams(tAft=0.0, tCoast=0.0, tFore=0.0, tSim=0, **fullCapsule))  # raises ValueError if invalid
+
+    # Everything that determines the results; a checkpoint must match it exactly
+    spec = {"axes": [[int(round(t * 10)) for t in a] for a in axes],
+            "capsule": fullCapsule,
+            "chunkSize": chunkSize,
+           }
+
+    if not os.path.isdir(outDir):
+        os.makedirs(outDir)
+    checkpointPath = os.path.join(outDir, CHECKPOINT_FILE)
+    done = _loadCheckpoint(checkpointPath, spec)
+
+    # The result maps live in memory-mapped .npy files, so completed chunks
+    # survive an interruption along with the checkpoint
+    mapFiles = (("outcome", np.int8), ("velocity", np.float64), ("fuel", np.float64))
+    if done is None:
+        done = set()
+        for name, value in zip(("tAft", "tCoast", "tFore"), axes):
+            np.save(os.path.join(outDir, name + ".npy"), value)
+        maps = [np.lib.format.open_memmap(os.path.join(outDir, name + ".npy"), mode="w+", dtype=dtype, shape=shape)
+                for name, dtype in mapFiles]
+        maps[0][...] = NOT_DONE
+        maps[0].flush()
+        _saveCheckpoint(checkpointPath, spec, done)
+    else:
+        maps = [np.lib.format.open_memmap(os.path.join(outDir, name + ".npy"), mode="r+")
+                for name, _ in mapFiles]
+
+    flatMaps = [m.reshape(-1) for m in maps]
+    work = [(c, c * chunkSize, min(nCells, (c + 1) * chunkSize)) for c in range(nChunks) if c not in done]
+
+    workerSpec = {"axes": axes, "capsule": fullCapsule}
+    pool = multiprocessing.Pool(workers, initializer=_initWorker, initargs=(workerSpec,))
+    try:
+        for chunk, start, outcomes, velocities, fuels in pool.imap_unordered(_sweepChunk, work):
+            stop = start + len(outcomes)
+            for flatMap, values in zip(flatMaps, (outcomes, velocities, fuels)):
+                flatMap[start:stop] = values
+            for m in maps:
+                m.flush()
+            done.add(chunk)
+            _saveCheckpoint(checkpointPath, spec, done)
+            if progress:
+                progress(len(done), nChunks)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    if csvOutput:
+        writeCsv(os.path.join(outDir, CSV_FILE), axes, *maps)
+
+    return tuple(maps)
+
+
+#----------------------------------------------------------------------------
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tAft",   type=parseAxis, required=True, help="acceleration burn times, as START[:STOP[:STEP]] in sec")
+    parser.add_argument("--tCoast", type=parseAxis, required=True, help="coast times, as START[:STOP[:STEP]] in sec")
+    parser.add_argument("--tFore",  type=parseAxis, required=True, help="deceleration burn times, as START[:STOP[:STEP]] in sec")
+    parser.add_argument("--aAft",   type=float, default=DEFAULT_CAPSULE["aAft"],  help="acceleration force, in m/sec^2")
+    parser.add_argument("--aFore",  type=float, default=DEFAULT_CAPSULE["aFore"], help="deceleration force, in m/sec^2")
+    parser.add_argument("--rFuel",  type=float, default=DEFAULT_CAPSULE["rFuel"], help="rate of fuel consumption, in kg/sec")
+    parser.add_argument("--qFuel",  type=float, default=DEFAULT_CAPSULE["qFuel"], help="initial fuel amount, in kg")
+    parser.add_argument("--dist",   type=float, default=DEFAULT_CAPSULE["dist"],  help="initial dock distance, in m")
+    parser.add_argument("--vMin",   type=float, default=DEFAULT_CAPSULE["vMin"],  help="minimum velocity for successful dock, in m/sec")
+    parser.add_argument("--vMax",   type=float, default=DEFAULT_CAPSULE["vMax"],  help="maximum velocity for successful dock, in m/sec")
+    parser.add_argument("--vInit",  type=float, default=DEFAULT_CAPSULE["vInit"], help="initial velocity, in m/sec")
+    parser.add_argument("-o", "--outDir", required=True, help="directory for the result files and checkpoint")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="number of worker processes (default: one per core)")
+    parser.add_argument("--chunkSize", type=int, default=DEFAULT_CHUNK_SIZE, help="profiles per work unit (default: {})".format(DEFAULT_CHUNK_SIZE))
+    parser.add_argument("--csv", action="store_true", help="also write the results as {}".format(CSV_FILE))
+    args = parser.parse_args()
+
+    capsule = dict((name, getattr(args, name)) for name in DEFAULT_CAPSULE)
+
+    def showProgress(nDone, nTotal):
+        sys.stdout.write("\r{}/{} chunks".format(nDone, nTotal))
+        sys.stdout.flush()
+
+    outcome, velocity, fuel = sweep(args.tAft, args.tCoast, args.tFore, args.outDir,
+                                    capsule=capsule, workers=args.workers,
+                                    chunkSize=args.chunkSize, csvOutput=args.csv,
+                                    progress=showProgress)
+    print()
+    for code, name in enumerate(OUTCOME_CODES):
+        print("{:>17}: {}".format(name, np.count_nonzero(outcome == code)))
+    sys.exit(0)
@@ -0,0 +1,258 @@
+# ------------------------------------------------------------------------------
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+# ------------------------------------------------------------------------------
+"""
+Unit tests for the DockSim flight simulation.
+"""
+
+import itertools
+import unittest
+
+from flight_profile.DockSim import DockSim, FlightParams, StateVec, np, simulate_batch
+
+
+# ------------------------------------------------------------------------------
+def replayShipState(ds, t):
+    """ Reference shipState() that replays the flight from t=0 on every call.
+
+    This is the incremental algorithm DockSim.shipState() used before the
+    phase table was added.  The table-driven version must match it exactly.
+    """
+    stateVec = StateVec(phase=ds.START_PHASE,
+                        distTraveled=0.0,
+                        currVelocity=ds.v0,
+                        fuelRemaining=ds.qFuel,
+                        tEnd=0.0)
+    phaseTimes = [ds.tAft, ds.tAft + ds.tCoast, ds.tAft + ds.tCoast + ds.tFore]
+    while stateVec.phase != ds.END_PHASE:
+        if phaseTimes and t > phaseTimes[0]:
+            stateVec = ds.computePhase(phaseTimes[0], stateVec)
+            phaseTimes = phaseTimes[1:]
+        else:
+            stateVec = ds.computePhase(t, stateVec)
+            break
+    return stateVec
+
+
+# ------------------------------------------------------------------------------
+def referenceProfiles():
+    """ Generate a corpus of flight profiles covering each outcome.
+
+    Returns:
+        A list of FlightParams
+    """
+    capsules = (
+        # aAft, aFore, rFuel, qFuel, dist, vInit
+        (0.15, 0.09, 0.7, 20.0, 15.0, 0.0),   # the standard challenge capsule
+        (0.15, 0.09, 0.7,  5.0, 15.0, 0.0),   # runs out of fuel early
+        (0.40, 0.20, 1.5, 30.0, 50.0, 0.05),  # moving at the start
+        (0.05, 0.50, 0.1,  2.0,  3.0, 0.0),   # strong brakes
+    )
+    userTimes = (0.0, 0.1, 1.0, 4.3, 8.2, 9.2, 13.1, 30.0)
+    profiles = []
+    for aAft, aFore, rFuel, qFuel, dist, vInit in capsules:
+        for tAft, tCoast, tFore in itertools.product(userTimes, repeat=3):
+            profiles.append(FlightParams(tAft=tAft, tCoast=tCoast, tFore=tFore,
+                                         aAft=aAft, aFore=aFore,
+                                         rFuel=rFuel, qFuel=qFuel, dist=dist,
+                                         vMin=0.01, vMax=0.1, vInit=vInit,
+                                         tSim=45))
+    return profiles
+
+
+# ------------------------------------------------------------------------------
+class DockSimTestCase(unittest.TestCase):
+    """
+    Compares the phase-table DockSim.shipState() against the replay algorithm.
+    """
+
+    # --------------------------------------------------------------------------
+    def setUp(self):
+        """Build the reference corpus of flight profiles."""
+        self.profiles = referenceProfiles()
+
+    # --------------------------------------------------------------------------
+    def sampleTimes(self, ds):
+        """Return times that hit, straddle, and fall between phase breakpoints."""
+        breakpoints = [ds.tAft, ds.tAft + ds.tCoast, ds.tAft + ds.tCoast + ds.tFore]
+        times = [-1.0, 0.0, 0.05, DockSim.MAX_FLIGHT_DURATION_S]
+        for tb in breakpoints:
+            times.extend((tb - 0.05, tb, tb + 0.05))
+        times.extend(1.37 * i for i in range(60))
+        return times
+
+    # --------------------------------------------------------------------------
+    def test_shipStateMatchesReplay(self):
+        """shipState() is bit-identical to the replay algorithm at all times."""
+        for fp in self.profiles:
+            ds = DockSim(fp)
+            for t in self.sampleTimes(ds):
+                self.assertEqual(replayShipState(ds, t), ds.shipState(t),
+                                 "t={} profile={}".format(t, vars(fp)))
+
+    # --------------------------------------------------------------------------
+    def test_outcomesMatchReplay(self):
+        """Derived results (outcome, duration, success) are unchanged."""
+        for fp in self.profiles:
+            ds = DockSim(fp)
+            finalState = replayShipState(ds, DockSim.MAX_FLIGHT_DURATION_S)
+            self.assertEqual(ds.outcome(finalState),
+                             ds.outcome(ds.shipState(DockSim.MAX_FLIGHT_DURATION_S)))
+            tEnd = ds.flightDuration()
+            if tEnd is not None:
+                self.assertEqual(replayShipState(ds, tEnd).currVelocity,
+                                 ds.terminalVelocity())
+
+    # --------------------------------------------------------------------------
+    def test_flightParamsKey(self):
+        """Profiles that truncate to the same user times share a key."""
+        capsule = dict(aAft=0.15, aFore=0.09, rFuel=0.7, qFuel=20.0,
+                       dist=15.0, vMin=0.01, vMax=0.1, vInit=0.0, tSim=45)
+        fp1 = FlightParams(tAft=8.21, tCoast=0.0, tFore=13.1, **capsule)
+        fp2 = FlightParams(tAft=8.25, tCoast=0.01, tFore=13.19, **capsule)
+        fp3 = FlightParams(tAft=8.3, tCoast=0.0, tFore=13.1, **capsule)
+        self.assertEqual(fp1.key(), fp2.key())
+        self.assertNotEqual(fp1.key(), fp3.key())
+        self.assertEqual(hash(fp1.key()), hash(fp2.key()))
+
+    # --------------------------------------------------------------------------
+    def test_negativeUserTimes(self):
+        """Phase times that go backwards are handled like the replay loop."""
+        fp = FlightParams(tAft=5.0, tCoast=1.0, tFore=10.0,
+                          aAft=0.15, aFore=0.09, rFuel=0.7, qFuel=20.0,
+                          dist=15.0, vMin=0.01, vMax=0.1, vInit=0.0, tSim=45)
+        ds = DockSim(fp)
+        ds.tCoast = -3.0
+        ds.buildPhaseTable()
+        for t in self.sampleTimes(ds):
+            self.assertEqual(replayShipState(ds, t), ds.shipState(t))
+
+
+# ------------------------------------------------------------------------------
+class DockSimSolverTestCase(unittest.TestCase):
+    """
+    Checks the inverse solver against the forward simulation.
+    """
+
+    # --------------------------------------------------------------------------
+    def setUp(self):
+        """Build one DockSim per reference capsule (user times are ignored)."""
+        self.sims = [DockSim(fp) for fp in referenceProfiles()[::8**3]]
+
+    # --------------------------------------------------------------------------
+    def docks(self, ds, tAft, tCoast, tFore):
+        """Return True if the forward simulation docks successfully."""
+        trial = ds._trial(tAft, tCoast, tFore)
+        return trial.dockIsSuccessful()
+
+    # --------------------------------------------------------------------------
+    def test_solve(self):
+        """Both solutions dock, and minTime is no slower than minFuel."""
+        for ds in self.sims:
+            solutions = ds.solve()
+            self.assertTrue(ds.isFeasible())
+            for sol in solutions:
+                self.assertTrue(self.docks(ds, sol.tAft, sol.tCoast, sol.tFore), sol)
+            self.assertLessEqual(solutions.minFuel.fuelUsed, solutions.minTime.fuelUsed)
+            self.assertLessEqual(solutions.minTime.duration, solutions.minFuel.duration)
+
+    # --------------------------------------------------------------------------
+    def test_minTime(self):
+        """No nearby user times dock sooner than the minTime solution."""
+        ds = self.sims[0]
+        best = ds.solve().minTime
+        for tAft in (best.tAft - 0.2, best.tAft + 0.2):
+            for tFore in (best.tFore - 0.2, best.tFore, best.tFore + 0.2):
+                window = ds.coastWindow(tAft, tFore)
+                if window:
+                    trial = ds._trial(tAft, window[0], tFore)
+                    self.assertLessEqual(best.duration, trial.flightDuration())
+
+    # --------------------------------------------------------------------------
+    def test_infeasible(self):
+        """A capsule that cannot reach vMin has no solutions."""
+        ds = DockSim(FlightParams(tAft=0.0, tCoast=0.0, tFore=0.0,
+                                  aAft=0.15, aFore=0.09, rFuel=0.7, qFuel=0.001,
+                                  dist=15.0, vMin=0.01, vMax=0.1, vInit=0.0, tSim=45))
+        self.assertFalse(ds.isFeasible())
+        self.assertEqual((None, None), ds.solve())
+        self.assertEqual([], ds.feasibleRegion())
+
+    # --------------------------------------------------------------------------
+    def test_feasibleRegion(self):
+        """The corners of every BurnWindow dock, and the coast times just
+        outside them do not (away from the vMin/vMax rounding boundaries)."""
+        ds = self.sims[0]
+        for tAft in (0.1, 4.3, 8.2, 8.6):
+            windows = ds.feasibleRegion(tAft)
+            self.assertTrue(windows)
+            for w in windows:
+                self.assertEqual(tAft, w.tAft)
+                for tFore in (w.tForeMin, min(w.tForeMax, w.tForeMin + 30.0)):
+                    self.assertTrue(self.docks(ds, tAft, w.tCoastMin, tFore))
+                    self.assertTrue(self.docks(ds, tAft, w.tCoastMax, tFore))
+                    if w.tCoastMax < 999.0:
+                        self.assertFalse(self.docks(ds, tAft, w.tCoastMax + 1.0, tFore))
+
+
+# ------------------------------------------------------------------------------
+@unittest.skipIf(np is None, "numpy is not installed")
+class DockSimBatchTestCase(unittest.TestCase):
+    """
+    Compares the numpy batch API against the scalar DockSim methods.
+    """
+
+    # --------------------------------------------------------------------------
+    def setUp(self):
+        """Build the reference corpus of flight profiles."""
+        self.profiles = referenceProfiles()
+
+    # --------------------------------------------------------------------------
+    def test_shipStates(self):
+        """shipStates() matches shipState() element by element."""
+        times = np.linspace(-1.0, 80.0, 97)
+        for fp in self.profiles[::7]:
+            ds = DockSim(fp)
+            states = ds.shipStates(times)
+            for t, state in zip(times, states):
+                self.assertEqual(ds.shipState(float(t)), StateVec(*state.tolist()))
+
+    # --------------------------------------------------------------------------
+    def test_simulateBatch(self):
+        """simulate_batch() matches the scalar final state, outcome, and success."""
+        results = simulate_batch(self.profiles)
+        self.assertEqual(len(self.profiles), len(results))
+        for fp, result in zip(self.profiles, results):
+            ds = DockSim(fp)
+            finalState = ds.shipState(DockSim.MAX_FLIGHT_DURATION_S)
+            self.assertEqual(finalState, StateVec(*result.tolist()[:len(StateVec._fields)]))
+            self.assertEqual(ds.outcome(finalState), result["outcome"])
+            if ds.flightDuration() is None:
+                self.assertFalse(result["success"])
+            else:
+                self.assertEqual(ds.flightDuration(), result["flightDuration"])
+                self.assertEqual(ds.dockIsSuccessful(), result["success"])
+
+    # --------------------------------------------------------------------------
+    def test_simulateBatchValidates(self):
+        """simulate_batch() rejects the profiles DockSim() rejects."""
+        fp = FlightParams(tAft=1.0, tCoast=1.0, tFore=1.0,
+                          aAft=0.15, aFore=0.09, rFuel=0.0, qFuel=20.0,
+                          dist=15.0, vMin=0.01, vMax=0.1, vInit=0.0, tSim=45)
+        self.assertRaises(ValueError, simulate_batch, self.profiles[:3] + [fp])
+
+
+# ------------------------------------------------------------------------------
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,341 @@
+# ------------------------------------------------------------------------------
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+# ------------------------------------------------------------------------------
+"""
+Unit tests for the FlightService WSGI app, called directly without a server.
+"""
+
+import gzip
+import io
+import json
+import os
+import sys
+import unittest
+from wsgiref.util import setup_testing_defaults
+
+# FlightService imports DockSim as a top-level module, as when it is run as a
+# script from the flight_profile directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from flight_profile import FlightService
+from flight_profile.FlightService import ResultCache, resultCache
+
+
+# A profile that docks with the standard challenge capsule
+DOCKING_PARAMS = {"t_aft": 8.2, "t_coast": 0.0, "t_fore": 13.1}
+
+
+# ------------------------------------------------------------------------------
+def callApp(method, path, body=b"", query="", **headers):
+    """ Call the WSGI app with one request.
+
+    Args:
+        method (str): GET, POST, ...
+        path (str): the PATH_INFO of the request
+        body (bytes): the request body
+        query (str): the QUERY_STRING of the request
+        headers: extra environ entries, e.g. CONTENT_TYPE or HTTP_ACCEPT
+    Returns:
+        (status, headers dict, body bytes)
+    """
+    environ = {"REQUEST_METHOD": method,
+               "PATH_INFO": path,
+               "QUERY_STRING": query,
+               "CONTENT_LENGTH": str(len(body)),
+               "HTTP_ACCEPT": "text/plain",
+               "HTTP_HOST": "localhost:8080",
+               "wsgi.input": io.BytesIO(body),
+              }
+    environ.update(headers)
+    setup_testing_defaults(environ)
+
+    response = {}
+    def start_response(status, responseHeaders):
+        response["status"] = status
+        response["headers"] = dict(responseHeaders)
+    responseBody = b"".join(FlightService.wsgiApp(environ, start_response))
+    return response["status"], response["headers"], responseBody
+
+
+# ------------------------------------------------------------------------------
+def postJson(path, value, **headers):
+    """ POST value as JSON; returns the same as callApp() """
+    return callApp("POST", path, json.dumps(value).encode("utf-8"),
+                   CONTENT_TYPE="application/json", **headers)
+
+
+# ------------------------------------------------------------------------------
+class ResultCacheTestCase(unittest.TestCase):
+    """
+    The least-recently-used cache of /dockparams responses.
+    """
+
+    # --------------------------------------------------------------------------
+    def test_hitsAndMisses(self):
+        """Lookups are counted as hits and misses."""
+        cache = ResultCache(maxSize=4)
+        self.assertIsNone(cache.get("a"))
+        cache.put("a", b"A")
+        self.assertEqual(b"A", cache.get("a"))
+        self.assertEqual(b"A", cache.get("a"))
+        stats = cache.stats()
+        self.assertEqual((1, 2, 1), (stats["size"], stats["hits"], stats["misses"]))
+        self.assertAlmostEqual(2.0/3.0, stats["hit_rate"])
+
+    # --------------------------------------------------------------------------
+    def test_evictsLeastRecentlyUsed(self):
+        """A full cache discards the entry used longest ago."""
+        cache = ResultCache(maxSize=2)
+        cache.put("a", b"A")
+        cache.put("b", b"B")
+        cache.get("a")
+        cache.put("c", b"C")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(b"A", cache.get("a"))
+        self.assertEqual(b"C", cache.get("c"))
+        self.assertEqual(2, cache.stats()["size"])
+
+    # --------------------------------------------------------------------------
+    def test_clear(self):
+        """clear() empties the cache and resets the counters."""
+        cache = ResultCache()
+        cache.put("a", b"A")
+        cache.get("a")
+        cache.clear()
+        self.assertEqual({"size": 0, "max_size": FlightService.RESULT_CACHE_SIZE,
+                          "hits": 0, "misses": 0, "hit_rate": 0.0}, cache.stats())
+
+
+# ------------------------------------------------------------------------------
+class DockParamsTestCase(unittest.TestCase):
+    """
+    /dockparams responses are cached on the normalized flight params.
+    """
+
+    # --------------------------------------------------------------------------
+    def setUp(self):
+        """Start each test with an empty result cache."""
+        resultCache.clear()
+
+    # --------------------------------------------------------------------------
+    def test_cacheHit(self):
+        """Profiles that truncate to the same user times get the cached response."""
+        status, headers, first = postJson("/dockparams", DOCKING_PARAMS)
+        self.assertEqual("200 OK", status)
+        self.assertEqual("text/plain", headers["Content-type"])
+        self.assertTrue(first.startswith(b"Outcome: "))
+
+        params = dict(DOCKING_PARAMS, t_aft=8.25)
+        status, headers, second = postJson("/dockparams", params)
+        self.assertEqual(first, second)
+        stats = resultCache.stats()
+        self.assertEqual((1, 1, 1), (stats["size"], stats["hits"], stats["misses"]))
+
+    # --------------------------------------------------------------------------
+    def test_responseTypeIsPartOfKey(self):
+        """The web page and the plain text response are cached separately."""
+        postJson("/dockparams", DOCKING_PARAMS)
+        status, headers, body = postJson("/dockparams", DOCKING_PARAMS, HTTP_ACCEPT="text/html")
+        self.assertEqual("text/html", headers["Content-type"])
+        self.assertEqual(2, resultCache.stats()["misses"])
+
+    # --------------------------------------------------------------------------
+    def test_formEncoded(self):
+        """Form-encoded params get the same response as JSON ones."""
+        status, headers, fromJson = postJson("/dockparams", DOCKING_PARAMS)
+        status, headers, fromForm = callApp("POST", "/dockparams",
+                                            b"t_aft=8.2&t_coast=0&t_fore=13.1",
+                                            CONTENT_TYPE="application/x-www-form-urlencoded")
+        self.assertEqual("200 OK", status)
+        self.assertEqual(fromJson, fromForm)
+        self.assertEqual(1, resultCache.stats()["hits"])
+
+    # --------------------------------------------------------------------------
+    def test_adminCache(self):
+        """/admin/cache reports the cache statistics, and a POST clears them."""
+        postJson("/dockparams", DOCKING_PARAMS)
+        status, headers, body = callApp("GET", "/admin/cache")
+        self.assertEqual("application/json", headers["Content-type"])
+        self.assertEqual(1, json.loads(body.decode("utf-8"))["size"])
+
+        status, headers, body = callApp("POST", "/admin/cache")
+        self.assertEqual(0, json.loads(body.decode("utf-8"))["size"])
+        self.assertEqual(0, resultCache.stats()["size"])
+
+
+# ------------------------------------------------------------------------------
+class StaticTestCase(unittest.TestCase):
+    """
+    Static files are served with an ETag, and gzipped for clients that accept it.
+    """
+
+    PATH = "/" + FlightService.JQUERY
+
+    # --------------------------------------------------------------------------
+    def test_etag(self):
+        """A request with the current ETag gets 304 Not Modified and no body."""
+        status, headers, body = callApp("GET", self.PATH)
+        self.assertEqual("200 OK", status)
+        self.assertEqual(str(len(body)), headers["Content-Length"])
+        self.assertNotIn("Content-Encoding", headers)
+
+        status, headers, body = callApp("GET", self.PATH, HTTP_IF_NONE_MATCH=headers["ETag"])
+        self.assertEqual("304 Not Modified", status)
+        self.assertEqual(b"", body)
+
+    # --------------------------------------------------------------------------
+    def test_gzip(self):
+        """A client that accepts gzip gets the compressed file, with its own ETag."""
+        status, headers, plain = callApp("GET", self.PATH)
+        plainEtag = headers["ETag"]
+        status, headers, compressed = callApp("GET", self.PATH, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual("gzip", headers["Content-Encoding"])
+        self.assertEqual("Accept-Encoding", headers["Vary"])
+        self.assertNotEqual(plainEtag, headers["ETag"])
+        self.assertLess(len(compressed), len(plain))
+        self.assertEqual(plain, gzip.GzipFile(fileobj=io.BytesIO(compressed)).read())
+
+        status, headers, body = callApp("GET", self.PATH, HTTP_IF_NONE_MATCH=plainEtag,
+                                        HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual("200 OK", status)
+
+    # --------------------------------------------------------------------------
+    def test_head(self):
+        """HEAD gets the headers of the file without its body."""
+        status, headers, body = callApp("HEAD", self.PATH)
+        self.assertEqual("200 OK", status)
+        self.assertNotEqual("0", headers["Content-Length"])
+        self.assertEqual(b"", body)
+
+
+# ------------------------------------------------------------------------------
+class BatchTestCase(unittest.TestCase):
+    """
+    /dockparams/batch simulates a JSON array of profiles.
+    """
+
+    # --------------------------------------------------------------------------
+    def test_batch(self):
+        """Results come back in order, and a bad profile gets an error."""
+        profiles = [DOCKING_PARAMS, {"t_aft": 1.0}, dict(DOCKING_PARAMS, dist=0.0)]
+        status, headers, body = postJson("/dockparams/batch", profiles)
+        self.assertEqual("200 OK", status)
+        results = json.loads(body.decode("utf-8"))
+        self.assertEqual(3, len(results))
+        self.assertTrue(results[0]["success"])
+        self.assertFalse(results[1]["success"])
+        self.assertIn("error", results[2])
+
+        status, headers, single = postJson("/dockparams", DOCKING_PARAMS)
+        self.assertIn("Outcome: {}\n".format(results[0]["outcome"]).encode("utf-8"), single)
+
+    # --------------------------------------------------------------------------
+    def test_chunks(self):
+        """A batch longer than BATCH_CHUNK_SIZE is simulated a chunk at a time."""
+        profiles = [dict(DOCKING_PARAMS, t_coast=0.1 * i) for i in range(7)]
+        chunkSize = FlightService.BATCH_CHUNK_SIZE
+        FlightService.BATCH_CHUNK_SIZE = 3
+        try:
+            status, headers, body = postJson("/dockparams/batch", profiles)
+        finally:
+            FlightService.BATCH_CHUNK_SIZE = chunkSize
+        results = json.loads(body.decode("utf-8"))
+        self.assertEqual(list(FlightService.batchResults([FlightService.makeFlightParams(p) for p in profiles])),
+                         results)
+
+    # --------------------------------------------------------------------------
+    def test_badBody(self):
+        """A body that is not an array of objects is a 400."""
+        for body in ({"t_aft": 1.0}, [1, 2], [{"t_aft": "soon"}]):
+            status, headers, response = postJson("/dockparams/batch", body)
+            self.assertEqual("400 Bad Request", status, body)
+
+
+# ------------------------------------------------------------------------------
+class TrajectoryTestCase(unittest.TestCase):
+    """
+    /dockparams/trajectory streams the samples of a flight as NDJSON.
+    """
+
+    QUERY = "t_aft=8.2&t_coast=0&t_fore=13.1"
+
+    # --------------------------------------------------------------------------
+    def samples(self, query):
+        """Returns: the samples of a trajectory request."""
+        status, headers, body = callApp("GET", "/dockparams/trajectory", query=query)
+        self.assertEqual("200 OK", status)
+        self.assertEqual("application/x-ndjson", headers["Content-type"])
+        return [json.loads(line) for line in body.decode("utf-8").splitlines()]
+
+    # --------------------------------------------------------------------------
+    def test_trajectory(self):
+        """Samples are dt apart from t = 0 to the end of the flight."""
+        samples = self.samples(self.QUERY + "&dt=1")
+        self.assertEqual(0.0, samples[0]["t"])
+        self.assertEqual(0.0, samples[0]["distance"])
+        self.assertEqual("ACCELERATE", samples[0]["phase"])
+        self.assertEqual([1.0, 2.0], [s["t"] for s in samples[1:3]])
+        self.assertEqual(sorted(s["distance"] for s in samples), [s["distance"] for s in samples])
+
+        status, headers, body = postJson("/dockparams/batch", [DOCKING_PARAMS])
+        result = json.loads(body.decode("utf-8"))[0]
+        self.assertAlmostEqual(result["duration"], samples[-1]["t"])
+        self.assertAlmostEqual(result["v_end"], samples[-1]["velocity"])
+
+    # --------------------------------------------------------------------------
+    def test_maxSamples(self):
+        """dt is increased so no more than MAX_TRAJECTORY_SAMPLES are returned."""
+        maxSamples = FlightService.MAX_TRAJECTORY_SAMPLES
+        FlightService.MAX_TRAJECTORY_SAMPLES = 5
+        try:
+            samples = self.samples(self.QUERY + "&dt=0.001")
+        finally:
+            FlightService.MAX_TRAJECTORY_SAMPLES = maxSamples
+        self.assertEqual(5, len(samples))
+
+    # --------------------------------------------------------------------------
+    def test_badDt(self):
+        """A dt that is not a finite number greater than 0 is a 400."""
+        for dt in ("0", "-1", "inf", "nan", "soon"):
+            status, headers, body = callApp("GET", "/dockparams/trajectory",
+                                            query=self.QUERY + "&dt=" + dt)
+            self.assertEqual("400 Bad Request", status, dt)
+
+
+# ------------------------------------------------------------------------------
+class HealthTestCase(unittest.TestCase):
+    """
+    /healthz reports that the server process is up.
+    """
+
+    # --------------------------------------------------------------------------
+    def test_healthz(self):
+        """The health check names this process and is never cached."""
+        status, headers, body = callApp("GET", "/healthz")
+        self.assertEqual("200 OK", status)
+        self.assertEqual("no-cache", headers["Cache-Control"])
+        health = json.loads(body.decode("utf-8"))
+        self.assertEqual("ok", health["status"])
+        self.assertEqual(os.getpid(), health["pid"])
+        self.assertLessEqual(0.0, health["uptime"])
+
+    # --------------------------------------------------------------------------
+    def test_notFound(self):
+        """An unknown path is a 404."""
+        status, headers, body = callApp("GET", "/nowhere")
+        self.assertEqual("404 Not Found", status)
+
+
+# ------------------------------------------------------------------------------
+if __name__ == '__main__':
+    unittest.main()
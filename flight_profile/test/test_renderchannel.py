@@ -0,0 +1,94 @@
+# ------------------------------------------------------------------------------
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+# ------------------------------------------------------------------------------
+"""
+Unit tests for the RenderChannel between the Dock station and the render process.
+"""
+
+import unittest
+from multiprocessing import Process
+from time import time
+
+from flight_profile.RenderChannel import RenderChannel
+
+
+# ------------------------------------------------------------------------------
+def echoRenderer(channel):
+    """ A stand-in render process: reports each command until QUIT """
+    channel.sendEvent(RenderChannel.STARTED)
+    while True:
+        command = channel.waitCommand(5.0)
+        if command is None:
+            return
+        cmd, args, latency = command
+        if cmd == "QUIT":
+            channel.sendEvent(RenderChannel.STOPPED)
+            return
+        channel.firstFrame(latency)
+        channel.sendEvent(RenderChannel.RESULT, (cmd, args))
+
+
+# ------------------------------------------------------------------------------
+class RenderChannelTestCase(unittest.TestCase):
+    """
+    Sends commands to a child process and checks the events that come back.
+    """
+
+    # --------------------------------------------------------------------------
+    def setUp(self):
+        """Start the stand-in render process."""
+        self.channel = RenderChannel()
+        self.process = Process(target=echoRenderer, args=(self.channel,))
+        self.process.start()
+        self.assertEqual((RenderChannel.STARTED, None), self.channel.pollEvent(5.0))
+
+    # --------------------------------------------------------------------------
+    def tearDown(self):
+        """Stop the render process."""
+        self.channel.sendCommand("QUIT")
+        self.process.join(5.0)
+
+    # --------------------------------------------------------------------------
+    def test_roundTrip(self):
+        """Commands arrive in order, and latency is measured from the request."""
+        tRequest = time() - 0.05
+        self.channel.sendCommand("WELCOME", "Team", tRequest=tRequest)
+        self.channel.sendCommand("RUN", {"tAft": 8.2})
+
+        kind, latency = self.channel.pollEvent(5.0)
+        self.assertEqual(RenderChannel.FIRST_FRAME, kind)
+        self.assertEqual("WELCOME", latency["cmd"])
+        self.assertEqual(tRequest, latency["tRequest"])
+        self.assertLessEqual(50.0, latency["queueMs"])
+        self.assertAlmostEqual(latency["queueMs"] + latency["renderMs"], latency["totalMs"], delta=1e-3)
+        self.assertEqual((RenderChannel.RESULT, ("WELCOME", "Team")), self.channel.pollEvent(5.0))
+
+        kind, latency = self.channel.pollEvent(5.0)
+        self.assertEqual("RUN", latency["cmd"])
+        self.assertLessEqual(latency["tRequest"], latency["tSent"])
+        self.assertLessEqual(latency["tSent"], latency["tReceived"])
+        self.assertLessEqual(0.0, latency["renderMs"])
+        self.assertEqual((RenderChannel.RESULT, ("RUN", {"tAft": 8.2})), self.channel.pollEvent(5.0))
+
+    # --------------------------------------------------------------------------
+    def test_stop(self):
+        """QUIT is answered with STOPPED, and nothing else is pending."""
+        self.assertIsNone(self.channel.pollEvent(0.01))
+        self.channel.sendCommand("QUIT")
+        self.assertEqual((RenderChannel.STOPPED, None), self.channel.pollEvent(5.0))
+
+
+# ------------------------------------------------------------------------------
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+# ------------------------------------------------------------------------------
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+# ------------------------------------------------------------------------------
+"""
+Unit tests for the DockSim parameter sweep.
+"""
+
+import itertools
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+# sweep imports DockSim as a top-level module, as when it is run as a script
+# from the flight_profile directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from flight_profile.DockSim import FlightParams, np, simulate_batch
+try:
+    from flight_profile import sweep
+except ImportError:  # sweep needs numpy
+    sweep = None
+
+
+# ------------------------------------------------------------------------------
+class Interrupt(Exception):
+    """ Stands in for the Ctrl-C that stops a sweep """
+
+
+# ------------------------------------------------------------------------------
+@unittest.skipIf(np is None, "numpy is not installed")
+class SweepTestCase(unittest.TestCase):
+    """
+    Sweeps a small grid in small chunks, with an interruption.
+    """
+
+    # --------------------------------------------------------------------------
+    def setUp(self):
+        """Make an empty output directory and a 4 x 2 x 5 grid (6 chunks of 7)."""
+        self.outDir = tempfile.mkdtemp()
+        self.axes = (sweep.gridAxis(7.0, 8.5, 0.5), sweep.gridAxis(0.0, 0.1), sweep.gridAxis(11.0, 15.0, 1.0))
+        self.chunkSize = 7
+
+    # --------------------------------------------------------------------------
+    def tearDown(self):
+        """Remove the output directory."""
+        shutil.rmtree(self.outDir)
+
+    # --------------------------------------------------------------------------
+    def runSweep(self, stopAfter=None):
+        """Run the sweep, raising Interrupt once stopAfter chunks are done.
+
+        Returns:
+            (the sweep's result, the chunks done count passed to each progress call)
+        """
+        counts = []
+        def progress(nDone, nTotal):
+            counts.append(nDone)
+            if nDone == stopAfter:
+                raise Interrupt()
+        result = sweep.sweep(*self.axes, outDir=self.outDir, workers=2,
+                             chunkSize=self.chunkSize, progress=progress)
+        return result, counts
+
+    # --------------------------------------------------------------------------
+    def test_resume(self):
+        """An interrupted sweep resumes from its checkpoint and matches simulate_batch()."""
+        self.assertRaises(Interrupt, self.runSweep, 2)
+        with open(os.path.join(self.outDir, sweep.CHECKPOINT_FILE)) as f:
+            self.assertEqual(2, len(json.load(f)["done"]))
+
+        (outcome, velocity, fuel), counts = self.runSweep()
+        self.assertEqual([3, 4, 5, 6], counts)
+
+        profiles = [FlightParams(tAft=tAft, tCoast=tCoast, tFore=tFore, tSim=0, **sweep.DEFAULT_CAPSULE)
+                    for tAft, tCoast, tFore in itertools.product(*self.axes)]
+        expected = simulate_batch(profiles)
+        self.assertEqual([str(o) for o in expected["outcome"]],
+                         [sweep.OUTCOME_CODES[code] for code in outcome.ravel()])
+        self.assertTrue(np.array_equal(expected["currVelocity"], velocity.ravel()))
+        self.assertTrue(np.array_equal(expected["fuelRemaining"], fuel.ravel()))
+
+    # --------------------------------------------------------------------------
+    def test_differentSweep(self):
+        """A checkpoint is not used for a sweep with other parameters."""
+        self.assertRaises(Interrupt, self.runSweep, 1)
+        self.chunkSize = 8
+        self.assertRaises(ValueError, self.runSweep)
+
+
+# ------------------------------------------------------------------------------
+if __name__ == '__main__':
+    unittest.main()
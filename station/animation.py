@@ -0,0 +1,270 @@
+# ------------------------------------------------------------------------------
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+# ------------------------------------------------------------------------------
+"""
+Provides one scheduler thread for every LED animation of the station, and the
+brightness curves (fade, pulse, flash, urgency ramp) that it runs.
+
+A curve is a step function: step(now) sets the brightness of an LED for time
+now and returns the seconds until it needs to be called again, or None when
+the animation is over.  Brightness is from 0.0 (off) to 1.0 (full).
+"""
+
+import heapq
+import logging
+import logging.handlers
+import sys
+import threading
+from time import time
+import traceback
+
+
+# ------------------------------------------------------------------------------
+class Animation(object):
+    """
+    A handle for a scheduled animation, used to cancel it.
+    """
+
+    # --------------------------------------------------------------------------
+    def __init__(self, animator, step):
+        self._animator = animator
+        self.step = step
+        self.cancelled = False
+        self.done = False
+
+    # --------------------------------------------------------------------------
+    def cancel(self):
+        """Stop the animation.  Once this returns, its step is not called again."""
+        self._animator.cancel(self)
+
+
+# ------------------------------------------------------------------------------
+class LedAnimator(object):
+    """
+    Runs the steps of every animation on one thread, from a heap of deadlines.
+
+    The thread sleeps until the earliest deadline, so a flashing LED costs two
+    wake-ups per period and an idle station costs none.  Steps run with the
+    animator's lock held, so cancel() waits for a step that is running.
+    """
+
+    # --------------------------------------------------------------------------
+    def __init__(self):
+        """Create the animator and start its thread."""
+        self._queue = []  # heap of (deadline, seq, Animation)
+        self._seq = 0
+        self._ready = threading.Condition(threading.RLock())
+        self._timeToExit = False
+
+        self._thread = threading.Thread(target=self.run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    # --------------------------------------------------------------------------
+    def schedule(self, step, delaySec=0.0):
+        """Start an animation.
+
+        Args:
+            step (callable): step(now) returns the seconds until the next step,
+                or None when the animation is over
+            delaySec (float): when to call the first step; with no delay the
+                first step runs before schedule() returns
+        Returns:
+            An Animation
+        """
+        animation = Animation(self, step)
+        with self._ready:
+            now = time()
+            if delaySec > 0:
+                self._push(now + delaySec, animation)
+            else:
+                self._step(animation, now, now)
+            self._ready.notify()
+        return animation
+
+    # --------------------------------------------------------------------------
+    def cancel(self, animation):
+        """Stop an animation (see Animation.cancel())."""
+        with self._ready:
+            animation.cancelled = True
+            animation.done = True
+
+    # --------------------------------------------------------------------------
+    def _push(self, deadline, animation):
+        """Add an animation to the heap (the lock must be held)."""
+        heapq.heappush(self._queue, (deadline, self._seq, animation))
+        self._seq += 1
+
+    # --------------------------------------------------------------------------
+    def run(self):
+        """Call the steps as they come due until close() is called."""
+        logger.debug('Starting LED animator thread')
+        with self._ready:
+            while not self._timeToExit:
+                if not self._queue:
+                    self._ready.wait()
+                    continue
+                deadline, seq, animation = self._queue[0]
+                if animation.cancelled:
+                    heapq.heappop(self._queue)
+                    continue
+                now = time()
+                if deadline > now:
+                    self._ready.wait(deadline - now)
+                    continue
+
+                heapq.heappop(self._queue)
+                self._step(animation, deadline, now)
+
+    # --------------------------------------------------------------------------
+    def _step(self, animation, deadline, now):
+        """Call an animation's step and schedule the next one (the lock must be held)."""
+        try:
+            delay = animation.step(now)
+        except Exception as e:
+            exType, ex, tb = sys.exc_info()
+            logger.critical("Exception occurred of type %s in LED animation" % (exType.__name__))
+            logger.critical(str(e))
+            traceback.print_tb(tb)
+            delay = None
+
+        if delay is None or animation.cancelled:
+            animation.done = True
+        else:
+            # keep a fixed rate, unless it has fallen behind by a whole step
+            self._push(max(deadline + delay, now), animation)
+
+    # --------------------------------------------------------------------------
+    def close(self):
+        """Stop the animator thread."""
+        with self._ready:
+            self._timeToExit = True
+            self._ready.notify()
+        self._thread.join()
+
+
+# ------------------------------------------------------------------------------
+_sharedAnimator = None
+_sharedAnimatorLock = threading.Lock()
+
+# ------------------------------------------------------------------------------
+def ledAnimator():
+    """Return the LedAnimator shared by every LED of the station, creating it
+    the first time.
+    """
+    global _sharedAnimator
+    with _sharedAnimatorLock:
+        if _sharedAnimator is None:
+            _sharedAnimator = LedAnimator()
+        return _sharedAnimator
+
+
+# ------------------------------------------------------------------------------
+def fade(setLevel, start, end, durationSec, stepSec):
+    """Return a step that changes the brightness from start to end.
+
+    Args:
+        setLevel (callable): setLevel(level) sets the LED brightness
+        start, end (float): the brightness at the start and the end
+        durationSec (float): how long the fade takes
+        stepSec (float): the time between brightness changes
+    """
+    began = []
+    def step(now):
+        if not began:
+            began.append(now)
+        progress = (now - began[0]) / durationSec if durationSec > 0 else 1.0
+        if progress >= 1.0:
+            setLevel(end)
+            return None
+        setLevel(start + (end - start) * progress)
+        return stepSec
+    return step
+
+
+# ------------------------------------------------------------------------------
+def flash(setLevel, onSec, offSec):
+    """Return a step that turns the LED fully on and off until cancelled."""
+    state = {'on': False}
+    def step(now):
+        state['on'] = not state['on']
+        setLevel(1.0 if state['on'] else 0.0)
+        return onSec if state['on'] else offSec
+    return step
+
+
+# ------------------------------------------------------------------------------
+def pulse(setLevel, fadeInSec, fadeOutSec, onSec, offSec, stepSec):
+    """Return a step that fades the LED in, holds it on, fades it out and holds
+    it off, until cancelled.
+
+    The brightness is only changed every stepSec during the fades; the step
+    sleeps through the on and off times.
+    """
+    period = fadeInSec + onSec + fadeOutSec + offSec
+    began = []
+    def step(now):
+        if not began:
+            began.append(now)
+        t = (now - began[0]) % period if period > 0 else 0.0
+        if t < fadeInSec:
+            setLevel(t / fadeInSec)
+            return min(stepSec, fadeInSec - t)
+        t -= fadeInSec
+        if t < onSec:
+            setLevel(1.0)
+            return onSec - t
+        t -= onSec
+        if t < fadeOutSec:
+            setLevel(1.0 - t / fadeOutSec)
+            return min(stepSec, fadeOutSec - t)
+        t -= fadeOutSec
+        setLevel(0.0)
+        return max(offSec - t, stepSec)
+    return step
+
+
+# ------------------------------------------------------------------------------
+def urgencyRamp(setLevel, durationSec, maxPeriodSec, minPeriodSec, onSec):
+    """Return a step that flashes the LED faster and faster.
+
+    Each flash is on for onSec.  The period between flashes shrinks from
+    maxPeriodSec at the start to minPeriodSec at durationSec, when the
+    animation ends (leaving the LED as it is).
+    """
+    state = {'on': False}
+    began = []
+    def step(now):
+        if not began:
+            began.append(now)
+        elapsed = now - began[0]
+        if elapsed >= durationSec:
+            return None
+        state['on'] = not state['on']
+        setLevel(1.0 if state['on'] else 0.0)
+        if state['on']:
+            return onSec
+        progress = elapsed / durationSec
+        period = (1.0 - progress) * maxPeriodSec + progress * minPeriodSec
+        return max(period - onSec, 0.0)
+    return step
+
+
+# ------------------------------------------------------------------------------
+# Module Initialization
+# ------------------------------------------------------------------------------
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.handlers.SysLogHandler(address = '/dev/log')
+logger.addHandler(handler)
@@ -21,30 +21,71 @@ import dbus
 import json
 import logging
 import logging.handlers
-import sys
+import Queue
+import random
+import re
+from threading import Lock
 from threading import Thread
 from time import sleep
 from time import time
 import httplib
-import traceback
+import uuid
 
 from flask import Flask
 from flask import request
 from flask import jsonify
 import requests
+from requests.adapters import HTTPAdapter
 from tornado.wsgi import WSGIContainer
 from tornado.httpserver import HTTPServer
+from tornado import gen
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpclient import HTTPError
+from tornado.httpclient import HTTPRequest
 from tornado.ioloop import IOLoop
+from tornado.ioloop import PeriodicCallback
+from tornado.web import Application
+from tornado.web import RequestHandler
 
+from station.i2cbus import sharedBusStats
 from station.interfaces import IConnectionManager
+from station.outbox import Outbox
 from station.state import HttpMethod
 from station.state import State
+from station.util import Future
 from station.util import get_ip_address
+from station.util import LatencyHistogram
 
 from collections import namedtuple
 
 from pi_serial import PiSerial
 
+# Defaults for the MS connection settings in runstation.conf
+DEFAULT_CONNECT_TIMEOUT_SEC = 3.05
+DEFAULT_READ_TIMEOUT_SEC = 10.0
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_RETRY_BACKOFF_SEC = 0.5
+MAX_RETRY_BACKOFF_SEC = 8.0
+DEFAULT_POOL_SIZE = 4
+DEFAULT_CONNECTION_CHECK_SEC = 5.0
+DEFAULT_LISTEN_PORT = 5000
+DEFAULT_HEARTBEAT_SEC = 15.0
+DEFAULT_STATUS_URL_RULE = '/rpi/status'
+LOOP_LAG_PROBE_SEC = 1.0
+DEFAULT_OUTBOX_PATH = '/var/lib/brata/outbox.sqlite'
+DEFAULT_MAX_SUBMITS_IN_FLIGHT = 4
+DEFAULT_SUBMIT_TIMEOUT_SEC = 15.0
+
+# Responses that mean the MS (or a proxy in front of it) is temporarily unavailable
+RETRY_STATUS_CODES = (httplib.BAD_GATEWAY, httplib.SERVICE_UNAVAILABLE, httplib.GATEWAY_TIMEOUT)
+
+# ------------------------------------------------------------------------------
+class SubmitError(Exception):
+    """
+    The exception of a submitAsync() Future that got no answer from the MS.
+    """
+    pass
+
 # ------------------------------------------------------------------------------
 class ConnectionManager(IConnectionManager):
     """
@@ -85,7 +126,7 @@ class ConnectionManager(IConnectionManager):
 
         self._ifName = config.NetInterface  # interface name to check first
         self._ipAddr = self.getIp()  # get IP address of active interface
-        self._listenPort = 5000
+        self._listenPort = getattr(config, 'ListenPort', DEFAULT_LISTEN_PORT)
 
         self._joinUrl = config.JoinUrl
         self._leaveUrl = config.LeaveUrl
@@ -96,12 +137,46 @@ class ConnectionManager(IConnectionManager):
         self._dockLatchUrl = config.LatchUrl # just for the Dock station
         self._stationType = stationTypeId
         self._stationId = config.StationId
+        self._config = config
         self._resetPin = config.ResetPIN
         self._shutdownPin = config.ShutdownPIN
         self._reallyShutdown = config.ReallyShutdown
         self._connected = False
         self._listening = False
         self._timeToExit = False
+        self._server = None       # the HTTPServer for MS messages, once joined
+        self._checking = False    # True while checkConnection() is running
+        self._connectionCheckSec = getattr(config, 'ConnectionCheckSec', DEFAULT_CONNECTION_CHECK_SEC)
+        self._ioLoop = IOLoop(make_current=False)  # run by the connection thread
+        self._startTime = time()
+        self._loopLagMs = 0.0  # how late the IOLoop ran the last lag probe
+        self._heartbeatUrl = getattr(config, 'HeartbeatUrl', None)
+        self._heartbeatSec = getattr(config, 'HeartbeatSec', DEFAULT_HEARTBEAT_SEC)
+
+        # All messages to the MS share one HTTP session, which keeps the
+        # connections open between messages
+        self._timeout = (getattr(config, 'ConnectTimeoutSec', DEFAULT_CONNECT_TIMEOUT_SEC),
+                         getattr(config, 'ReadTimeoutSec', DEFAULT_READ_TIMEOUT_SEC))
+        self._maxRetries = getattr(config, 'MaxRetries', DEFAULT_MAX_RETRIES)
+        self._retryBackoffSec = getattr(config, 'RetryBackoffSec', DEFAULT_RETRY_BACKOFF_SEC)
+        self._session = self.createSession(getattr(config, 'PoolSize', DEFAULT_POOL_SIZE))
+        self._latency = {}  # endpoint URL -> LatencyHistogram
+        self._latencyLock = Lock()
+
+        # Results for the MS go through a durable outbox, so they are kept
+        # (and sent later) if the MS can't be reached, and submitting never
+        # waits for the network
+        self._outbox = Outbox(getattr(config, 'OutboxPath', DEFAULT_OUTBOX_PATH),
+                              retryDelay=self.retryDelay)
+
+        # Submissions waiting for the MS to reply.  Station state changes
+        # (e.g. for the submissions that are done) are made in order by the
+        # dispatcher thread, so no HTTP thread waits for them
+        self._maxSubmitsInFlight = getattr(config, 'MaxSubmitsInFlight', DEFAULT_MAX_SUBMITS_IN_FLIGHT)
+        self._submitTimeoutSec = getattr(config, 'SubmitTimeoutSec', DEFAULT_SUBMIT_TIMEOUT_SEC)
+        self._submits = {}  # message id -> (Future, deadline)
+        self._submitsLock = Lock()
+        self._dispatchQueue = Queue.Queue()  # (function, args) to call, or None to wake
 
         # _callback is actually an instance of StationLoader.
         # StationLoader is defined in main.py.
@@ -122,6 +197,27 @@ class ConnectionManager(IConnectionManager):
         self._callback = station
         #TODO? self._handler = todoHandler
 
+        self.addUrlRules(config)
+
+        # The ConnectionManager (this class) runs an IOLoop in a separate
+        # thread, so it can listen for incoming HTTP requests.  While
+        # listening, the loop periodically sends a Join request to the
+        # MasterServer (until it succeeds, and again to keep the MS up to
+        # date), and after the first successful Join it starts an HTTPServer
+        # to handle the incoming requests.
+        self._thread = Thread(target = self.run)
+        self._thread.daemon = True
+        self._thread.start()  # creates the thread, which calls the target method (self.run)
+
+        self._dispatcher = Thread(target = self.runDispatcher)
+        self._dispatcher.daemon = True
+        self._dispatcher.start()
+
+        self._outbox.start(self.deliver)
+
+    # --------------------------------------------------------------------------
+    def addUrlRules(self, config):
+        """ Add the URL rules for the messages from the MS to the Flask app """
         # Each HTTP message that will be received by the station
         # needs to have a rule defined for it here.  The rule
         # specifies the URL, the HTTP method (GET, POST), and
@@ -146,14 +242,10 @@ class ConnectionManager(IConnectionManager):
                              self.shutdown,
                              methods=['GET','POST'])
 
-        # The ConnectionManager (this class) runs in a separate
-        # thread, so it can listen for incoming HTTP requests.
-        # The thread will first send a Join request to the
-        # MasterServer, then upon a successful Join, will
-        # start an HTTPServer to handle the incoming requests.
-        self._thread = Thread(target = self.run)
-        self._thread.daemon = True
-        self._thread.start()  # creates the thread, which calls the target method (self.run)
+        self._app.add_url_rule(getattr(config, 'StatusUrlRule', DEFAULT_STATUS_URL_RULE),
+                               'status',
+                               self.status,
+                               methods=['GET'])
 
     # --------------------------------------------------------------------------
     def getIp(self):
@@ -201,68 +293,141 @@ class ConnectionManager(IConnectionManager):
         Stops the listener loop and terminates the listener thread.
         """
         logger.debug('Exiting connection manager')
-        self.stopListening()
         self._timeToExit = True
+        self.stopListening()
         self._thread.join()
+        self._outbox.close()
 
     # --------------------------------------------------------------------------
     def run(self):
-        """Loops join requests to the Master Server.
+        """Runs the IOLoop of the connection manager.
+
+        This is the connection thread.  The IOLoop checks the connection to
+        the Master Server every ConnectionCheckSec while the Connection Manager
+        is listening (see checkConnection()), and handles the incoming
+        requests.  It runs until stopListening() is called after __exit__().
+        """
+        logger.info('Starting IOLoop thread for connection manager')
+
+        self._ioLoop.make_current()
+        self._httpClient = AsyncHTTPClient()
+        checker = PeriodicCallback(self.checkConnection, self._connectionCheckSec * 1000)
+        checker.start()
+        heartbeat = None
+        if self._heartbeatUrl and self._heartbeatSec > 0:
+            heartbeat = PeriodicCallback(self.sendHeartbeat, self._heartbeatSec * 1000)
+            heartbeat.start()
+        self.probeLoopLag(time())
+        self._ioLoop.start()
+
+        checker.stop()
+        if heartbeat:
+            heartbeat.stop()
+        self._httpClient.close()
+        self._ioLoop.close()
+        logger.info('Stopping IOLoop thread for connection manager')
+
+    # --------------------------------------------------------------------------
+    @gen.coroutine
+    def checkConnection(self):
+        """Joins (or re-joins) the Master Server (on the IOLoop).
+
+        The join is repeated while connected, so a restarted MS learns about
+        the station again within ConnectionCheckSec.  The HTTPServer for the
+        incoming requests is started after the first successful join.
+        """
+        if not self._listening or self._checking:
+            return
+        self._checking = True
+        try:
+            connected = yield self.joinAsync()
+        except Exception, e:
+            logger.critical('Join failed: %s' % (e))
+            connected = False
+        finally:
+            self._checking = False
+
+        if connected and self._listening and self._server is None:
+            logger.debug('Starting HTTP server listening on port {}.'.format(self._listenPort))
+            self._server = self.createHttpServer()
+            self._server.listen(self._listenPort)
+        if connected != self._connected:
+            self._connected = connected
 
-        While the Connection Manager is listening, this will loop join requests
-        to establish a connection with the Master Server.
+    # --------------------------------------------------------------------------
+    def probeLoopLag(self, dueTime):
+        """Measures how late the IOLoop runs callbacks (on the IOLoop).
 
         Args:
-            self ConnectionManager: Self reference to this class.
-        Returns:
-            N/A
-        Raises:
-            ConnectionError: if connection request to Master Server fails.
-            Exception: if unexpected exception occurs.
+            dueTime (float): when this probe was scheduled to run
+        """
+        now = time()
+        self._loopLagMs = max(0.0, (now - dueTime) * 1000.0)
+        self._ioLoop.call_later(LOOP_LAG_PROBE_SEC, self.probeLoopLag, now + LOOP_LAG_PROBE_SEC)
+
+    # --------------------------------------------------------------------------
+    @gen.coroutine
+    def sendHeartbeat(self):
+        """Sends the status snapshot to the MS while connected (on the IOLoop).
 
+        If the MS can't be reached, the station is marked not connected, so
+        the next connection check joins again.
         """
-        logger.info('Starting TODO thread for connection manager')
+        if not self._connected:
+            return
+        try:
+            (status, response) = yield self.callServiceAsync(HttpMethod.POST, self._heartbeatUrl,
+                                                             self.statusSnapshot())
+        except IOError, e:
+            logger.critical('Heartbeat failed: %s' % (e))
+            self._connected = False
+            return
+        if status != httplib.OK:
+            logger.warning('Unexpected HTTP response %s received from service %s' % (status, self._heartbeatUrl))
 
-        sleep_time = 5 #TODO load this from runstation.conf file
-#         sleep_time = 1 # make it more responsive #TODO load this from runstation.conf file
+    # --------------------------------------------------------------------------
+    def statusSnapshot(self):
+        """Return the station status, as sent in the heartbeat and by GET status."""
+        state = self._callback.State
+        with self._submitsLock:
+            submitsInFlight = len(self._submits)
+        return {
+                 'station_id'         : self._stationId,
+                 'station_type'       : self._stationType,
+                 'message_timestamp'  : self.timestamp(),
+                 'state'              : State.NAMES[state] if state in range(len(State.NAMES)) else str(state),
+                 'connected'          : self._connected,
+                 'uptime_sec'         : round(time() - self._startTime, 1),
+                 'loop_lag_ms'        : round(self._loopLagMs, 1),
+                 'outbox_pending'     : self._outbox.pendingCount(),
+                 'submits_in_flight'  : submitsInFlight,
+                 'dispatch_queue'     : self._dispatchQueue.qsize(),
+                 'i2c_bus'            : sharedBusStats(),
+               }
+
+    # --------------------------------------------------------------------------
+    @gen.coroutine
+    def disconnect(self):
+        """Leaves the Master Server and stops the HTTPServer (on the IOLoop).
 
-        while not self._timeToExit:
+        Stops the IOLoop too if it is time to exit.
+        """
+        if self._connected:
             try:
-                logger.debug('Loop begin for connection manager')
-                if self._listening:
-
-                    if (not self._connected):
-                        logger.debug('Not connected. Attempting to join.')
-                        self.join()
-                        logger.debug('Join successful. Setting _connected.')
-                        self._connected = True
-
-                        logger.debug('Starting HTTP server listening on port {}.'.format(self._listenPort))
-                        server = HTTPServer(WSGIContainer(self._app))
-                        server.listen(self._listenPort)
-                        logger.warning('TODO This blocks. Need to look into later. (Issue 4)')
-                        IOLoop.instance().start()
-                        logger.debug('IOLoop started.')
-                    else:
-                        logger.debug('Already connected.')
-
-                logger.debug('Connection thread sleeping for {} sec'.format(sleep_time))
-                sleep(sleep_time)
-            except requests.ConnectionError, e:
-                logger.critical(str(e))
-                self._connected = False
-                # TODO nothing to do - cannot connect because remote end is not up;
-                # just wait and try again later
-                # TODO configurable sleep time...
-                sleep(sleep_time)
+                yield self.leaveAsync()
             except Exception, e:
-                exType, ex, tb = sys.exc_info()
-                logger.critical("Exception occurred of type %s: %s" % (exType.__name__, str(e)))
-                self._connected = False
-                traceback.print_tb(tb)
+                logger.critical('Leave failed: %s' % (e))
+            self._connected = False
+        if self._server is not None:
+            self._server.stop()
+            self._server = None
+        if self._timeToExit:
+            self._ioLoop.stop()
 
-        self.leave()
-        logger.info('Stopping TODO thread for connection manager')
+    # --------------------------------------------------------------------------
+    def createHttpServer(self):
+        """ Return the HTTPServer for the messages from the MS (not yet listening) """
+        return HTTPServer(WSGIContainer(self._app))
 
     # --------------------------------------------------------------------------
     def startListening(self):
@@ -273,16 +438,18 @@ class ConnectionManager(IConnectionManager):
         """
         logger.debug('Starting listening for connection manager')
         self._listening = True
+        self._ioLoop.add_callback(self.checkConnection)
 
     # --------------------------------------------------------------------------
     def stopListening(self):
-        """ Set self._listening and self._connected to False
+        """ Set self._listening to False
 
-        Stops the connection from listening and handling incoming requests.
+        Leaves the MS and stops listening and handling incoming requests.
+        Returns at once; the IOLoop does the work.
         """
         logger.debug('Stopping listening for connection manager')
         self._listening = False
-        self._connected = False
+        self._ioLoop.add_callback(self.disconnect)
 
 
     # --------------------------------------------------------------------------
@@ -297,31 +464,107 @@ class ConnectionManager(IConnectionManager):
         return st
 
 
+    # --------------------------------------------------------------------------
+    def createSession(self, poolSize):
+        """ Create the HTTP session used for all messages to the MS.
+
+        The session keeps up to poolSize connections to the MS open, so a
+        message doesn't have to wait for a new TCP connection.  Retries are
+        done by callService(), so the connection pool doesn't retry.
+
+        Args:
+            poolSize (int): the most connections to keep open to one host
+        Returns:
+            a requests.Session
+        """
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=poolSize, max_retries=0)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers.update({ 'Content-type': 'application/json', "Accept" : "application/json" })
+        return session
+
+    # --------------------------------------------------------------------------
+    def latencyHistogram(self, endpointUrl):
+        """ Return the LatencyHistogram for messages sent to endpointUrl """
+        with self._latencyLock:
+            histogram = self._latency.get(endpointUrl)
+            if histogram is None:
+                histogram = self._latency[endpointUrl] = LatencyHistogram()
+            return histogram
+
+    # --------------------------------------------------------------------------
+    def latencyStats(self):
+        """ Return a dict of the latency summary for each MS endpoint URL """
+        with self._latencyLock:
+            histograms = dict(self._latency)
+        return dict((url, h.summary()) for url, h in histograms.items())
+
+    # --------------------------------------------------------------------------
+    def retryDelay(self, attempt):
+        """ Return how long to wait before retry number attempt + 1.
+
+        The delay is random, up to an exponentially growing limit, so that
+        stations that failed together don't all retry together.
+        """
+        return random.uniform(0, min(MAX_RETRY_BACKOFF_SEC, self._retryBackoffSec * 2 ** attempt))
+
     # --------------------------------------------------------------------------
     def callService(self,
                     httpMethod,
                     endpointUrl,
-                    args):
+                    args,
+                    idempotent=False):
         """ Send an HTTP message to a remote host and receive the response.
 
         Send a message using HTTP to a remote host.  The transaction type (GET, POST, etc.)
         is specified by httpMethod.  The message body is assumed to be JSON, and the
         response is also assumed to be JSON.
 
+        A message that could not be delivered because the connection could
+        not be made is retried.  An idempotent message is also retried after
+        other connection errors, timeouts, and 502/503/504 responses.  Retries
+        wait for retryDelay(), up to MaxRetries times.  The time taken by each
+        attempt is added to the endpoint's LatencyHistogram.
+
         Args:
             httpMethod   (str): the transaction type (HttpMethod.GET, HttpMethod.POST, ...)
             endpointnUrl (str): the message destination URL (http://server:port)
             args        (dict): the named fields for the msg body
+            idempotent  (bool): True if the MS does the same thing when it
+                                gets the message twice
         Returns:
             (response_status, response_data) where response_status is the status code (200, 404, ...)
             and response data is a JSON object.
+        Raises:
+            requests.RequestException: if the last attempt failed
         """
         # TODO check if args present - might be null/empty
         #args['message_timestamp'] = self.timestamp()
         logger.debug('Calling service with HTTP method %s, endpoint URL %s, and args %s' % (httpMethod, endpointUrl, args))
-        headers = { 'Content-type': 'application/json', "Accept" : "application/json" }
         data = json.dumps(args)
-        response = requests.post(endpointUrl, data=data, headers=headers)
+        histogram = self.latencyHistogram(endpointUrl)
+        attempt = 0
+        while True:
+            startTime = time()
+            try:
+                response = self._session.post(endpointUrl, data=data, timeout=self._timeout)
+            except requests.RequestException as e:
+                histogram.record((time() - startTime) * 1000.0, ok=False)
+                if isinstance(e, requests.exceptions.ConnectTimeout):
+                    retry = True  # the MS never got the message
+                else:
+                    retry = idempotent and isinstance(e, (requests.ConnectionError, requests.Timeout))
+                if not retry or attempt >= self._maxRetries:
+                    raise
+                logger.warning('Service %s failed (%s), retrying' % (endpointUrl, e))
+            else:
+                histogram.record((time() - startTime) * 1000.0, ok=response.status_code < 500)
+                if not (idempotent and response.status_code in RETRY_STATUS_CODES and attempt < self._maxRetries):
+                    break
+                logger.warning('Service %s returned %s, retrying' % (endpointUrl, response.status_code))
+            sleep(self.retryDelay(attempt))
+            attempt += 1
 
 #         logger.debug('Service returned %s with for HTTP method %s, endpoint URL %s, and args %s with headers %s, response %s, JSON response %s, and message %s' % (response.status_code, httpMethod, endpointUrl, args, response.headers, response, response.json, json.dumps(response.json)))
         logger.debug('Service returned %s with for HTTP method %s, endpoint URL %s, and args %s with headers %s, response %s, JSON response %s' % (response.status_code, httpMethod, endpointUrl, args, response.headers, response, response.json))
@@ -339,6 +582,51 @@ class ConnectionManager(IConnectionManager):
             logger.debug('json failed')
         return (response.status_code, 'None')
 
+    # --------------------------------------------------------------------------
+    @gen.coroutine
+    def callServiceAsync(self,
+                         httpMethod,
+                         endpointUrl,
+                         args):
+        """ Send an HTTP message to a remote host without blocking the IOLoop.
+
+        The same as callService(), but it runs on the IOLoop, makes one
+        attempt (the callers repeat periodically anyway), and returns a
+        Future.  Must be called on the IOLoop thread.
+
+        Returns (as a Future):
+            (response_status, response_data)
+        Raises:
+            IOError: if the connection failed or timed out
+        """
+        logger.debug('Calling service with HTTP method %s, endpoint URL %s, and args %s' % (httpMethod, endpointUrl, args))
+        request = HTTPRequest(endpointUrl, method='POST', body=json.dumps(args),
+                              headers={'Content-Type' : 'application/json'},
+                              connect_timeout=self._timeout[0],
+                              request_timeout=self._timeout[0] + self._timeout[1])
+        histogram = self.latencyHistogram(endpointUrl)
+        startTime = time()
+        try:
+            response = yield self._httpClient.fetch(request)
+        except HTTPError, e:
+            if e.response is None:  # 599: no response at all
+                histogram.record((time() - startTime) * 1000.0, ok=False)
+                raise IOError('Service %s failed: %s' % (endpointUrl, e))
+            histogram.record((time() - startTime) * 1000.0, ok=e.code < 500)
+            response = e.response
+        except Exception, e:  # socket errors
+            histogram.record((time() - startTime) * 1000.0, ok=False)
+            raise IOError('Service %s failed: %s' % (endpointUrl, e))
+        else:
+            histogram.record((time() - startTime) * 1000.0)
+
+        logger.debug('Service returned %s for HTTP method %s, endpoint URL %s' % (response.code, httpMethod, endpointUrl))
+        try:
+            retData = json.loads(response.body)
+        except:
+            retData = 'None'
+        raise gen.Return((response.code, retData))
+
 
     # ===
     # Messages from Station to MS
@@ -356,25 +644,46 @@ class ConnectionManager(IConnectionManager):
 
 #         url = self._joinUrl + "/" + self._stationId
         url = self._joinUrl
-        stationUrl = 'http://%s:%s/rpi' % (self._ipAddr, self._listenPort)
+        (status, response) = self.callService(HttpMethod.POST, url, self.joinArgs(), idempotent=True)
+        return self.checkJoinStatus(url, status)
+
+    # --------------------------------------------------------------------------
+    @gen.coroutine
+    def joinAsync(self):
+        """ Send the station JOIN msg to the MS without blocking the IOLoop (see join()).
+
+        Returns (as a Future):
+            True if the MS accepted the join
+        """
+        logger.debug('Station requesting join with master server')
+        url = self._joinUrl
+        (status, response) = yield self.callServiceAsync(HttpMethod.POST, url, self.joinArgs())
+        raise gen.Return(self.checkJoinStatus(url, status))
 
-        (status, response) = self.callService(
-            HttpMethod.POST, url,
-            {
-                'station_id'     : self._stationId,
-                'station_type'   : self._stationType,
-                'station_serial' : PiSerial.serialNumber(),
-                'station_url'    : stationUrl,
-            })
+    # --------------------------------------------------------------------------
+    def joinArgs(self):
+        """ Return the body of the JOIN msg """
+        stationUrl = 'http://%s:%s/rpi' % (self._ipAddr, self._listenPort)
+        return {
+                 'station_id'     : self._stationId,
+                 'station_type'   : self._stationType,
+                 'station_serial' : PiSerial.serialNumber(),
+                 'station_url'    : stationUrl,
+               }
 
+    # --------------------------------------------------------------------------
+    def checkJoinStatus(self, url, status):
+        """ Log the status of a JOIN msg, and return True if it succeeded """
         if status in (httplib.OK, httplib.ACCEPTED):
             logger.debug('Service %s returned OK' % (url))
+            return True
         elif status == httplib.BAD_REQUEST:
             logger.critical('Service %s returned BAD_REQUEST' % (url))
         elif status == httplib.NOT_FOUND:
             logger.critical('Service %s returned NOT_FOUND' % (url))
         else:
             logger.critical('Unexpected HTTP status %s received from service %s' % (status, url))
+        return False
 
 
     # --------------------------------------------------------------------------
@@ -383,15 +692,32 @@ class ConnectionManager(IConnectionManager):
 
         Send the station LEAVE message to the MS to tell the MS that the station
         is going offline.  If this could be done reliably, there would be no
-        need for a heartbeat message.
+        need for a heartbeat message (see sendHeartbeat()).
         """
         logger.debug('Station requesting leave from master server')
         url = "{}".format(self._leaveUrl)
         (status, response) = self.callService(HttpMethod.POST, url,
                                              {
                                                 'station_id' : self._stationId,
-                                             })
+                                             },
+                                             idempotent=True)
+        self.checkLeaveStatus(url, status)
+
+    # --------------------------------------------------------------------------
+    @gen.coroutine
+    def leaveAsync(self):
+        """ Send the station LEAVE msg to the MS without blocking the IOLoop (see leave()). """
+        logger.debug('Station requesting leave from master server')
+        url = "{}".format(self._leaveUrl)
+        (status, response) = yield self.callServiceAsync(HttpMethod.POST, url,
+                                                         {
+                                                           'station_id' : self._stationId,
+                                                         })
+        self.checkLeaveStatus(url, status)
 
+    # --------------------------------------------------------------------------
+    def checkLeaveStatus(self, url, status):
+        """ Log the status of a LEAVE msg, and the MS latency statistics """
         if status == httplib.OK:
             logger.debug('Service %s returned OK' % (url))
         elif status == httplib.NOT_FOUND:
@@ -399,6 +725,8 @@ class ConnectionManager(IConnectionManager):
         else:
             logger.critical('Unexpected HTTP response %s received from service %s' % (status, url))
 
+        logger.info('MS latency by endpoint: %s' % (json.dumps(self.latencyStats())))
+
 
     # --------------------------------------------------------------------------
     def timeExpired(self):
@@ -408,16 +736,10 @@ class ConnectionManager(IConnectionManager):
         theatric_delay_ms = 0
         candidate_answer = 0
 
-        url = "{}".format(self._timeExpiredUrl)
-        (status, response) = self.callService(HttpMethod.POST, url,
-                                              {
-                                                'station_id' : self._stationId,
-                                              })
-
-        if status == httplib.OK:
-            logger.debug('Service %s returned OK' % (url))
-        else:
-            logger.critical('Unexpected HTTP response %s received from service %s' % (status, url))
+        self.send('time_expired', self._timeExpiredUrl,
+                  {
+                    'station_id' : self._stationId,
+                  })
 
         self._callback.args = [theatric_delay_ms, candidate_answer]
         self._callback.State = State.FAILED
@@ -428,45 +750,178 @@ class ConnectionManager(IConnectionManager):
                            isCorrect, failMessage):
         """ Submit candidate answer to Master Server
 
+        The same as submitAsync(), but returns the message id.
+        """
+        return self.submitAsync(candidateAnswer, isCorrect, failMessage).messageId
+
+    # --------------------------------------------------------------------------
+    def submitAsync(self,
+                    candidateAnswer,
+                    isCorrect,
+                    failMessage,
+                    timeoutSec=None):
+        """ Submit candidate answer to Master Server without waiting for the reply
+
+        The answer is put in the outbox, and a Future is returned at once.
+        When the MS replies, the Future's result is its challenge_complete
+        value, and handleSubmissionResp() moves the station to PASSED or
+        FAILED.  If the MS does not reply within timeoutSec, or rejects the
+        answer, the Future gets a SubmitError and the station moves on using
+        its own isCorrect; the answer stays in the outbox if it can still be
+        delivered.
+
+        At most MaxSubmitsInFlight submissions may wait for the MS; past
+        that, the answer is not sent, and the Future gets a SubmitError
+        without changing the station state.
+
         Args:
             candidateAnswer (list): list of 4 values 0-7 for SECURE,
                                     list of 6 values 00-99 for RETURN
             isCorrect (string): "True" or "False"
             failMessage (string): For SECURE, "True" if isCorrect, else
                                   a message indicating failure
+            timeoutSec (float): how long to wait for the MS (default:
+                                SubmitTimeoutSec)
+        Returns:
+            A Future, with the message id of the submission as its
+            messageId (None if it was not sent)
         """
         logger.debug('Station submitting answer to master server, Answer=%s, isCorrect=%s, failMessage=%s' % (candidateAnswer, isCorrect, failMessage))
-        
-        url = self._submitUrl
-        (status, response) = self.callService(
-            HttpMethod.POST, url,
-            {
-                'station_id'        : self._stationId,
-                'message_version'   : 0,
-                'message_timestamp' : self.timestamp(),
-                'candidate_answer'  : candidateAnswer,
-                'is_correct'        : isCorrect,
-                'fail_message'      : "" if str(isCorrect).lower() == "true" else failMessage
-            })
-        
-        try:
-            challenge_complete = response["challenge_complete"]
-        except:
-             challenge_complete = None
-        
-        if status == httplib.OK:
-            logger.debug('Service %s returned OK' % (url))
-            # Note: the str() casts normalize string and bool inputs, but return a str
-            self.handleSubmissionResp(str(isCorrect),
-                                      str(challenge_complete))
-        elif status == httplib.NOT_FOUND:
-            logger.critical('Service %s returned NOT_FOUND' % (url))
+
+        future = Future()
+        future.messageId = None
+        with self._submitsLock:
+            if len(self._submits) >= self._maxSubmitsInFlight:
+                logger.critical('Not submitting answer %s: %d submissions are already waiting for the MS' % (candidateAnswer, len(self._submits)))
+                future.setException(SubmitError('Too many submissions waiting for the MS'))
+                return future
+
+            future.messageId = self.send('submit', self._submitUrl,
+                                         {
+                                           'station_id'        : self._stationId,
+                                           'message_version'   : 0,
+                                           'message_timestamp' : self.timestamp(),
+                                           'candidate_answer'  : candidateAnswer,
+                                           'is_correct'        : isCorrect,
+                                           'fail_message'      : "" if str(isCorrect).lower() == "true" else failMessage
+                                         })
+            self._submits[future.messageId] = (future, time() + (timeoutSec or self._submitTimeoutSec))
+
+        # Note: the str() cast normalizes string and bool inputs, but returns a str
+        future.addDoneCallback(lambda f: self.dispatch(self.completeSubmission, f, str(isCorrect)))
+        self._dispatchQueue.put(None)  # wake the dispatcher to watch the new deadline
+        return future
+
+    # --------------------------------------------------------------------------
+    def finishSubmit(self, messageId, result=None, exception=None):
+        """ Complete the Future of a submission, if it is still waiting. """
+        with self._submitsLock:
+            entry = self._submits.pop(messageId, None)
+        if entry is None:
+            return
+        if exception is None:
+            entry[0].setResult(result)
         else:
-            logger.critical('Unexpected HTTP response %s received from service %s' % (status, url))
+            entry[0].setException(exception)
 
-        logger.debug('SUBMIT')
-        logger.debug('Submit response: %s' % (challenge_complete))
-        return challenge_complete
+    # --------------------------------------------------------------------------
+    def completeSubmission(self, future, isCorrect):
+        """ Change the station state for a finished submission (dispatcher thread) """
+        try:
+            challengeComplete = future.result()
+        except SubmitError as e:
+            logger.critical('Submission %s failed (%s); using the station result' % (future.messageId, e))
+            challengeComplete = None
+        self.handleSubmissionResp(isCorrect, str(challengeComplete))
+
+    # --------------------------------------------------------------------------
+    def dispatch(self, function, *args):
+        """ Call function(*args) on the dispatcher thread, after the calls
+        dispatched before it.  Returns at once.
+        """
+        self._dispatchQueue.put((function, args))
+
+    # --------------------------------------------------------------------------
+    def runDispatcher(self):
+        """ Make the dispatched calls, and time out late submissions.
+
+        Runs on the dispatcher thread until the process exits.
+        """
+        while True:
+            try:
+                call = self._dispatchQueue.get(timeout=self.expireSubmits())
+            except Queue.Empty:
+                continue
+            if call is not None:
+                function, args = call
+                try:
+                    function(*args)
+                except Exception:
+                    logger.exception('Dispatched call to %s failed' % (getattr(function, '__name__', function)))
+
+    # --------------------------------------------------------------------------
+    def expireSubmits(self):
+        """ Fail the submissions that are past their deadline.
+
+        Returns:
+            Seconds until the next deadline, or None if nothing is waiting
+        """
+        now = time()
+        with self._submitsLock:
+            expired = [messageId for messageId, (future, deadline) in self._submits.items() if deadline <= now]
+            nextDeadline = min([deadline for future, deadline in self._submits.values() if deadline > now] or [None])
+        for messageId in expired:
+            logger.warning('No reply from the MS to submission %s' % (messageId))
+            self.finishSubmit(messageId, exception=SubmitError('No reply from the MS in time'))
+        return None if nextDeadline is None else nextDeadline - now
+
+    # --------------------------------------------------------------------------
+    def send(self, kind, url, args):
+        """ Put a message for the MS in the outbox.
+
+        The message is saved to disk before this returns; the outbox sender
+        thread delivers it with deliver().  The message id is added to the
+        message body as 'message_id', so the MS can recognize a message it
+        has already received.
+
+        Returns:
+            The message id
+        """
+        messageId = uuid.uuid4().hex
+        args = dict(args, message_id=messageId)
+        return self._outbox.put(kind, url, json.dumps(args), messageId)
+
+    # --------------------------------------------------------------------------
+    def deliver(self, message):
+        """ Send a message from the outbox to the MS (called by the outbox sender).
+
+        Returns:
+            True if the MS accepted the message, False if it rejected it
+        Raises:
+            requests.RequestException, IOError: if the message should be retried
+        """
+        args = json.loads(message.body)
+        (status, response) = self.callService(HttpMethod.POST, message.url, args)
+
+        if status >= httplib.INTERNAL_SERVER_ERROR:
+            raise IOError('Service %s returned %s' % (message.url, status))
+        if status not in (httplib.OK, httplib.ACCEPTED):
+            logger.critical('Unexpected HTTP response %s received from service %s for %s message %s' % (status, message.url, message.kind, message.messageId))
+            self.finishSubmit(message.messageId, exception=SubmitError('Rejected by the MS with status %s' % (status)))
+            return False
+
+        logger.debug('Service %s returned OK' % (message.url))
+        if message.kind == 'submit':
+            try:
+                challenge_complete = response["challenge_complete"]
+            except:
+                challenge_complete = None
+            logger.debug('Submit response: %s' % (challenge_complete))
+
+            # A submission left over from before a restart has no Future,
+            # so it is only reported to the MS; the station has moved on
+            self.finishSubmit(message.messageId, result=challenge_complete)
+        return True
 
 
     # ===
@@ -517,30 +972,9 @@ class ConnectionManager(IConnectionManager):
             #TODO abort(httplib.BAD_REQUEST
             logger.debug('return BAD_REQUEST?')
 
-        message_version   = request.json['message_version'] if 'message_version' in request.json else ""
-        message_timestamp = request.json['message_timestamp'] if 'message_timestamp' in request.json else ""
-        theatric_delay_ms = request.json['theatric_delay_ms'] if 'theatric_delay_ms' in request.json else ""
-
-        if 'secure_tone_pattern' in request.json:
-            logger.debug('Received a start_challenge request for SECURE station')
-            secure_tone_pattern = request.json['secure_tone_pattern']
-            self._callback.args = [secure_tone_pattern] # The Pulse pattern is not required, since it is in the tone pattern
-            logger.debug('Master server requesting station start_challenge (ver %s) at %s, SECURE Tone pattern %s' % (message_version, message_timestamp, secure_tone_pattern))
-        elif 'return_guidance_pattern' in request.json:
-            logger.debug('Received a start_challenge request for RETURN station')
-            return_guidance_pattern = request.json['return_guidance_pattern']
-            self._callback.args = return_guidance_pattern
-            logger.debug('Master server requesting station start_challenge (ver %s) at %s, RETURN Guidance pattern %s' % (message_version, message_timestamp, return_guidance_pattern))
-        elif 'team_name' in request.json or 'kiosk_text' in request.json:
-            logger.debug('Received a start_challenge request for DOCK station')
-            self._callback.args = {}
-            if 'team_name' in request.json:
-                self._callback.args['team_name'] = request.json['team_name']
-            if 'kiosk_text' in request.json:
-                self._callback.args['kiosk_text'] = request.json['kiosk_text']
-            logger.debug('Master server requesting station start_challenge with args: ' + repr(self._callback.args))
-        else:
-            logger.critical('Received a start_challenge request for unrecognized station')
+        args = self.startChallengeArgs(request.json)
+        if args is not None:
+            self._callback.args = args
 
         # TODO...
 
@@ -554,6 +988,43 @@ class ConnectionManager(IConnectionManager):
         resp.status_code = httplib.OK
         return resp
 
+    # --------------------------------------------------------------------------
+    def startChallengeArgs(self, body):
+        """ Return the station callback args for a start_challenge message body
+
+        Returns:
+            The args for the station type the message is for, or None if the
+            message is not for a known station type
+        """
+        body = body or {}
+        message_version   = body['message_version'] if 'message_version' in body else ""
+        message_timestamp = body['message_timestamp'] if 'message_timestamp' in body else ""
+        theatric_delay_ms = body['theatric_delay_ms'] if 'theatric_delay_ms' in body else ""
+
+        if 'secure_tone_pattern' in body:
+            logger.debug('Received a start_challenge request for SECURE station')
+            secure_tone_pattern = body['secure_tone_pattern']
+            args = [secure_tone_pattern] # The Pulse pattern is not required, since it is in the tone pattern
+            logger.debug('Master server requesting station start_challenge (ver %s) at %s, SECURE Tone pattern %s' % (message_version, message_timestamp, secure_tone_pattern))
+        elif 'return_guidance_pattern' in body:
+            logger.debug('Received a start_challenge request for RETURN station')
+            return_guidance_pattern = body['return_guidance_pattern']
+            args = return_guidance_pattern
+            logger.debug('Master server requesting station start_challenge (ver %s) at %s, RETURN Guidance pattern %s' % (message_version, message_timestamp, return_guidance_pattern))
+        elif 'team_name' in body or 'kiosk_text' in body:
+            logger.debug('Received a start_challenge request for DOCK station')
+            args = {}
+            if 'team_name' in body:
+                args['team_name'] = body['team_name']
+            if 'kiosk_text' in body:
+                args['kiosk_text'] = body['kiosk_text']
+            logger.debug('Master server requesting station start_challenge with args: ' + repr(args))
+        else:
+            logger.critical('Received a start_challenge request for unrecognized station')
+            args = None
+
+        return args
+
     # --------------------------------------------------------------------------
     def postChallenge(self):
         """Start the second part of the challenge 
@@ -568,26 +1039,9 @@ class ConnectionManager(IConnectionManager):
             #TODO abort(httplib.BAD_REQUEST
             logger.debug('return BAD_REQUEST?')
 
-        message_version = request.json['message_version'] if "message_version" in request.json else ""
-        message_timestamp = request.json['message_timestamp'] if "message_timestamp" in request.json else ""
-
-        if 'secure_pulse_pattern' in request.json:
-            logger.debug('Received a post_challenge request for SECURE station')
-            secure_pulse_pattern = request.json['secure_pulse_pattern']
-            secure_max_pulse_width = int(request.json['secure_max_pulse_width'])
-            secure_max_gap = int(request.json['secure_max_gap'])
-            secure_min_gap = int(request.json['secure_min_gap'])
-
-            self._callback.args = [secure_pulse_pattern, secure_max_pulse_width, secure_max_gap, secure_min_gap] # The Pulse pattern is not required, since it is in the tone pattern
-            logger.debug('Master server requesting station post_challenge (ver %s) at %s, SECURE Code pattern %s, Max pulse width %d, Max pulse gap %d, Min pulse gap %d' % (message_version, message_timestamp, repr(secure_pulse_pattern), secure_max_pulse_width, secure_max_gap, secure_min_gap))
-        elif 't_aft' in request.json:
-            logger.debug('Received a post_challenge request for DOCK station')
-            Args = namedtuple("Args", "t_aft, t_coast, t_fore, a_aft, a_fore, r_fuel, q_fuel, dist, v_min, v_max, v_init, t_sim")
-            args = Args._make([request.json[f] for f in Args._fields])
+        args = self.postChallengeArgs(request.json)
+        if args is not None:
             self._callback.args = args
-            logger.debug('Master server requesting station post_challenge with args: ' + repr(self._callback.args))
-        else:
-            logger.critical('Received a post_challenge request for unrecognized station')
 
 	logger.debug('Pre change state')
         self._callback.State = State.PROCESSING2
@@ -597,6 +1051,38 @@ class ConnectionManager(IConnectionManager):
         resp.status_code = httplib.OK
         return resp
 
+    # --------------------------------------------------------------------------
+    def postChallengeArgs(self, body):
+        """ Return the station callback args for a post_challenge message body
+
+        Returns:
+            The args for the station type the message is for, or None if the
+            message is not for a known station type
+        """
+        body = body or {}
+        message_version = body['message_version'] if "message_version" in body else ""
+        message_timestamp = body['message_timestamp'] if "message_timestamp" in body else ""
+
+        if 'secure_pulse_pattern' in body:
+            logger.debug('Received a post_challenge request for SECURE station')
+            secure_pulse_pattern = body['secure_pulse_pattern']
+            secure_max_pulse_width = int(body['secure_max_pulse_width'])
+            secure_max_gap = int(body['secure_max_gap'])
+            secure_min_gap = int(body['secure_min_gap'])
+
+            args = [secure_pulse_pattern, secure_max_pulse_width, secure_max_gap, secure_min_gap] # The Pulse pattern is not required, since it is in the tone pattern
+            logger.debug('Master server requesting station post_challenge (ver %s) at %s, SECURE Code pattern %s, Max pulse width %d, Max pulse gap %d, Min pulse gap %d' % (message_version, message_timestamp, repr(secure_pulse_pattern), secure_max_pulse_width, secure_max_gap, secure_min_gap))
+        elif 't_aft' in body:
+            logger.debug('Received a post_challenge request for DOCK station')
+            Args = namedtuple("Args", "t_aft, t_coast, t_fore, a_aft, a_fore, r_fuel, q_fuel, dist, v_min, v_max, v_init, t_sim")
+            args = Args._make([body[f] for f in Args._fields])
+            logger.debug('Master server requesting station post_challenge with args: ' + repr(args))
+        else:
+            logger.critical('Received a post_challenge request for unrecognized station')
+            args = None
+
+        return args
+
 ##    # --------------------------------------------------------------------------
 ######### Leaving this in for now for reference
 ##    def handleSubmission(self):
@@ -686,20 +1172,7 @@ class ConnectionManager(IConnectionManager):
 
         if pin == self._shutdownPin:
             logger.debug('Master server successfully requesting station shutdown with pin "%s"' % (pin))
-            # TODO move elsewhere - maybe hw.py?
-            sys_bus = dbus.SystemBus()
-            ck_srv = sys_bus.get_object('org.freedesktop.ConsoleKit',
-                                        '/org/freedesktop/ConsoleKit/Manager')
-            ck_iface = dbus.Interface(ck_srv,
-                                      'org.freedesktop.ConsoleKit.Manager')
-            stop_method = ck_iface.get_dbus_method("Stop")
-
-            if self._reallyShutdown:
-                logger.info('Shutting down based on MS request')
-                stop_method()
-            else:
-                logger.info('Shutdown successfully requested by MS but station not configured to really shutdown')
-
+            self.stopSystem()
             resp.status_code = httplib.OK
         else:
             logger.warning('Master server requesting station shutdown with invalid pin "%s"' % (pin))
@@ -707,6 +1180,183 @@ class ConnectionManager(IConnectionManager):
 
         return resp
 
+    # --------------------------------------------------------------------------
+    def status(self):
+        """ Return the station status snapshot (see statusSnapshot()) as JSON. """
+        resp = jsonify(self.statusSnapshot())
+        resp.status_code = httplib.OK
+        return resp
+
+    # --------------------------------------------------------------------------
+    def stopSystem(self):
+        """ Power off the station (if ReallyShutdown is set in runstation.conf) """
+        # TODO move elsewhere - maybe hw.py?
+        sys_bus = dbus.SystemBus()
+        ck_srv = sys_bus.get_object('org.freedesktop.ConsoleKit',
+                                    '/org/freedesktop/ConsoleKit/Manager')
+        ck_iface = dbus.Interface(ck_srv,
+                                  'org.freedesktop.ConsoleKit.Manager')
+        stop_method = ck_iface.get_dbus_method("Stop")
+
+        if self._reallyShutdown:
+            logger.info('Shutting down based on MS request')
+            stop_method()
+        else:
+            logger.info('Shutdown successfully requested by MS but station not configured to really shutdown')
+
+
+# ------------------------------------------------------------------------------
+def tornadoPattern(urlRule):
+    """ Convert a Flask URL rule (e.g. '/rpi/reset/<int:pin>') to a tornado URL pattern """
+    def group(match):
+        converter, name = match.groups()
+        return '(?P<%s>%s)' % (name, '[0-9]+' if converter == 'int' else '[^/]+')
+    return re.sub(r'<(?:(\w+):)?(\w+)>', group, urlRule) + '$'
+
+# ------------------------------------------------------------------------------
+class MsRequestHandler(RequestHandler):
+    """
+    Base class of the tornado handlers for the messages from the MS.
+
+    A handler only checks and parses the message, hands the station state
+    change to the ConnectionManager's dispatcher thread, and replies at once.
+    """
+
+    # --------------------------------------------------------------------------
+    def initialize(self, manager):
+        """ Called by tornado with the handler's arguments from the Application """
+        self.manager = manager
+
+    # --------------------------------------------------------------------------
+    def jsonBody(self):
+        """ Return the JSON request body, or None if there is none """
+        try:
+            return json.loads(self.request.body) if self.request.body else None
+        except ValueError:
+            logger.warning('Received a message from MS with a body that is not JSON: %s' % (self.request.body))
+            return None
+
+    # --------------------------------------------------------------------------
+    def reply(self, status):
+        """ Send an empty JSON object with the status code """
+        self.set_status(status)
+        self.finish({})
+
+# ------------------------------------------------------------------------------
+class ResetHandler(MsRequestHandler):
+    """
+    Handles the reset message: transitions the station to the Ready state.
+    """
+
+    def get(self, pin):
+        self.post(pin)
+
+    def post(self, pin):
+        logger.debug('Received reset message from MS with json %s' % (self.request.body))
+        if int(pin) == self.manager._resetPin:
+            logger.debug('Master server successfully requesting station reset with pin "%s"' % (pin))
+            self.manager.dispatch(self.manager.changeState, State.READY)
+            self.reply(httplib.OK)
+        else:
+            logger.warning('Master server requesting station reset with invalid pin "%s"' % (pin))
+            self.reply(httplib.BAD_REQUEST)
+
+# ------------------------------------------------------------------------------
+class StartChallengeHandler(MsRequestHandler):
+    """
+    Handles the start_challenge message: transitions the station to Processing.
+    """
+
+    def post(self):
+        logger.debug('Received startChallenge message from MS with json %s' % (self.request.body))
+        args = self.manager.startChallengeArgs(self.jsonBody())
+        self.manager.dispatch(self.manager.changeState, State.PROCESSING, args)
+        self.reply(httplib.OK)
+
+# ------------------------------------------------------------------------------
+class PostChallengeHandler(MsRequestHandler):
+    """
+    Handles the post_challenge message: transitions the station to Processing2.
+    """
+
+    def post(self):
+        logger.debug('Received POST message from MS with json %s' % (self.request.body))
+        args = self.manager.postChallengeArgs(self.jsonBody())
+        self.manager.dispatch(self.manager.changeState, State.PROCESSING2, args)
+        self.reply(httplib.OK)
+
+# ------------------------------------------------------------------------------
+class ShutdownHandler(MsRequestHandler):
+    """
+    Handles the shutdown message: powers off the station.
+    """
+
+    def get(self, pin):
+        self.post(pin)
+
+    def post(self, pin):
+        logger.debug('Received shutdown message from MS with json %s' % (self.request.body))
+        if int(pin) == self.manager._shutdownPin:
+            logger.debug('Master server successfully requesting station shutdown with pin "%s"' % (pin))
+            # Not dispatched: shutting down must not wait for a state change
+            stopper = Thread(target = self.manager.stopSystem)
+            stopper.daemon = True
+            stopper.start()
+            self.reply(httplib.OK)
+        else:
+            logger.warning('Master server requesting station shutdown with invalid pin "%s"' % (pin))
+            self.reply(httplib.BAD_REQUEST)
+
+# ------------------------------------------------------------------------------
+class StatusHandler(MsRequestHandler):
+    """
+    Handles GET status: replies with the station status snapshot.
+    """
+
+    def get(self):
+        self.set_status(httplib.OK)
+        self.finish(self.manager.statusSnapshot())
+
+# ------------------------------------------------------------------------------
+class TornadoConnectionManager(ConnectionManager):
+    """
+    Station Connection Manager that serves the messages from the MS with
+    native tornado request handlers instead of the Flask app.
+
+    The Flask app runs inside tornado's WSGIContainer, which handles one
+    request at a time on the IOLoop thread, so a slow station state change
+    (started by one message) holds up every other message.  Here the
+    handlers reply as soon as the message is parsed, and the state changes
+    are made in order on the dispatcher thread.
+
+    Select it with s.ConnectionManagerClassName in runstation.conf.
+    """
+
+    # --------------------------------------------------------------------------
+    def addUrlRules(self, config):
+        """ Nothing to do: the routes are made in createHttpServer() """
+        pass
+
+    # --------------------------------------------------------------------------
+    def createHttpServer(self):
+        """ Return the HTTPServer for the messages from the MS (not yet listening) """
+        handlerArgs = dict(manager=self)
+        app = Application([
+            (tornadoPattern(self._config.ResetUrlRule), ResetHandler, handlerArgs),
+            (tornadoPattern(self._config.StartChallengeUrlRule), StartChallengeHandler, handlerArgs),
+            (tornadoPattern(self._config.PostChallengeUrlRule), PostChallengeHandler, handlerArgs),
+            (tornadoPattern(self._config.ShutdownUrlRule), ShutdownHandler, handlerArgs),
+            (tornadoPattern(getattr(self._config, 'StatusUrlRule', DEFAULT_STATUS_URL_RULE)), StatusHandler, handlerArgs),
+        ])
+        return HTTPServer(app)
+
+    # --------------------------------------------------------------------------
+    def changeState(self, state, args=None):
+        """ Set the station callback args (if given) and State (dispatcher thread) """
+        if args is not None:
+            self._callback.args = args
+        self._callback.State = state
+
 # ------------------------------------------------------------------------------
 # Module Initialization
 # ------------------------------------------------------------------------------
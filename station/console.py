@@ -16,6 +16,7 @@
 TODO module description
 """
 
+from contextlib import contextmanager
 import logging
 import logging.handlers
 import sys
@@ -218,6 +219,14 @@ class Display(IDisplay):
         """
         logger.debug('Setting cursor position to (r=%s, c=%s)' % (row, col))
 
+
+    # --------------------------------------------------------------------------
+    @contextmanager
+    def batch(self):
+        """ Groups display changes; the console shows each change as it is made.
+        """
+        yield self
+
         
 # ------------------------------------------------------------------------------
 class Led(ILed):
@@ -16,7 +16,11 @@
 TODO module description
 """
 
+from abc import ABCMeta
+from abc import abstractmethod
+from contextlib import contextmanager
 import datetime
+from functools import partial
 import logging
 import logging.handlers
 # TODO Is UnresolvedImport needed? hw.py should not be enabled on a non-Pi; same for LCD below.
@@ -24,14 +28,16 @@ import pibrella  # @UnresolvedImport when not on R-Pi
 import signal
 import sys
 from time import sleep
+from time import time
 from threading import Thread
 from threading import Event
+from threading import Lock
+from threading import RLock
 import traceback
-import math
 import operator
-import Queue
 
 import Adafruit_CharLCD as LCD    # @UnresolvedImport when not on R-Pi
+import RPi.GPIO as GPIO           # @UnresolvedImport when not on R-Pi
 #tried various installs finally got working but seems too complex
 import sys
 sys.path.append('/opt/designchallenge2015/Adafruit-Raspberry-Pi-Python-Code/Adafruit_PWM_Servo_Driver')
@@ -45,6 +51,10 @@ from interfaces import IBuzzer
 from interfaces import IInput
 from interfaces import IUrgencyLed
 
+from station import animation
+from station.animation import ledAnimator
+from station.i2cbus import I2cBus
+from station.i2cbus import sharedBus
 from station.util import Config
 from station.util import PushButton
 
@@ -69,6 +79,8 @@ class Display(IDisplay):
               "WHITE":   (1.0, 1.0, 1.0),
               }
 
+    MAX_RUN_GAP = 1  # unchanged chars rewritten rather than moving the cursor past them
+
 
     # --------------------------------------------------------------------------
     def __init__(self,
@@ -95,7 +107,21 @@ class Display(IDisplay):
         self._line2Text = ''
         self._lineWidth = config.lineWidth
         logger.debug('Display line width: {} chars'.format(self._lineWidth))
-        self._lcd = LCD.Adafruit_CharLCDPlate()
+        self._color = self.COLORS["WHITE"]
+        self._cursorPos = (0, 0)
+        self._cursorVisible = False
+        self._lock = RLock()
+        self._batchDepth = 0
+
+        self._bus = sharedBus()
+        self._lcd = self._bus.call(I2cBus.DISPLAY, LCD.Adafruit_CharLCDPlate)
+
+        # What the display shows now: the plate starts cleared, with the
+        # cursor hidden at the home position
+        self._shownLines = [' ' * self._lineWidth, ' ' * self._lineWidth]
+        self._shownColor = None
+        self._shownCursorPos = (0, 0)
+        self._shownCursorVisible = False
 
 
     # --------------------------------------------------------------------------
@@ -129,6 +155,7 @@ class Display(IDisplay):
         logger.debug('Exiting display')
         self.setText('')
         self.showCursor(False) # must call after setText(), which displays the cursor
+        self._bus.drain()
 
 
     # --------------------------------------------------------------------------
@@ -150,7 +177,9 @@ class Display(IDisplay):
         Raises:
             KeyError if color is not one of the valid color string values.
         '''
-        self._lcd.set_color(*self.COLORS[color])
+        with self._lock:
+            self._color = self.COLORS[color]
+            self._refreshDisplay()
     
 
     # --------------------------------------------------------------------------
@@ -164,9 +193,11 @@ class Display(IDisplay):
         Args:
             text (string): The text to display.
         """
-        self._line1Text = "{:<{width}}".format(text, width=self._lineWidth)
-        #logger.debug('Setting Line 1 text to "%s"' % self._line1Text)
-        self._refreshDisplay()
+        with self._lock:
+            self._line1Text = "{:<{width}}".format(text, width=self._lineWidth)
+            #logger.debug('Setting Line 1 text to "%s"' % self._line1Text)
+            self._cursorAfterText()
+            self._refreshDisplay()
 
 
     # --------------------------------------------------------------------------
@@ -180,9 +211,11 @@ class Display(IDisplay):
         Args:
             text (string): The text to display.
         """
-        self._line2Text = "{:<{width}}".format(text, width=self._lineWidth)
-        #logger.debug('Setting Line 2 text to "%s"' % self._line2Text)
-        self._refreshDisplay()
+        with self._lock:
+            self._line2Text = "{:<{width}}".format(text, width=self._lineWidth)
+            #logger.debug('Setting Line 2 text to "%s"' % self._line2Text)
+            self._cursorAfterText()
+            self._refreshDisplay()
 
 
     # --------------------------------------------------------------------------
@@ -198,9 +231,9 @@ class Display(IDisplay):
             text (string): The text to display.
         """
         lines = (text+'\n').split('\n')
-        self.setLine1Text(lines[0])
-        self.setLine2Text(lines[1])
-        self._refreshDisplay()
+        with self.batch():
+            self.setLine1Text(lines[0])
+            self.setLine2Text(lines[1])
 
 
     # --------------------------------------------------------------------------
@@ -211,8 +244,9 @@ class Display(IDisplay):
         invisible.
         """
         #logger.debug('Setting show cursor value to %s' % (show))
-        self._lcd.blink(show)
-        self._lcd.show_cursor(show)
+        with self._lock:
+            self._cursorVisible = show
+            self._refreshDisplay()
 
         
     # --------------------------------------------------------------------------
@@ -220,223 +254,426 @@ class Display(IDisplay):
         """ Sets the position of the cursor and makes it visible.
         """
         #logger.debug('Setting cursor position to (r=%s, c=%s)' % (row, col))
-        self._lcd.set_cursor(col, row)
-        self.showCursor()
+        with self._lock:
+            self._cursorPos = (row, col)
+            self._cursorVisible = True
+            self._refreshDisplay()
+
+
+    # --------------------------------------------------------------------------
+    @contextmanager
+    def batch(self):
+        """ Collects the display changes made in a with block into one update.
+
+        Nothing is sent to the display until the outermost batch ends, so
+        changes that undo each other, such as rewriting a line with the same
+        text, cost nothing.
+        """
+        with self._lock:
+            self._batchDepth += 1
+            try:
+                yield self
+            finally:
+                self._batchDepth -= 1
+                self._refreshDisplay()
 
         
+    # --------------------------------------------------------------------------
+    def _cursorAfterText(self):
+        """ Puts the cursor where writing the whole display used to leave it.
+
+        The cursor stays visible, just past the end of line 2, until the caller
+        moves it with setCursor() or hides it with showCursor().
+        """
+        self._cursorPos = (1, self._lineWidth)
+        self._cursorVisible = True
+
+
     # --------------------------------------------------------------------------
     def _refreshDisplay(self):
-        """ Sends text to the display
+        """ Queues the display contents to be sent on the I2C bus
+
+        Does nothing inside a batch().  A refresh that is still waiting for
+        the bus is replaced, so only the latest contents are sent.
+        """
+        if self._batchDepth:
+            return
 
-        Sends or resends the text stored in _line1Text and _line2Text to
-        the display.  Also causes the cursor to be displayed.
+        self._bus.post(I2cBus.DISPLAY,
+                       partial(self._writeFrame,
+                               (self._line1Text, self._line2Text),
+                               self._color,
+                               self._cursorPos,
+                               self._cursorVisible),
+                       key=self)
+
+
+    # --------------------------------------------------------------------------
+    def _writeFrame(self, lines, color, cursorPos, cursorVisible):
+        """ Sends the changes to the display (runs on the I2C bus thread)
+
+        Compares the lines, the background color and the cursor with what the
+        display is known to show, and writes only the runs of characters that
+        differ.  The cursor is only moved to start a run that does not follow
+        on from the last character written.
+        """
+        if color != self._shownColor:
+            self._lcd.set_color(*color)
+            self._shownColor = color
+
+        for row, text in enumerate(lines):
+            shown = self._shownLines[row]
+            text = text.ljust(len(shown))
+            for col, run in self._changedRuns(shown, text):
+                if self._shownCursorPos != (row, col):
+                    self._lcd.set_cursor(col, row)
+                self._lcd.message(run)
+                self._shownCursorPos = (row, col + len(run))
+            self._shownLines[row] = text
+
+        if cursorVisible and self._shownCursorPos != cursorPos:
+            self._lcd.set_cursor(cursorPos[1], cursorPos[0])
+            self._shownCursorPos = cursorPos
+        if cursorVisible != self._shownCursorVisible:
+            self._lcd.blink(cursorVisible)
+            self._lcd.show_cursor(cursorVisible)
+            self._shownCursorVisible = cursorVisible
+        #logger.debug('Display now reads "%s"[br]"%s"' % lines)
+
+
+    # --------------------------------------------------------------------------
+    def _changedRuns(self, shown, text):
+        """ Returns: a list of (column, characters) for the parts of text that
+        differ from shown.
+
+        Runs separated by no more than MAX_RUN_GAP unchanged characters are
+        joined, since rewriting a character costs about as much as moving the
+        cursor over it.
         """
-        self.setCursor(0, 0)
-        self._lcd.message(self._line1Text + '\n' + self._line2Text)
-        #logger.debug('Display now reads "%s"[br]"%s"' % (self._line1Text, self._line2Text))
+        changed = [col for col in range(len(text)) if col >= len(shown) or text[col] != shown[col]]
+        runs = []
+        for col in changed:
+            if runs and col - runs[-1][1] <= self.MAX_RUN_GAP + 1:
+                runs[-1][1] = col
+            else:
+                runs.append([col, col])
+        return [(first, text[first:last + 1]) for first, last in runs]
 
 # ------------------------------------------------------------------------------
 class LedType(Enum):
     pibrella = 1
     adafruit = 2
 
-class I2CLedWorkerThreadCmd():
-    def __init__(self, startPercentageOn, endPercentageOn, durationInSeconds):
-        # Note duration of 0 = indefinitely
-        self.startPercentageOn = startPercentageOn
-        self.endPercentageOn = endPercentageOn
-        self.durationInSeconds = durationInSeconds
-
-class I2CLedWorkerThread(Thread):
-    """ A worker thread that controls an led light over a period of time.
-
-        This is done this way to exploit the queue waiting which takes less 
-        cpu time than sleeping to help avoid thrashing with many of these
-        running concurrently.  It was adapted form the public domain work:
-        http://eli.thegreenplace.net/2011/12/27/python-threads-communication-and-stopping
-
-        TaskMaster must support the following:
-        setLed(newPercentBrightness) to allow reach back to control light level
-        cmds which is a Queue of I2CLedWorkerThreadCmd objects.
-        The thread has a fixed periodicity which once hit will start the 
-        next available command if no new command it will keep doing what it
-        was doing.
-
-        Ask the thread to stop by calling its join() method to clean up before
-        exiting the application.  __exit__ should be called to catch this but
-        currently it appears to not always be called.
+# ------------------------------------------------------------------------------
+class PwmLedBank(object):
+    """
+    The 16 LED channels of a PCA9685 PWM driver, written together.
+
+    The brightness of every channel is kept here, and a change to any channel
+    sends the channels that changed in one auto-increment block write per 8
+    channels (the SMBus block limit is 32 bytes, 4 registers per channel).
+    Changes are not written as they are made: while any channel is changing,
+    a frame of all the channels is sent once per frame period by a tick on
+    the LED animator, so any number of fading LEDs cost one frame per period.
+    Like the Display, a frame still waiting for the I2C bus is replaced by the
+    next one, and the chip's registers are only written where they differ
+    from what was last sent.  The tick stops when a frame has nothing new.
     """
-    def __init__(self, taskMaster):
-        super(I2CLedWorkerThread, self).__init__()
-        self._taskMaster = taskMaster
-        # init variables for supporting dynamic lighting changes
-        self._currentBrightness = 0
-        self._endBrightness = 0
-        self._stepsRemaining = 0
-        # Set minimum time step between changes
-        self._TIME_TICK = 0.001 # note 0.0001 is possible but CPU thrashes
-        self._delta = self._TIME_TICK
-        self._isChanging = False
-
-        self.stoprequest = Event()
 
-    def run(self):
-        # As long as we weren't asked to stop, try to take new tasks from the
-        # queue. The tasks are taken with a blocking 'get', so no CPU
-        # cycles are wasted while waiting.
-        # Also, 'get' is given a timeout, so stoprequest is always checked,
-        # even if there's nothing in the queue.
-        while not self.stoprequest.isSet():
-            try:
-                nextCmd = self._taskMaster.cmds.get(True,self._TIME_TICK)
-                # if no cmd keep doing what you were doing even if was nothing
-                # by taking the exception path on the timeout
-                # otherwise process the new command and reset the thread state
-                self._isChanging = True
-                self._currentBrightness = nextCmd.startPercentageOn / 100.0
-                self._endBrightness = nextCmd.endPercentageOn / 100.0
-                if nextCmd.durationInSeconds > self._TIME_TICK:
-                    # note early python ceil could return float
-                    self._stepsRemaining = int(math.ceil(nextCmd.durationInSeconds/self._TIME_TICK))
-                    self._delta = (self._endBrightness - self._currentBrightness) / self._stepsRemaining
-                elif nextCmd.durationInSeconds == 0:
-                    self._stepsRemaining = 0
-                    self._currentBrightness = self._endBrightness
-                    self._isChanging = False
-                else:
-                    self._stepsRemaining = 1
-                self._taskMaster.setLed(self._currentBrightness)
-            except Queue.Empty:
-                if self._isChanging:
-                    if self._stepsRemaining > 1:
-                        self._currentBrightness = self._currentBrightness + self._delta
-                    elif 1 == self._stepsRemaining:
-                        self._currentBrightness = self._endBrightness
-                        # Reached the base case for fade so terminate it
-                        self._isChanging = False
-                        # TODO handle if pulsing
-                        # Reset values for next pulse cycle then treat like fade
-
-                    self._stepsRemaining = self._stepsRemaining - 1 
-                    #self._pwm.setPWM(self._chan, 0, self._percentOnAsDecimalToGammaLevel(self._currentBrightness))
-                    self._taskMaster.setLed(self._currentBrightness)
-                continue
-
-    def join(self, timeout=None):
-        self.stoprequest.set()
-        super(I2CLedWorkerThread, self).join(timeout)
-
-class PibrellaLedFacade():
-    def __init__(self, chan, val, step, enabled):
-        self._val = int(math.floor(val)) # just in case is float and using 2.x
-        self._step = step # TODO so we really don't honor this right now
-        self._chan = chan
-        self.enabled = enabled
-        self._gamma = []
-        self._MAX_LEVEL = self._val
-        for i in range(self._MAX_LEVEL+1):
-            self._gamma.append(int(pow(i/(1.0*self._MAX_LEVEL), 2.8)*self._MAX_LEVEL))
-        initialValue = self._gamma[0]
-        if self.enabled:
-            initialValue = self._gamma[self._val]
-        self._pwm = PWM(0x40, debug=False)
-        self._pwm.setPWMFreq(400)
-        self._pwm.setPWM(self._chan, 0, initialValue)
-
-        self._isRunning = False
-        self.cmds = Queue.Queue()
-        #self._thread = I2CLedWorkerThread(self)
-        #self._thread.start()
+    MODE1 = 0x00
+    AUTO_INCREMENT = 0x20
+    LED0_ON_L = 0x06
 
-    def __exit__(self, type, value, traceback):
-        self.off()
-        if self._isRunning:
-            # stop was not called first so try to clean up
-            self.stop()
+    NUM_CHANNELS = 16
+    CHANNELS_PER_WRITE = 8
+    MAX_LEVEL = 4095
+    GAMMA = 2.8
 
-    # --------------------------------------------------------------------------
-    def stop(self):
-        """This MUST be called when your program is shutting down.
+    DEFAULT_FRAME_RATE_HZ = 100.0
+    PWM_FREQ_HZ = 400
 
-        TODO Detailed multi-line description if
-        necessary.
-        This cleans up all of the thread processing and leaves the led off.
-        Note once stop is called on and off will work but fade and pulse 
-        will no longer work.
-        TODO redo this threading model to allow cleaner working thread.
+    # --------------------------------------------------------------------------
+    def __init__(self, address=0x40, frameRateHz=None):
+        """Sets up the PCA9685 with all channels off.
 
         Args:
-            arg1 (type1): TODO describe arg, valid values, etc.
-            arg2 (type2): TODO describe arg, valid values, etc.
-            arg3 (type3): TODO describe arg, valid values, etc.
+            address (int): the I2C address of the PCA9685
+            frameRateHz (float): how often fading channels are updated
+        """
+        self._address = address
+        self.framePeriod = 1.0 / (frameRateHz or self.DEFAULT_FRAME_RATE_HZ)
+        self._gamma = [int(pow(i / float(self.MAX_LEVEL), self.GAMMA) * self.MAX_LEVEL)
+                       for i in range(self.MAX_LEVEL + 1)]
+
+        self._levels = [0.0] * self.NUM_CHANNELS  # brightness 0..1 of each channel
+        self._dirty = False    # levels changed since the last frame
+        self._ticking = False  # the frame tick is scheduled
+        self._lock = Lock()
+        self._animator = ledAnimator()
+
+        self._bus = sharedBus()
+        self._pwm = self._bus.call(I2cBus.LEDS, self._begin)
+        self._onChip = [0] * self.NUM_CHANNELS  # PWM off counts last sent (bus thread only)
+
+    # --------------------------------------------------------------------------
+    def _begin(self):
+        """Returns: the PWM driver, reset and set to auto-increment registers
+        (runs on the I2C bus thread).
+        """
+        pwm = PWM(self._address, debug=False)  # also turns every channel off
+        pwm.setPWMFreq(self.PWM_FREQ_HZ)
+        mode1 = pwm.i2c.readU8(self.MODE1)
+        pwm.i2c.write8(self.MODE1, mode1 | self.AUTO_INCREMENT)
+        return pwm
+
+    # --------------------------------------------------------------------------
+    def setLevel(self, channel, level):
+        """Sets a channel to a brightness from 0 (off) to 1 (full).
+
+        The change is sent with the next frame, within one frame period.
+        """
+        with self._lock:
+            self._levels[channel] = level
+            self._dirty = True
+            if self._ticking:
+                return
+            self._ticking = True
+        # not under self._lock: frames run with the animator's lock held
+        self._animator.schedule(self._onFrame, self.framePeriod)
+
+    # --------------------------------------------------------------------------
+    def _onFrame(self, now):
+        """Sends a frame if any channel changed (runs on the LED animator).
+
         Returns:
-            TODO describe the return type and details
-        Raises:
-            TodoError1: if TODO.
-            TodoError2: if TODO.
+            The frame period, or None to stop ticking when nothing changed
+        """
+        with self._lock:
+            if not self._dirty:
+                self._ticking = False
+                return None
+            self._dirty = False
+            self._sendFrame()
+        return self.framePeriod
 
+    # --------------------------------------------------------------------------
+    def level(self, channel):
+        """Returns: the brightness of a channel, from 0 (off) to 1 (full).
         """
+        return self._levels[channel]
+
+    # --------------------------------------------------------------------------
+    def _sendFrame(self):
+        """Queues the current brightness of every channel to be sent on the I2C bus.
+        """
+        counts = [self._gamma[int(round(min(max(level, 0.0), 1.0) * self.MAX_LEVEL))]
+                  for level in self._levels]
+        self._bus.post(I2cBus.LEDS, partial(self._writeFrame, counts), key=self)
+
+    # --------------------------------------------------------------------------
+    def _writeFrame(self, counts):
+        """Writes the channels whose counts changed (runs on the I2C bus thread).
+
+        The span from the first to the last changed channel is written with
+        one block write per CHANNELS_PER_WRITE channels.
+        """
+        changed = [c for c in range(self.NUM_CHANNELS) if counts[c] != self._onChip[c]]
+        if not changed:
+            return
+        for first in range(changed[0], changed[-1] + 1, self.CHANNELS_PER_WRITE):
+            last = min(first + self.CHANNELS_PER_WRITE, changed[-1] + 1)
+            data = []
+            for count in counts[first:last]:
+                data += [0, 0, count & 0xFF, count >> 8]  # ON = 0, OFF = count
+            self._pwm.i2c.writeList(self.LED0_ON_L + 4 * first, data)
+        self._onChip = counts
+
+    # --------------------------------------------------------------------------
+    def drain(self):
+        """Sends the changes waiting for the next frame now, and waits until
+        the frames queued so far are written.
+        """
+        with self._lock:
+            if self._dirty:
+                self._dirty = False
+                self._sendFrame()
+        self._bus.drain()
+
+    # --------------------------------------------------------------------------
+    def stop(self):
+        """Turns every channel off and waits for the write.
+        """
+        with self._lock:
+            self._levels = [0.0] * self.NUM_CHANNELS
+            self._dirty = True
+        self.drain()
+
+
+# ------------------------------------------------------------------------------
+_ledBanks = {}
+_ledBanksLock = Lock()
+
+# ------------------------------------------------------------------------------
+def pwmLedBank(address=0x40, frameRateHz=None):
+    """Returns: the PwmLedBank for the PCA9685 at address, creating it the
+    first time (frameRateHz only applies then).
+    """
+    with _ledBanksLock:
+        if address not in _ledBanks:
+            _ledBanks[address] = PwmLedBank(address, frameRateHz)
+        return _ledBanks[address]
+
+
+# ------------------------------------------------------------------------------
+class AnimatedLed(object):
+    """
+    An LED whose fades, pulses and flashes are run by the shared LED animator,
+    with the same methods as a Pibrella light.
+
+    Subclasses set the brightness of the hardware in setLevel().
+    """
+    __metaclass__ = ABCMeta
+
+    DEFAULT_STEP_SEC = 0.02   # time between brightness changes in a fade
+    DEFAULT_DECAY_SEC = 0.5   # decay() time from full brightness to off
+
+    # --------------------------------------------------------------------------
+    def __init__(self, stepSec=None, decaySec=None):
+        self._stepSec = stepSec or self.DEFAULT_STEP_SEC
+        self._decaySec = decaySec or self.DEFAULT_DECAY_SEC
+        self._level = 0.0
+        self._animator = ledAnimator()
+        self._animation = None
+
+    @abstractmethod
+    def setLevel(self, level):
+        """Sets the brightness, from 0.0 (off) to 1.0 (full)."""
+        pass
+
+    def level(self):
+        """Returns: the brightness, from 0.0 (off) to 1.0 (full)."""
+        return self._level
+
+    def isAnimating(self):
+        """Returns: True while a fade, pulse or flash is running."""
+        return self._animation is not None and not self._animation.done
+
+    def _animate(self, step):
+        """Replaces the running animation with step."""
+        self._stopAnimation()
+        self._animation = self._animator.schedule(step)
+
+    def _stopAnimation(self):
+        if self._animation is not None:
+            self._animation.cancel()
+            self._animation = None
+
+    def stop(self):
+        """Stops any animation and turns the LED off."""
         logger.info('Stopping LED.')
         self.off()
-        self._isRunning = False
-      #  self._thread.join()
-
-    def _percentOnAsDecimalToGammaLevel(self, valueFromZeroToOne):
-        # note use of int is for earlier python when floor could return float
-        gammaLevel = int(math.floor(self._MAX_LEVEL * valueFromZeroToOne))
-        gammaValue = 0
-        if gammaLevel >= 0 and gammaLevel <= self._MAX_LEVEL:
-            gammaValue = self._gamma[gammaLevel]
-        return gammaValue
 
     def setLed(self, newPercentBrightness):
-        self._pwm.setPWM(self._chan, 0, self._percentOnAsDecimalToGammaLevel(newPercentBrightness))
+        self._stopAnimation()
+        self.setLevel(newPercentBrightness)
 
     def on(self):
-        #nextCmd = I2CLedWorkerThreadCmd(100,100,0)
-        #self.cmds.put(nextCmd)
-        self._val = self._MAX_LEVEL
-        self.enabled = True
-        self._pwm.setPWM(self._chan, 0, self._percentOnAsDecimalToGammaLevel(1))
+        self._stopAnimation()
+        self.setLevel(1.0)
 
     def off(self):
-        #nextCmd = I2CLedWorkerThreadCmd(0,0,0)
-        #self.cmds.put(nextCmd)
-        self._val = 0
-        self.enabled = False
-        self._pwm.setPWM(self._chan, 0, self._percentOnAsDecimalToGammaLevel(0))
+        self._stopAnimation()
+        self.setLevel(0.0)
 
     def fade(self, startPercentageOn, endPercentageOn, durationInSeconds):
-        #nextCmd = I2CLedWorkerThreadCmd(startPercentageOn, endPercentageOn, durationInSeconds)
-        #self.cmds.put(nextCmd)
-        self._pwm.setPWM(self._chan, 0, self._percentOnAsDecimalToGammaLevel(1))
+        self._animate(animation.fade(self.setLevel, startPercentageOn / 100.0, endPercentageOn / 100.0,
+                                     durationInSeconds, self._stepSec))
 
     def pulse(self, fadeInTime, fadeOutTime, onTime, offTime):
-        # TODO
-        pass
+        if fadeInTime == 0 and fadeOutTime == 0:
+            self._animate(animation.flash(self.setLevel, onTime, offTime))
+        else:
+            self._animate(animation.pulse(self.setLevel, fadeInTime, fadeOutTime, onTime, offTime,
+                                          self._stepSec))
 
     def decay(self):
-        """ Decay from full brightness to off
-
-        Each call updates the LED (if enabled) to go from full brightness to
-        off in smooth steps. True is returned if the LED is still on (non-zero
-        brightness). False is returned if the LED has decayed to off (zero)
-        brightness.
-        """
-        if self.enabled:
-            if self._val >= self._step:
-                self._val = self._val - self._step
-                self._pwm.setPWM(self._chan, 0, self._gamma[self._val])
-                return True
+        """ Decay from the current brightness to off
+
+        Starts a fade to off (over decaySec from full brightness) unless the
+        LED is already animating.  The animator runs the fade, so calling this
+        again does not speed it up.  True is returned if the LED is still on
+        (non-zero brightness). False is returned if the LED has decayed to off.
+        """
+        level = self.level()
+        if level > 0.0 and not self.isAnimating():
+            self._animate(animation.fade(self.setLevel, level, 0.0, self._decaySec * level, self._stepSec))
+        return level > 0.0
+
+
+# ------------------------------------------------------------------------------
+class PwmLed(AnimatedLed):
+    """
+    One channel of a PwmLedBank; fades step once per frame of the bank.
+    """
+
+    # --------------------------------------------------------------------------
+    def __init__(self, bank, channel, decaySec=None):
+        """
+        Args:
+            bank (PwmLedBank): the bank the LED is on
+            channel (int): the PCA9685 channel, 0-15
+            decaySec (float): how long decay() takes from full brightness to off
+        """
+        super(PwmLed, self).__init__(bank.framePeriod, decaySec)
+        self._bank = bank
+        self._channel = channel
+        self.setLevel(0.0)
+
+    def setLevel(self, level):
+        self._level = level
+        self._bank.setLevel(self._channel, level)
+
+    def stop(self):
+        """Turns the LED off and waits for the write."""
+        super(PwmLed, self).stop()
+        self._bank.drain()
+
+
+# ------------------------------------------------------------------------------
+class PibrellaLight(AnimatedLed):
+    """
+    A Pibrella light, animated by the LED animator instead of the Pibrella
+    library's thread per fade or pulse.
+
+    Part brightness uses the light's software PWM; full on and off are plain
+    writes.
+    """
+
+    PWM_FREQ_HZ = 100
+
+    # --------------------------------------------------------------------------
+    def __init__(self, light, decaySec=None):
+        """
+        Args:
+            light: the pibrella light, e.g. pibrella.light.red
+            decaySec (float): how long decay() takes from full brightness to off
+        """
+        super(PibrellaLight, self).__init__(None, decaySec)
+        self._light = light
+        self._pwmRunning = False
+
+    def setLevel(self, level):
+        self._level = level
+        if 0.0 < level < 1.0:
+            if self._pwmRunning:
+                self._light.duty_cycle(100.0 * level)
             else:
-                self._val = 0
-                self._pwm.setPWM(self._chan, 0, self._gamma[self._val])
-                self.enabled = False
-                return False
+                self._light.pwm(self.PWM_FREQ_HZ, 100.0 * level)
+                self._pwmRunning = True
         else:
-            # The value should already be off so why keep setting it?
-            #self._pwm.setPWM(self._chan, 0, self._gamma[0])
-            return False
+            self._light.write(1 if level >= 1.0 else 0)
+            self._pwmRunning = False
+
 
 # ------------------------------------------------------------------------------
 class Led(ILed):
@@ -473,15 +710,16 @@ class Led(ILed):
             if config.LedType.lower().startswith("adafruit"):
                self._LedType = LedType.adafruit
 
+        decaySec = getattr(config, 'DecaySec', None)
         if self._LedType == LedType.pibrella:
-            self.outputPin = getattr(pibrella.light, config.OutputPin)
+            self.outputPin = PibrellaLight(getattr(pibrella.light, config.OutputPin), decaySec)
         else:
             # TODO verify channel is valid
-            self.outputPin = PibrellaLedFacade(int(name), 4095, 16, False)
+            bank = pwmLedBank(frameRateHz=getattr(config, 'FrameRateHz', None))
+            self.outputPin = PwmLed(bank, int(name), decaySec)
 
     def stop(self):
-        if self._LedType == LedType.adafruit:
-            self.outputPin.stop()
+        self.outputPin.stop()
 
     # --------------------------------------------------------------------------
     def turnOn(self):
@@ -600,6 +838,7 @@ class PushButtonMonitor(IPushButtonMonitor):
         logger.debug('Constructing push button monitor')
         
         self._device = None  # button interface device
+        self._bus = sharedBus()
         self._buttonStates = [0] * self.NUM_STATES  # last sampled state of each button
         self._debounceButtons = False  # perform software debounce
         
@@ -748,7 +987,7 @@ class PushButtonMonitor(IPushButtonMonitor):
         """
         if self._debounceButtons:
             # Sample the current state of all buttons
-            buttonInputs = map(self._device.is_pressed, self.BUTTONS)
+            buttonInputs = self._bus.call(I2cBus.BUTTONS, self.readButtons)
              
             # Convert prevState, input to an index = 2*state + input
             buttonStateTransitions = map(lambda s,i: 2*s+(1 if i else 0), self._buttonStates, buttonInputs)
@@ -759,7 +998,7 @@ class PushButtonMonitor(IPushButtonMonitor):
             # Use the transition to lookup the output value
             outputs = [self.OUTPUT[i] for i in buttonStateTransitions]
         else:
-            outputs = map(self._device.is_pressed, self.BUTTONS)
+            outputs = self._bus.call(I2cBus.BUTTONS, self.readButtons)
             
         # Make a list of buttons that changed to PRESSED and a list of buttons
         # that changed to RELEASED
@@ -772,6 +1011,12 @@ class PushButtonMonitor(IPushButtonMonitor):
         if len(edges[1]):
             self.deliverButtonReleaseEvents(edges[1])
         
+    # --------------------------------------------------------------------------
+    def readButtons(self):
+        """ Returns: a list of True/False pressed states, one per button.
+        """
+        return map(self._device.is_pressed, self.BUTTONS)
+
     # --------------------------------------------------------------------------
     def deliverButtonPressEvents(self, buttons):
         """ Call the push callback for buttons that were pressed
@@ -832,6 +1077,162 @@ class PushButtonMonitor(IPushButtonMonitor):
                 traceback.print_tb(tb)
 
 
+# ------------------------------------------------------------------------------
+class PortPushButtonMonitor(PushButtonMonitor):
+    """
+    Push button monitor that reads all of the LCD plate buttons at once.
+
+    The buttons are wired to port A of the plate's MCP23017, so one read of the
+    GPIOA register samples every button (PushButtonMonitor makes one I2C
+    transaction per button).  The whole port is debounced together with bit
+    operations: a button changes state when two samples in a row agree with
+    each other and differ from its debounced state.
+
+    If the MCP23017 INTA output is wired to a Raspberry Pi GPIO pin (see
+    setInterruptPin()), the monitor sleeps until the port changes instead of
+    polling it, and each button edge is stamped with the time of the interrupt.
+    """
+
+    # MCP23017 registers (IOCON.BANK = 0)
+    GPINTENA = 0x04  # interrupt-on-change enable
+    INTCONA  = 0x08  # 0 = compare against the previous pin value
+    GPIOA    = 0x12
+
+    SETTLE_INTERVAL = 0.01  # sec. between the two samples that confirm a change
+
+    # --------------------------------------------------------------------------
+    def __init__(self):
+        """Creates a monitor that polls the port until setInterruptPin() is called.
+        """
+        self._buttonMask = reduce(operator.or_, [1 << b for b in self.BUTTONS])
+        self._lastSample = 0     # last port sample, 1 bits = pressed
+        self._debounced = 0      # debounced port state, 1 bits = pressed
+        self._interruptPin = None
+        self._edge = Event()     # set by the interrupt callback
+        self._edgeTimes = []     # times of the interrupts since the last change
+        self.lastEdgeTime = None # time of the most recent button edge
+        super(PortPushButtonMonitor, self).__init__()
+
+    # --------------------------------------------------------------------------
+    def __exit__(self, type, value, traceback):
+        """ Stops the monitor and releases the interrupt pin.
+        """
+        self._timeToExit = True
+        self._edge.set()  # wake the thread if it is waiting for an interrupt
+        super(PortPushButtonMonitor, self).__exit__(type, value, traceback)
+        if self._interruptPin is not None:
+            GPIO.remove_event_detect(self._interruptPin)
+
+    # --------------------------------------------------------------------------
+    def setInterruptPin(self, pin):
+        """ Wait for the plate's interrupt line instead of polling the buttons.
+
+        Enables interrupt-on-change for the button pins of the MCP23017 and
+        watches for falling edges of INTA on the given pin.  Must be called
+        after setDevice().
+
+        Args:
+            pin (int): the BCM number of the GPIO pin wired to INTA
+        """
+        i2c = self._device._mcp._device  # the MCP230xx's I2C device
+        def enableInterrupts():
+            i2c.write8(self.INTCONA, 0)
+            i2c.write8(self.GPINTENA, self._buttonMask)
+            i2c.readU8(self.GPIOA)  # clears any pending interrupt
+        self._bus.call(I2cBus.BUTTONS, enableInterrupts)
+
+        GPIO.setmode(GPIO.BCM)
+        GPIO.setup(pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+        GPIO.add_event_detect(pin, GPIO.FALLING, callback=self.onInterrupt)
+        self._interruptPin = pin
+        logger.info('Push button monitor waiting for interrupts on GPIO %d' % (pin))
+
+    # --------------------------------------------------------------------------
+    def onInterrupt(self, pin):
+        """ Records the time of an interrupt and wakes the monitor thread.
+        """
+        self._edgeTimes.append(time())
+        self._edge.set()
+
+    # --------------------------------------------------------------------------
+    def readPort(self):
+        """ Returns: the button port with 1 bits for the pressed buttons.
+
+        The buttons pull their pins low when pressed.
+        """
+        port = self._bus.call(I2cBus.BUTTONS, partial(self._device._mcp._device.readU8, self.GPIOA))
+        return ~port & self._buttonMask
+
+    # --------------------------------------------------------------------------
+    def pollPushButtons(self):
+        """ Sample the button port once and deliver the debounced changes.
+        """
+        sample = self.readPort()
+        changed = (sample ^ self._debounced) & ~(sample ^ self._lastSample)
+        self._lastSample = sample
+        if not changed:
+            return
+
+        self._debounced ^= changed
+        edgeTimes, self._edgeTimes = self._edgeTimes, []
+        self.lastEdgeTime = edgeTimes[0] if edgeTimes else time()
+        logger.debug('Push button port changed to 0x%02x %.1f ms after the edge' %
+                     (self._debounced, 1000.0 * (time() - self.lastEdgeTime)))
+
+        pressed = changed & sample
+        released = changed & ~sample
+        if pressed:
+            self.deliverButtonPressEvents([i for i in range(self.NUM_BUTTONS) if pressed & (1 << self.BUTTONS[i])])
+        if released:
+            self.deliverButtonReleaseEvents([i for i in range(self.NUM_BUTTONS) if released & (1 << self.BUTTONS[i])])
+
+    # --------------------------------------------------------------------------
+    def waitForSample(self, nextTick):
+        """ Sleeps until it is time to sample the buttons again.
+
+        While a change is being confirmed the port is sampled again after
+        SETTLE_INTERVAL.  Otherwise the monitor sleeps until the next tick,
+        or, with an interrupt pin and no tick callback, until a button changes.
+        An interrupt ends the wait for the next tick early.
+
+        Args:
+            nextTick (float): the time of the next onTick() call
+        """
+        if self._listening and self._lastSample != self._debounced:
+            sleep(self.SETTLE_INTERVAL)
+        elif self._interruptPin is None:
+            sleep(max(nextTick - time(), 0))
+        else:
+            if self._onTickCallback:
+                self._edge.wait(max(nextTick - time(), 0))
+            else:
+                self._edge.wait()  # no timeout: a timed wait polls in Python 2
+            self._edge.clear()
+
+    # --------------------------------------------------------------------------
+    def run(self):
+        """ Samples the buttons and calls onTick() every DEBOUNCE_INTERVAL.
+        """
+        logger.debug('Starting push button port thread')
+
+        nextTick = time()
+        while not self._timeToExit:
+            try:
+                if self._listening:
+                    self.pollPushButtons()
+                if time() >= nextTick:
+                    self.onTick()  # event callback for animation
+                    nextTick = max(nextTick + self.DEBOUNCE_INTERVAL, time())
+                self.waitForSample(nextTick)
+
+            except Exception, e:
+                exType, ex, tb = sys.exc_info()
+                logger.critical("Exception occurred of type %s in push button monitor" % (exType.__name__))
+                logger.critical(str(e))
+                traceback.print_tb(tb)
+                sleep(self.DEBOUNCE_INTERVAL)  # don't spin on a failing read
+
+
 # ------------------------------------------------------------------------------
 class VibrationMotor(IVibrationMotor):
     """
@@ -979,12 +1380,7 @@ class UrgencyLed(IUrgencyLed):
 
         self.outputPin = getattr(pibrella.output, outputPin)
 
-        self._timeToExit = False
-        self._transitionToStarted = False
-
-        self._thread = Thread(target = self.run)
-        self._thread.daemon = True
-        self._thread.start()
+        self._animation = None
     
     # --------------------------------------------------------------------------
     def __enter__(self):
@@ -1026,102 +1422,16 @@ class UrgencyLed(IUrgencyLed):
 
         """
         logger.debug('Exiting urgency LED %s', self.Name)
-        self.stop()		
-        stopListening(self)
-        self._timeToExit = True
-        self._thread.join()
+        self.stop()
 		
     # --------------------------------------------------------------------------
-    def computeDelay(self,
-                     percentComplete):
-        """TODO strictly one-line summary
-
-        TODO Detailed multi-line description if
-        necessary.
-
-        Args:
-            arg1 (type1): TODO describe arg, valid values, etc.
-            arg2 (type2): TODO describe arg, valid values, etc.
-            arg3 (type3): TODO describe arg, valid values, etc.
-        Returns:
-            TODO describe the return type and details
-        Raises:
-            TodoError1: if TODO.
-            TodoError2: if TODO.
-
-        """
-
-        delay_ms = (1.0 - percentComplete) * self.max_period_ms + percentComplete * self.min_period_ms
-
-        logger.debug('computeDelay({}) returning {}'.format(percentComplete, delay_ms))
-        return delay_ms
-
-    # --------------------------------------------------------------------------
-    def run(self):
-        """TODO strictly one-line summary
-
-        TODO Detailed multi-line description if
-        necessary.
-
-        Args:
-            arg1 (type1): TODO describe arg, valid values, etc.
-            arg2 (type2): TODO describe arg, valid values, etc.
-            arg3 (type3): TODO describe arg, valid values, etc.
-        Returns:
-            TODO describe the return type and details
-        Raises:
-            TodoError1: if TODO.
-            TodoError2: if TODO.
-
+    def setLevel(self, level):
+        """ Turns the pin on for any non-zero level (called by the LED animator).
         """
-        logger.info('Starting thread for urgency LED %s' % (self.Name))
-
-        delay_s = self.max_period_ms / 1000.0
-
-        while not self._timeToExit:
-            try:
-                if self._transitionToStarted:
-                    now = datetime.datetime.now()
-                    currentDelta = now - self.startTime
-                    current_ms = int(currentDelta.total_seconds() * 1000.0)
-                    delay_ms = self.computeDelay(current_ms * 1.0 / self.boom_ms)
-                    delay_s = delay_ms / 1000.0
-
-                    if self.flag:
-                        self.flag = False
-                        self.outputPin.off()
-                        logger.debug('urgency LED \"%s\" pin off.', self.Name)
-
-                        sleepDelay_s = delay_s - (self.min_period_ms / 1000.0)
-                    else:
-                        self.flag = True
-                        self.outputPin.on()
-                        logger.debug('urgency LED \"%s\" pin on.', self.Name)
-
-                        sleepDelay_s = self.min_period_ms / 1000.0
-
-                    logger.debug('current_ms={} vs. boom_ms={} => quotient={}, delay_ms={}, delay_s={}, sleepDelay_s={}'.format(current_ms, self.boom_ms, current_ms * 1.0 / self.boom_ms, delay_ms, delay_s, sleepDelay_s))
-
-                    if current_ms >= self.boom_ms:
-                        logger.info('Urgency LED %s transitioning to stopped.' % (self.Name))
-                        self._transitionToStarted = False
-
-                        delay_s = self.max_period_ms / 1000.0
-                        sleepDelay_s = delay_s
-
-                    logger.debug('Urgency LED thread sleeping for {} sec with flag={}.'.format(sleepDelay_s, self.flag))
-                else:
-                    pass # Nothing to do
-                    sleepDelay_s = delay_s
-
-                sleep(sleepDelay_s)
-            except Exception, e:
-               exType, ex, tb = sys.exc_info()
-               logger.critical("Exception occurred of type %s in urgency LED %s: %s" % (exType.__name__, self.Name, str(e)))
-               traceback.print_tb(tb)
-
-        logger.info('Stopping thread for urgency LED %s' % (self.Name))
-
+        if level:
+            self.outputPin.on()
+        else:
+            self.outputPin.off()
 
     # --------------------------------------------------------------------------
     def start(self,
@@ -1143,15 +1453,17 @@ class UrgencyLed(IUrgencyLed):
 
         """
         
-        self.flag = True
-        self.outputPin.on()
         self.startTime = datetime.datetime.now()
         self.boomTime = self.startTime + datetime.timedelta(milliseconds=total_epoch_ms)
-        self.boomDelta = self.boomTime - self.startTime
-        self.boom_ms = int(self.boomDelta.total_seconds() * 1000.0)
 
         logger.info('Urgency LED {} transitioning to started at time {} for boom at {} with total_epoch_ms={}.'.format(self.Name, self.startTime, self.boomTime, total_epoch_ms))
-        self._transitionToStarted = True
+        if self._animation is not None:
+            self._animation.cancel()
+        self._animation = ledAnimator().schedule(animation.urgencyRamp(self.setLevel,
+                                                                       total_epoch_ms / 1000.0,
+                                                                       self.max_period_ms / 1000.0,
+                                                                       self.min_period_ms / 1000.0,
+                                                                       self.min_period_ms / 1000.0))
 
     # --------------------------------------------------------------------------
     def stop(self):
@@ -1172,8 +1484,10 @@ class UrgencyLed(IUrgencyLed):
 
         """
         logger.debug('Stopped urgency LED \"%s\".', self.Name)
+        if self._animation is not None:
+            self._animation.cancel()
+            self._animation = None
         self.outputPin.off()
-        self._transitionToStarted = False
 
 # ------------------------------------------------------------------------------
 class Buzzer(IBuzzer):
@@ -0,0 +1,232 @@
+# ------------------------------------------------------------------------------
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+# ------------------------------------------------------------------------------
+"""
+Provides a scheduler that owns the I2C bus, so the devices on it (the LCD plate,
+the PCA9685 LED driver, the OLED display) are never used by two threads at once.
+"""
+
+import heapq
+import logging
+import logging.handlers
+import threading
+from time import time
+
+from station.util import Future
+
+
+# ------------------------------------------------------------------------------
+class I2cBus(object):
+    """
+    Runs every I2C transaction of the station on one thread.
+
+    Other threads hand the bus a transaction as a callable that takes no
+    arguments.  The bus thread runs them one at a time, in priority order
+    (BUTTONS first, then DISPLAY, then LEDS), and in the order they were queued
+    within a priority.
+
+    submit() returns a Future for the transaction's result.  post() is fire
+    and forget: with a key, a transaction replaces the one with the same key
+    that is still waiting, so a burst of writes to the same LED or display
+    goes out as one write of the latest value.
+    """
+
+    BUTTONS, DISPLAY, LEDS = 0, 1, 2
+    PRIORITY_NAMES = ('buttons', 'display', 'leds')
+
+    # --------------------------------------------------------------------------
+    def __init__(self):
+        """Create the bus and start its thread."""
+        self._queue = []   # heap of [priority, seq, key, operation, future, queued]
+        self._keyed = {}   # key -> the queue entry waiting with that key
+        self._seq = 0
+        self._ready = threading.Condition(threading.Lock())
+        self._timeToExit = False
+
+        self._started = time()
+        self._busySec = 0.0
+        self._counts = [0] * len(self.PRIORITY_NAMES)
+        self._maxWaitSec = [0.0] * len(self.PRIORITY_NAMES)
+        self._coalesced = 0
+        self._errors = 0
+
+        self._thread = threading.Thread(target=self.run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    # --------------------------------------------------------------------------
+    def submit(self, priority, operation):
+        """Queue a transaction and return a Future for its result.
+
+        Args:
+            priority (int): BUTTONS, DISPLAY or LEDS
+            operation (callable): does the transaction; its return value (or
+                exception) becomes the result of the Future
+        Returns:
+            A station.util.Future
+        """
+        future = Future()
+        self._put(priority, operation, None, future)
+        return future
+
+    # --------------------------------------------------------------------------
+    def call(self, priority, operation, timeoutSec=None):
+        """Run a transaction and wait for it.
+
+        Returns:
+            The return value of operation
+        Raises:
+            Exception: the exception raised by operation
+            FutureTimeout: if the transaction does not finish in time
+        """
+        if threading.current_thread() is self._thread:
+            return operation()  # already on the bus
+        return self.submit(priority, operation).result(timeoutSec)
+
+    # --------------------------------------------------------------------------
+    def post(self, priority, operation, key=None):
+        """Queue a transaction whose result nobody waits for.
+
+        Exceptions are logged.
+
+        Args:
+            priority (int): BUTTONS, DISPLAY or LEDS
+            operation (callable): does the transaction
+            key: if given, replaces the waiting transaction posted with an
+                equal key (keeping its place in the queue)
+        """
+        self._put(priority, operation, key, None)
+
+    # --------------------------------------------------------------------------
+    def drain(self, timeoutSec=None):
+        """Wait until every transaction queued so far has run."""
+        self.submit(len(self.PRIORITY_NAMES), lambda: None).result(timeoutSec)
+
+    # --------------------------------------------------------------------------
+    def _put(self, priority, operation, key, future):
+        """Add a transaction to the queue (or replace one with the same key)."""
+        with self._ready:
+            if self._timeToExit:
+                raise IOError('I2C bus is closed')
+            entry = self._keyed.get(key) if key is not None else None
+            if entry is not None and entry[0] == priority:
+                entry[3] = operation
+                self._coalesced += 1
+                return
+            entry = [priority, self._seq, key, operation, future, time()]
+            self._seq += 1
+            heapq.heappush(self._queue, entry)
+            if key is not None:
+                self._keyed[key] = entry
+            self._ready.notify()
+
+    # --------------------------------------------------------------------------
+    def run(self):
+        """Run the queued transactions until close() is called."""
+        logger.debug('Starting I2C bus thread')
+        while True:
+            with self._ready:
+                while not self._queue and not self._timeToExit:
+                    self._ready.wait()
+                if not self._queue:
+                    break
+                priority, seq, key, operation, future, queued = heapq.heappop(self._queue)
+                if key is not None and self._keyed.get(key) is not None and self._keyed[key][1] == seq:
+                    del self._keyed[key]
+
+            started = time()
+            try:
+                result = operation()
+            except Exception as e:
+                self._errors += 1
+                if future is not None:
+                    future.setException(e)
+                else:
+                    logger.warning('I2C %s transaction failed: %s' % (self._priorityName(priority), e))
+            else:
+                if future is not None:
+                    future.setResult(result)
+            finished = time()
+
+            if priority < len(self.PRIORITY_NAMES):
+                self._busySec += finished - started
+                self._counts[priority] += 1
+                self._maxWaitSec[priority] = max(self._maxWaitSec[priority], started - queued)
+
+    # --------------------------------------------------------------------------
+    def _priorityName(self, priority):
+        """Return the name of a priority for the log."""
+        return self.PRIORITY_NAMES[priority] if priority < len(self.PRIORITY_NAMES) else str(priority)
+
+    # --------------------------------------------------------------------------
+    def stats(self):
+        """Return a dict of bus usage since the bus was created.
+
+        utilisation is the fraction of the time the bus thread spent in
+        transactions; transactions and max_wait_ms (the longest time a
+        transaction waited in the queue) are given for each priority.
+        """
+        elapsed = max(time() - self._started, 1e-6)
+        with self._ready:
+            return {'utilisation': self._busySec / elapsed,
+                    'busy_sec': self._busySec,
+                    'queued': len(self._queue),
+                    'coalesced': self._coalesced,
+                    'errors': self._errors,
+                    'transactions': dict(zip(self.PRIORITY_NAMES, self._counts)),
+                    'max_wait_ms': dict(zip(self.PRIORITY_NAMES, [1000.0 * w for w in self._maxWaitSec]))}
+
+    # --------------------------------------------------------------------------
+    def close(self, timeoutSec=None):
+        """Run the transactions already queued, then stop the bus thread."""
+        with self._ready:
+            self._timeToExit = True
+            self._ready.notify()
+        if threading.current_thread() is not self._thread:
+            self._thread.join(timeoutSec)
+        logger.info('I2C bus closed: %s' % (self.stats()))
+
+
+# ------------------------------------------------------------------------------
+_sharedBus = None
+_sharedBusLock = threading.Lock()
+
+# ------------------------------------------------------------------------------
+def sharedBus():
+    """Return the I2cBus shared by every device of the station, creating it
+    the first time.
+    """
+    global _sharedBus
+    with _sharedBusLock:
+        if _sharedBus is None:
+            _sharedBus = I2cBus()
+        return _sharedBus
+
+# ------------------------------------------------------------------------------
+def sharedBusStats():
+    """Return the stats() of the shared I2cBus, or None if no device has used
+    it (e.g. on a console station).
+    """
+    with _sharedBusLock:
+        bus = _sharedBus
+    return bus.stats() if bus is not None else None
+
+
+# ------------------------------------------------------------------------------
+# Module Initialization
+# ------------------------------------------------------------------------------
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.handlers.SysLogHandler(address = '/dev/log')
+logger.addHandler(handler)
@@ -185,6 +185,14 @@ class IDisplay:
         """ Sets the position of the cursor.
         """
         pass
+
+    # --------------------------------------------------------------------------
+    @abstractmethod
+    def batch(self):
+        """ Returns: a context manager; the display changes made inside its
+        with block are shown together when the block ends.
+        """
+        pass
     
 # ------------------------------------------------------------------------------
 class ILed:
@@ -0,0 +1,220 @@
+# ------------------------------------------------------------------------------
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+# ------------------------------------------------------------------------------
+"""
+Provides a durable store-and-forward outbox for messages from the station to
+the Master Server.
+"""
+
+from collections import namedtuple
+import logging
+import logging.handlers
+import os
+import sqlite3
+import threading
+from time import time
+import uuid
+
+
+OutboxMessage = namedtuple('OutboxMessage', 'seq messageId kind url body bootId created attempts')
+
+
+# ------------------------------------------------------------------------------
+class Outbox(object):
+    """
+    An ordered queue of outbound messages, kept in a SQLite database.
+
+    A message is written to the database (and synced to disk) by put() before
+    anything tries to send it.  A sender thread then delivers the messages one
+    at a time, oldest first, retrying the oldest one until it is delivered or
+    rejected.  Messages left in the database when the station stops are sent
+    when it starts again.
+
+    Every message has a message id.  Putting a message whose id is already in
+    the outbox (pending or sent) does nothing, so a message is never queued
+    twice.
+    """
+
+    PENDING, SENT, REJECTED = 'pending', 'sent', 'rejected'
+
+    KEEP_SENT = 1000  # sent message ids to remember for de-duplication
+
+    # --------------------------------------------------------------------------
+    def __init__(self, path, retryDelay=None):
+        """Open (or create) the outbox database.
+
+        Args:
+            path (str): the database file; its directory is created if needed
+            retryDelay (callable): retryDelay(attempt) returns the seconds to
+                wait after failed attempt number attempt (0, 1, ...);
+                the default doubles from 1 sec up to 30 sec
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=FULL')
+        self._db.execute('''CREATE TABLE IF NOT EXISTS outbox (
+                                seq        INTEGER PRIMARY KEY AUTOINCREMENT,
+                                message_id TEXT UNIQUE NOT NULL,
+                                kind       TEXT NOT NULL,
+                                url        TEXT NOT NULL,
+                                body       TEXT NOT NULL,
+                                boot_id    TEXT NOT NULL,
+                                created    REAL NOT NULL,
+                                status     TEXT NOT NULL,
+                                attempts   INTEGER NOT NULL DEFAULT 0,
+                                last_error TEXT)''')
+        self._lock = threading.Lock()
+        self._wake = threading.Event()  # set when there is something new to send
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.bootId = uuid.uuid4().hex  # identifies the messages put since this Outbox was opened
+        self.retryDelay = retryDelay or (lambda attempt: min(30.0, 2.0 ** attempt))
+
+        logger.info('Opened outbox %s with %d pending messages' % (path, self.pendingCount()))
+
+    # --------------------------------------------------------------------------
+    def put(self, kind, url, body, messageId=None):
+        """Add a message to the end of the outbox.
+
+        Args:
+            kind (str): what the message is, e.g. "submit"
+            url (str): where to send it
+            body (str): the message body
+            messageId (str): a unique id for the message (default: a new UUID)
+        Returns:
+            The message id
+        """
+        messageId = messageId or uuid.uuid4().hex
+        with self._lock:
+            cursor = self._db.execute('INSERT OR IGNORE INTO outbox (message_id, kind, url, body, boot_id, created, status) '
+                                      'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                      (messageId, kind, url, body, self.bootId, time(), self.PENDING))
+        if cursor.rowcount:
+            logger.debug('Outbox queued %s message %s' % (kind, messageId))
+            self._wake.set()
+        else:
+            logger.info('Outbox already has message %s; not queued again' % (messageId))
+        return messageId
+
+    # --------------------------------------------------------------------------
+    def next(self):
+        """Return the oldest pending OutboxMessage, or None if there are none."""
+        with self._lock:
+            row = self._db.execute('SELECT seq, message_id, kind, url, body, boot_id, created, attempts '
+                                   'FROM outbox WHERE status = ? ORDER BY seq LIMIT 1',
+                                   (self.PENDING,)).fetchone()
+        return OutboxMessage(*row) if row else None
+
+    # --------------------------------------------------------------------------
+    def pendingCount(self):
+        """Return the number of messages waiting to be sent."""
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM outbox WHERE status = ?',
+                                    (self.PENDING,)).fetchone()[0]
+
+    # --------------------------------------------------------------------------
+    def markSent(self, message):
+        """Record that a message was delivered, and forget old sent messages."""
+        with self._lock:
+            self._db.execute('UPDATE outbox SET status = ?, attempts = attempts + 1 WHERE seq = ?',
+                             (self.SENT, message.seq))
+            self._db.execute('DELETE FROM outbox WHERE status = ? AND seq <= '
+                             '(SELECT seq FROM outbox WHERE status = ? ORDER BY seq DESC LIMIT 1 OFFSET ?)',
+                             (self.SENT, self.SENT, self.KEEP_SENT))
+
+    # --------------------------------------------------------------------------
+    def markRejected(self, message, error):
+        """Record that a message can never be delivered, so it is not retried."""
+        with self._lock:
+            self._db.execute('UPDATE outbox SET status = ?, attempts = attempts + 1, last_error = ? WHERE seq = ?',
+                             (self.REJECTED, str(error), message.seq))
+        logger.critical('Outbox gave up on %s message %s: %s' % (message.kind, message.messageId, error))
+
+    # --------------------------------------------------------------------------
+    def markFailed(self, message, error):
+        """Record a failed attempt; the message stays pending."""
+        with self._lock:
+            self._db.execute('UPDATE outbox SET attempts = attempts + 1, last_error = ? WHERE seq = ?',
+                             (str(error), message.seq))
+
+    # --------------------------------------------------------------------------
+    def start(self, deliver):
+        """Start the sender thread.
+
+        Args:
+            deliver (callable): deliver(message) sends an OutboxMessage.  It
+                returns True when the message was delivered, False if it was
+                rejected and must not be retried, and raises an exception if
+                the attempt failed and should be retried.
+        """
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._send, args=(deliver,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    # --------------------------------------------------------------------------
+    def stop(self, timeout=None):
+        """Stop the sender thread (pending messages stay in the outbox)."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    # --------------------------------------------------------------------------
+    def _send(self, deliver):
+        """Deliver the pending messages in order until stop() is called."""
+        failures = 0
+        while not self._stop.is_set():
+            self._wake.clear()
+            message = self.next()
+            if message is None:
+                self._wake.wait()
+                continue
+
+            try:
+                delivered = deliver(message)
+            except Exception as e:
+                self.markFailed(message, e)
+                logger.warning('Outbox could not send %s message %s (attempt %d): %s' % (message.kind, message.messageId, message.attempts + 1, e))
+                self._stop.wait(self.retryDelay(failures))
+                failures += 1
+                continue
+
+            failures = 0
+            if delivered:
+                self.markSent(message)
+            else:
+                self.markRejected(message, 'rejected by the receiver')
+
+    # --------------------------------------------------------------------------
+    def close(self):
+        """Stop sending and close the database."""
+        self.stop()
+        with self._lock:
+            self._db.close()
+
+
+# ------------------------------------------------------------------------------
+# Module Initialization
+# ------------------------------------------------------------------------------
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.handlers.SysLogHandler(address = '/dev/log')
+logger.addHandler(handler)
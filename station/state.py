@@ -31,6 +31,8 @@ class State:
 
     READY, PROCESSING, PROCESSING2, PROCESSING_COMPLETED, FAILED, PASSED = range(6)
 
+    NAMES = ('READY', 'PROCESSING', 'PROCESSING2', 'PROCESSING_COMPLETED', 'FAILED', 'PASSED')
+
 
 # ------------------------------------------------------------------------------
 class HttpMethod:
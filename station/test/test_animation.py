@@ -0,0 +1,119 @@
+# ------------------------------------------------------------------------------
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+# ------------------------------------------------------------------------------
+"""
+Unit tests for the LED animator and its brightness curves.
+"""
+
+from time import sleep
+import unittest
+
+from station import animation
+from station.animation import LedAnimator
+
+# ------------------------------------------------------------------------------
+class CurveTestCase(unittest.TestCase):
+    """
+    Steps the curves with made-up times and records the brightness.
+    """
+
+    # --------------------------------------------------------------------------
+    def setUp(self):
+        self.levels = []
+
+    # --------------------------------------------------------------------------
+    def test_fade(self):
+        """A fade steps every stepSec and ends at exactly its end level."""
+        step = animation.fade(self.levels.append, 1.0, 0.0, 1.0, 0.25)
+        self.assertEqual(0.25, step(10.0))
+        self.assertEqual(0.25, step(10.5))
+        self.assertEqual(None, step(11.0))
+        self.assertEqual([1.0, 0.5, 0.0], self.levels)
+
+    # --------------------------------------------------------------------------
+    def test_flash(self):
+        """A flash only wakes up to turn the LED on or off."""
+        step = animation.flash(self.levels.append, 0.5, 1.5)
+        self.assertEqual([0.5, 1.5, 0.5], [step(t) for t in (0.0, 0.5, 2.0)])
+        self.assertEqual([1.0, 0.0, 1.0], self.levels)
+
+    # --------------------------------------------------------------------------
+    def test_pulse(self):
+        """A pulse fades in, holds, fades out and holds off."""
+        step = animation.pulse(self.levels.append, 1.0, 1.0, 2.0, 2.0, 0.5)
+        self.assertEqual(0.5, step(0.0))
+        self.assertEqual(0.5, step(0.5))
+        self.assertEqual(2.0, step(1.0))
+        self.assertEqual(0.5, step(3.5))
+        self.assertEqual(2.0, step(4.0))
+        self.assertEqual(0.5, step(6.0))
+        self.assertEqual([0.0, 0.5, 1.0, 0.5, 0.0, 0.0], self.levels)
+
+    # --------------------------------------------------------------------------
+    def test_urgencyRamp(self):
+        """The off time shrinks towards the end, and the ramp stops at the end."""
+        step = animation.urgencyRamp(self.levels.append, 10.0, 2.0, 0.5, 0.25)
+        self.assertEqual(0.25, step(0.0))
+        self.assertEqual(1.75 - 0.0375, step(0.25))
+        self.assertEqual(0.25, step(9.0))
+        self.assertAlmostEqual(0.5 + 1.5 * 0.075 - 0.25, step(9.25))
+        self.assertEqual(None, step(10.0))
+        self.assertEqual([1.0, 0.0, 1.0, 0.0], self.levels)
+
+# ------------------------------------------------------------------------------
+class LedAnimatorTestCase(unittest.TestCase):
+    """
+    Runs animations on an animator thread.
+    """
+
+    # --------------------------------------------------------------------------
+    def setUp(self):
+        self.Target = LedAnimator()
+        self.levels = []
+
+    # --------------------------------------------------------------------------
+    def tearDown(self):
+        self.Target.close()
+
+    # --------------------------------------------------------------------------
+    def test_runsToEnd(self):
+        """An animation runs until its step returns None."""
+        a = self.Target.schedule(animation.fade(self.levels.append, 0.0, 1.0, 0.05, 0.01))
+        sleep(0.3)
+        self.assertTrue(a.done)
+        self.assertEqual(1.0, self.levels[-1])
+        self.assertTrue(len(self.levels) >= 3)
+
+    # --------------------------------------------------------------------------
+    def test_cancel(self):
+        """A cancelled animation is not stepped again."""
+        a = self.Target.schedule(animation.flash(self.levels.append, 0.01, 0.01))
+        sleep(0.1)
+        a.cancel()
+        count = len(self.levels)
+        sleep(0.1)
+        self.assertTrue(a.done)
+        self.assertEqual(count, len(self.levels))
+
+    # --------------------------------------------------------------------------
+    def test_earliestFirst(self):
+        """Animations scheduled later but due sooner run first."""
+        self.Target.schedule(lambda now: self.levels.append('late'), 0.1)
+        self.Target.schedule(lambda now: self.levels.append('soon'), 0.02)
+        sleep(0.3)
+        self.assertEqual(['soon', 'late'], self.levels)
+
+# ------------------------------------------------------------------------------
+if __name__ == '__main__':
+    unittest.main()
@@ -19,11 +19,19 @@ TODO module description
 from mock import MagicMock
 from mock import Mock
 from mock import patch
+import requests
 import sys
+from threading import Event
+from tornado import gen
+from tornado.concurrent import Future as TornadoFuture
+from tornado.ioloop import IOLoop
 import unittest
 
 sys.modules['flask'] = MagicMock()
 from station.connection import ConnectionManager
+from station.connection import StatusHandler
+from station.connection import SubmitError
+from station.connection import tornadoPattern
 from station.state import State
 
 # ------------------------------------------------------------------------------
@@ -58,6 +66,9 @@ class ConnectionManagerTestCase(unittest.TestCase):
         config.StartChallengeUrlRule = '/path/to/sc'
         config.HandleSubmissionUrlRule = '/path/to/hs'
         config.ShutdownUrlRule = '/path/to/hd'
+        config.OutboxPath = ':memory:'
+        config.ConnectionCheckSec = 5.0
+        config.HeartbeatSec = 15.0
 
         self.Target = ConnectionManager(station, stationTypeId, config)
 
@@ -498,6 +509,325 @@ class ConnectionManagerTestCase(unittest.TestCase):
         # TODO
 
 
+# ------------------------------------------------------------------------------
+def makeConnectionManager(station):
+    """Returns: a ConnectionManager with an in-memory outbox whose sender is
+    stopped, so the tests deliver the messages themselves.
+    """
+    config = Mock()
+    config.StationId = 'secure01'
+    config.SubmitUrl = 'http://ms/piservice/submit/'
+    config.OutboxPath = ':memory:'
+    config.ConnectionCheckSec = 5.0
+    config.HeartbeatUrl = 'http://ms/piservice/heartbeat/'
+    config.HeartbeatSec = 15.0
+    config.MaxSubmitsInFlight = 2
+    config.SubmitTimeoutSec = 15.0
+    manager = ConnectionManager(station, 'secure', config)
+    manager._outbox.stop()
+    return manager
+
+# ------------------------------------------------------------------------------
+class SubmitTestCase(unittest.TestCase):
+    """
+    Submissions wait for the MS reply on a Future, and the station state is
+    changed by the dispatcher thread when they are done.
+    """
+
+    # --------------------------------------------------------------------------
+    def setUp(self):
+        """Creates a connection manager for a station that is processing.
+        """
+        self.Station = Mock()
+        self.Station.State = State.PROCESSING
+        self.Target = makeConnectionManager(self.Station)
+
+    # --------------------------------------------------------------------------
+    def waitForDispatcher(self):
+        """Waits until the calls dispatched so far have been made.
+        """
+        done = Event()
+        self.Target.dispatch(done.set)
+        self.assertTrue(done.wait(5.0))
+
+    # --------------------------------------------------------------------------
+    def test_tooManyInFlight(self):
+        """A submission past MaxSubmitsInFlight fails at once and is not sent.
+        """
+        self.Target.submitAsync([1, 2, 3, 4], 'True', '')
+        self.Target.submitAsync([1, 2, 3, 4], 'True', '')
+        future = self.Target.submitAsync([1, 2, 3, 4], 'True', '')
+        self.assertTrue(future.done())
+        self.assertIsInstance(future.exception(), SubmitError)
+        self.assertIsNone(future.messageId)
+        self.assertEqual(2, self.Target._outbox.pendingCount())
+
+        self.waitForDispatcher()
+        self.assertEqual(State.PROCESSING, self.Station.State)
+
+    # --------------------------------------------------------------------------
+    def test_timeout(self):
+        """A submission the MS does not answer in time uses the station result.
+        """
+        with patch.object(self.Target, 'handleSubmissionResp',
+                          wraps=self.Target.handleSubmissionResp) as handleSubmissionResp:
+            future = self.Target.submitAsync([1, 2, 3, 4], 'True', '', timeoutSec=0.05)
+            self.assertRaises(SubmitError, future.result, 5.0)
+            self.waitForDispatcher()
+        handleSubmissionResp.assert_called_once_with('True', 'None')
+        self.assertEqual(State.PASSED, self.Station.State)
+        self.assertEqual(0, len(self.Target._submits))
+
+    # --------------------------------------------------------------------------
+    def test_deliver(self):
+        """The MS reply to a delivered submission resolves its Future.
+        """
+        future = self.Target.submitAsync([1, 2, 3, 4], 'False', 'Wrong code')
+        message = self.Target._outbox.next()
+        self.assertEqual(future.messageId, message.messageId)
+
+        with patch.object(self.Target, 'callService', return_value=(200, {'challenge_complete': False})):
+            self.assertTrue(self.Target.deliver(message))
+        self.assertEqual(False, future.result(5.0))
+
+        self.waitForDispatcher()
+        self.assertEqual(['False', 'False'], self.Station.args)
+        self.assertEqual(State.FAILED, self.Station.State)
+
+
+# ------------------------------------------------------------------------------
+class StatusTestCase(unittest.TestCase):
+    """
+    The status snapshot, as sent in the heartbeat and by GET status.
+    """
+
+    # --------------------------------------------------------------------------
+    def setUp(self):
+        """Creates a connection manager for a station that is processing.
+        """
+        self.Station = Mock()
+        self.Station.State = State.PROCESSING
+        self.Target = makeConnectionManager(self.Station)
+
+    # --------------------------------------------------------------------------
+    def test_statusSnapshot(self):
+        """The snapshot names the state and counts the messages waiting.
+        """
+        self.Target.submitAsync([1, 2, 3, 4], 'True', '')
+        snapshot = self.Target.statusSnapshot()
+        self.assertEqual(set(['station_id', 'station_type', 'message_timestamp', 'state',
+                              'connected', 'uptime_sec', 'loop_lag_ms', 'outbox_pending',
+                              'submits_in_flight', 'dispatch_queue', 'i2c_bus']),
+                         set(snapshot.keys()))
+        self.assertEqual('secure01', snapshot['station_id'])
+        self.assertEqual('secure', snapshot['station_type'])
+        self.assertEqual('PROCESSING', snapshot['state'])
+        self.assertEqual(False, snapshot['connected'])
+        self.assertEqual(1, snapshot['outbox_pending'])
+        self.assertEqual(1, snapshot['submits_in_flight'])
+
+    # --------------------------------------------------------------------------
+    def test_status(self):
+        """GET status replies with the snapshot, with Flask and with tornado.
+        """
+        with patch('station.connection.jsonify') as jsonify:
+            resp = self.Target.status()
+        self.assertEqual(self.Target.statusSnapshot()['state'], jsonify.call_args[0][0]['state'])
+        self.assertEqual(200, resp.status_code)
+
+        handler = StatusHandler.__new__(StatusHandler)
+        handler.manager = self.Target
+        handler.set_status = Mock()
+        handler.finish = Mock()
+        handler.get()
+        handler.set_status.assert_called_once_with(200)
+        self.assertEqual('PROCESSING', handler.finish.call_args[0][0]['state'])
+
+    # --------------------------------------------------------------------------
+    def test_heartbeatFailure(self):
+        """A heartbeat that can't reach the MS marks the station not connected.
+        """
+        self.Target._connected = True
+        with patch.object(self.Target, 'callServiceAsync', side_effect=IOError('unreachable')):
+            IOLoop().run_sync(self.Target.sendHeartbeat)
+        self.assertFalse(self.Target._connected)
+
+
+# ------------------------------------------------------------------------------
+class RetryTestCase(unittest.TestCase):
+    """
+    callService() retries only the messages that are safe to send again.
+    """
+
+    URL = 'http://ms/piservice/join/'
+
+    # --------------------------------------------------------------------------
+    def setUp(self):
+        """Creates a connection manager that retries twice without waiting.
+        """
+        self.Target = makeConnectionManager(Mock())
+        self.Target._maxRetries = 2
+        self.Target.retryDelay = Mock(return_value=0.0)
+        self.Post = Mock()
+        self.Target._session.post = self.Post
+
+    # --------------------------------------------------------------------------
+    def reply(self, status):
+        """Returns: a mock response with the given status and an empty body.
+        """
+        response = Mock()
+        response.status_code = status
+        response.json.return_value = {}
+        return response
+
+    # --------------------------------------------------------------------------
+    def test_idempotentUnavailable(self):
+        """An idempotent message is retried after a 503.
+        """
+        self.Post.side_effect = [self.reply(503), self.reply(200)]
+        self.assertEqual((200, {}), self.Target.callService(0, self.URL, {}, idempotent=True))
+        self.assertEqual(2, self.Post.call_count)
+
+    # --------------------------------------------------------------------------
+    def test_notIdempotentUnavailable(self):
+        """A message that is not idempotent is not retried after a 503.
+        """
+        self.Post.side_effect = [self.reply(503), self.reply(200)]
+        self.assertEqual((503, {}), self.Target.callService(0, self.URL, {}))
+        self.assertEqual(1, self.Post.call_count)
+
+    # --------------------------------------------------------------------------
+    def test_notIdempotentReadTimeout(self):
+        """A message that is not idempotent is not retried after a read timeout.
+        """
+        self.Post.side_effect = [requests.exceptions.ReadTimeout('slow'), self.reply(200)]
+        self.assertRaises(requests.exceptions.ReadTimeout, self.Target.callService, 0, self.URL, {})
+        self.assertEqual(1, self.Post.call_count)
+
+    # --------------------------------------------------------------------------
+    def test_connectTimeout(self):
+        """Any message is retried after a connect timeout: the MS never got it.
+        """
+        self.Post.side_effect = [requests.exceptions.ConnectTimeout('unreachable'), self.reply(200)]
+        self.assertEqual((200, {}), self.Target.callService(0, self.URL, {}))
+        self.assertEqual(2, self.Post.call_count)
+
+    # --------------------------------------------------------------------------
+    def test_maxRetries(self):
+        """The last error is raised after MaxRetries retries.
+        """
+        self.Post.side_effect = requests.exceptions.ConnectTimeout('unreachable')
+        self.assertRaises(requests.exceptions.ConnectTimeout, self.Target.callService, 0, self.URL, {})
+        self.assertEqual(3, self.Post.call_count)
+        self.assertEqual([0, 1], [c[0][0] for c in self.Target.retryDelay.call_args_list])
+        self.assertEqual(3, self.Target.latencyStats()[self.URL]['errors'])
+
+
+# ------------------------------------------------------------------------------
+def resolved(value):
+    """Returns: a tornado Future that already has the result value.
+    """
+    future = TornadoFuture()
+    future.set_result(value)
+    return future
+
+# ------------------------------------------------------------------------------
+class LifecycleTestCase(unittest.TestCase):
+    """
+    Joining, re-joining and leaving the MS on the IOLoop.
+    """
+
+    # --------------------------------------------------------------------------
+    def setUp(self):
+        """Creates a listening connection manager whose HTTP server is a mock.
+        """
+        self.Target = makeConnectionManager(Mock())
+        self.Target._joinUrl = 'http://ms/piservice/join/'
+        self.Target._leaveUrl = 'http://ms/piservice/leave/'
+        self.Target._listening = True
+        self.Server = Mock()
+        self.Target.createHttpServer = Mock(return_value=self.Server)
+
+    # --------------------------------------------------------------------------
+    def test_rejoin(self):
+        """Every connection check joins, and the server is only started once.
+        """
+        with patch.object(self.Target, 'callServiceAsync', return_value=resolved((200, {}))) as callServiceAsync:
+            IOLoop().run_sync(self.Target.checkConnection)
+            self.assertTrue(self.Target._connected)
+            IOLoop().run_sync(self.Target.checkConnection)
+        self.assertEqual(2, callServiceAsync.call_count)
+        self.assertEqual(self.Target._joinUrl, callServiceAsync.call_args[0][1])
+        self.assertEqual(1, self.Target.createHttpServer.call_count)
+        self.Server.listen.assert_called_once_with(self.Target._listenPort)
+
+        with patch.object(self.Target, 'callServiceAsync', side_effect=IOError('unreachable')):
+            IOLoop().run_sync(self.Target.checkConnection)
+        self.assertFalse(self.Target._connected)
+        self.assertFalse(self.Target._checking)
+
+    # --------------------------------------------------------------------------
+    def test_oneCheckAtATime(self):
+        """A connection check is skipped while the last one is still joining.
+        """
+        reply = TornadoFuture()
+
+        @gen.coroutine
+        def checkTwice():
+            first = self.Target.checkConnection()
+            yield self.Target.checkConnection()
+            self.assertEqual(1, callServiceAsync.call_count)
+            reply.set_result((200, {}))
+            yield first
+
+        with patch.object(self.Target, 'callServiceAsync', return_value=reply) as callServiceAsync:
+            IOLoop().run_sync(checkTwice)
+        self.assertEqual(1, callServiceAsync.call_count)
+        self.assertTrue(self.Target._connected)
+
+    # --------------------------------------------------------------------------
+    def test_disconnect(self):
+        """disconnect() leaves the MS, stops the server, and after __exit__()
+        stops the IOLoop.
+        """
+        self.Target._connected = True
+        self.Target._server = self.Server
+        self.Target._timeToExit = True
+        with patch.object(self.Target, '_ioLoop') as ioLoop:
+            with patch.object(self.Target, 'callServiceAsync', return_value=resolved((200, {}))) as callServiceAsync:
+                IOLoop().run_sync(self.Target.disconnect)
+            ioLoop.stop.assert_called_once_with()
+        self.assertEqual(self.Target._leaveUrl, callServiceAsync.call_args[0][1])
+        self.assertFalse(self.Target._connected)
+        self.Server.stop.assert_called_once_with()
+        self.assertIsNone(self.Target._server)
+
+    # --------------------------------------------------------------------------
+    def test_disconnectLeaveFails(self):
+        """The server is stopped even if the MS can't be reached to leave.
+        """
+        self.Target._connected = True
+        self.Target._server = self.Server
+        with patch.object(self.Target, 'callServiceAsync', side_effect=IOError('unreachable')):
+            IOLoop().run_sync(self.Target.disconnect)
+        self.assertFalse(self.Target._connected)
+        self.Server.stop.assert_called_once_with()
+
+
+# ------------------------------------------------------------------------------
+class TornadoPatternTestCase(unittest.TestCase):
+    """
+    Converts the Flask URL rules in runstation.conf to tornado URL patterns.
+    """
+
+    # --------------------------------------------------------------------------
+    def test_tornadoPattern(self):
+        """Rule variables become named groups, and int variables match digits."""
+        self.assertEqual('/rpi/start_challenge$', tornadoPattern('/rpi/start_challenge'))
+        self.assertEqual('/rpi/reset/(?P<pin>[0-9]+)$', tornadoPattern('/rpi/reset/<int:pin>'))
+        self.assertEqual('/rpi/(?P<name>[^/]+)/(?P<pin>[0-9]+)$', tornadoPattern('/rpi/<name>/<int:pin>'))
+
+
 # ------------------------------------------------------------------------------
 if __name__ == '__main__':
     unittest.main()
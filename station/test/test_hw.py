@@ -17,16 +17,95 @@ TODO module description
 """
 
 # TODO There should be no problem with Mock on a non-Pi.
+from mock import call
 from mock import Mock  # @UnresolvedImport when not on R-Pi
+from mock import patch  # @UnresolvedImport when not on R-Pi
 import sys
 import unittest
 
 sys.modules['pibrella'] = Mock()
-sys.modules['Adafruit_CharLCD'] = Mock()
+sys.modules['Adafruit_CharLCD'] = Mock(SELECT=0, RIGHT=1, DOWN=2, UP=3, LEFT=4)
+sys.modules['RPi'] = Mock()
+sys.modules['RPi.GPIO'] = sys.modules['RPi'].GPIO
 sys.modules['smbus'] = Mock()
+from station.hw import Display
 from station.hw import Led
+from station.hw import PortPushButtonMonitor
 from station.hw import PushButtonMonitor
+from station.hw import PwmLed
+from station.hw import PwmLedBank
 from station.hw import VibrationMotor
+from time import sleep
+
+# ------------------------------------------------------------------------------
+class DisplayTestCase(unittest.TestCase):
+    """
+    Tests that the display only sends what changed.
+    """
+
+    # --------------------------------------------------------------------------
+    def setUp(self):
+        """Creates a 16 column display on a mock LCD plate.
+        """
+        config = Mock()
+        config.lineWidth = 16
+        self.Target = Display(config)
+        self.Target._lcd = Mock()
+        self.Lcd = self.Target._lcd
+        self.Bus = self.Target._bus
+
+    # --------------------------------------------------------------------------
+    def test_sameTextIsNotResent(self):
+        """Setting the text that is already shown writes nothing.
+        """
+        self.Target.setText("Hello\nWorld")
+        self.Bus.drain()
+        self.Lcd.reset_mock()
+        self.Target.setText("Hello\nWorld")
+        self.Bus.drain()
+        self.assertEqual([], self.Lcd.message.call_args_list)
+        self.assertEqual([], self.Lcd.set_cursor.call_args_list)
+
+    # --------------------------------------------------------------------------
+    def test_onlyChangedRunsAreWritten(self):
+        """Only the changed characters are written, each run after one cursor move.
+        """
+        self.Target.setText("Angle 10 20 30\n")
+        self.Bus.drain()
+        self.Lcd.reset_mock()
+        self.Target.setLine1Text("Angle 11 20 35")
+        self.Bus.drain()
+        self.assertEqual([call("1"), call("5")], self.Lcd.message.call_args_list)
+        self.assertEqual([call(7, 0), call(13, 0), call(16, 1)], self.Lcd.set_cursor.call_args_list)
+
+    # --------------------------------------------------------------------------
+    def test_closeRunsAreJoined(self):
+        """A single unchanged character between changes is rewritten.
+        """
+        self.Target.setText("abcd")
+        self.Bus.drain()
+        self.Lcd.reset_mock()
+        self.Target.setLine1Text("xbyd")
+        self.Bus.drain()
+        self.assertEqual([call("xby")], self.Lcd.message.call_args_list)
+
+    # --------------------------------------------------------------------------
+    def test_batch(self):
+        """Changes inside a batch are sent once, when it ends.
+        """
+        self.Target.setText("0")
+        self.Bus.drain()
+        self.Lcd.reset_mock()
+        with self.Target.batch():
+            self.Target.setBgColor("RED")
+            self.Target.setLine2Text("1")
+            self.Target.setLine2Text("2")
+            self.Target.setBgColor("WHITE")
+            self.Target.setCursor(1, 0)
+            self.assertEqual([], self.Lcd.method_calls)
+        self.Bus.drain()
+        self.assertEqual([call.set_cursor(0, 1), call.message("2"), call.set_cursor(0, 1)],
+                         self.Lcd.method_calls)
 
 # ------------------------------------------------------------------------------
 class LedTestCase(unittest.TestCase):
@@ -162,6 +241,109 @@ class LedTestCase(unittest.TestCase):
         # TODO
 
 
+# ------------------------------------------------------------------------------
+class PwmLedBankTestCase(unittest.TestCase):
+    """
+    Tests the block writes of the PCA9685 LED bank.
+    """
+
+    # --------------------------------------------------------------------------
+    def setUp(self):
+        """Creates a bank on a mock PWM driver.
+        """
+        with patch('station.hw.PWM') as pwmClass:
+            pwmClass.return_value.i2c.readU8.return_value = 0x01
+            self.Target = PwmLedBank(0x40, 200)
+        self.I2c = self.Target._pwm.i2c
+        self.I2c.reset_mock()
+
+    # --------------------------------------------------------------------------
+    def tearDown(self):
+        """Turns the bank off.
+        """
+        self.Target.stop()
+
+    # --------------------------------------------------------------------------
+    def test_init(self):
+        """The driver is put in auto-increment mode.
+        """
+        with patch('station.hw.PWM') as pwmClass:
+            pwmClass.return_value.i2c.readU8.return_value = 0x01
+            bank = PwmLedBank(0x41)
+            pwmClass.return_value.i2c.write8.assert_called_with(PwmLedBank.MODE1, 0x21)
+            bank.stop()
+
+    # --------------------------------------------------------------------------
+    def test_neighboursInOneWrite(self):
+        """Changed channels next to each other are sent in one block write.
+        """
+        self.Target.setLevel(2, 1.0)
+        self.Target.setLevel(3, 1.0)
+        self.Target.drain()
+        self.I2c.writeList.assert_called_once_with(PwmLedBank.LED0_ON_L + 8,
+                                                   [0, 0, 0xFF, 0x0F, 0, 0, 0xFF, 0x0F])
+
+    # --------------------------------------------------------------------------
+    def test_blockLimit(self):
+        """No block write is longer than CHANNELS_PER_WRITE channels.
+        """
+        self.Target.setLevel(0, 1.0)
+        self.Target.setLevel(12, 1.0)
+        self.Target.drain()
+        writes = self.I2c.writeList.call_args_list
+        self.assertEqual([PwmLedBank.LED0_ON_L, PwmLedBank.LED0_ON_L + 32], [c[0][0] for c in writes])
+        self.assertEqual([32, 20], [len(c[0][1]) for c in writes])
+
+    # --------------------------------------------------------------------------
+    def test_fade(self):
+        """A fade of a channel is stepped by the animator and ends at its end level.
+        """
+        led = PwmLed(self.Target, 5)
+        led.on()
+        self.Target.drain()
+        with patch.object(self.Target, 'setLevel', wraps=self.Target.setLevel) as setLevel:
+            led.fade(100, 0, 0.05)
+            self.assertTrue(led.isAnimating())
+            sleep(0.2)
+        self.Target.drain()
+        self.assertFalse(led.isAnimating())
+        levels = [c[0][1] for c in setLevel.call_args_list]
+        self.assertEqual(1.0, levels[0])
+        self.assertTrue(len(levels) > 2)
+        self.assertEqual(levels, sorted(levels, reverse=True))
+        self.assertEqual(0.0, self.Target.level(5))
+        self.assertEqual([0, 0, 0, 0], self.I2c.writeList.call_args_list[-1][0][1])
+
+    # --------------------------------------------------------------------------
+    def test_oneFramePerPeriod(self):
+        """Changes wait for the next frame, which sends every changed channel.
+        """
+        self.Target.setLevel(2, 1.0)
+        self.assertFalse(self.I2c.writeList.called)
+        sleep(3 * self.Target.framePeriod)
+        self.I2c.writeList.assert_called_once_with(PwmLedBank.LED0_ON_L + 8, [0, 0, 0xFF, 0x0F])
+
+    # --------------------------------------------------------------------------
+    def test_concurrentFades(self):
+        """Sixteen LEDs fading together cost one frame (two block writes) per period.
+        """
+        leds = [PwmLed(self.Target, c) for c in range(PwmLedBank.NUM_CHANNELS)]
+        self.Target.drain()
+        self.I2c.reset_mock()
+        fadeSec = 0.5
+        for led in leds:
+            led.fade(0, 100, fadeSec)
+        sleep(fadeSec + 5 * self.Target.framePeriod)
+        self.Target.drain()
+        self.assertFalse(any(led.isAnimating() for led in leds))
+
+        frames = fadeSec / self.Target.framePeriod
+        writes = self.I2c.writeList.call_args_list
+        self.assertTrue(frames <= len(writes) <= 2 * (frames + 3), len(writes))
+        fullWrites = [w for w in writes if len(w[0][1]) == 4 * PwmLedBank.CHANNELS_PER_WRITE]
+        self.assertTrue(len(fullWrites) >= 0.9 * len(writes), len(fullWrites))
+        self.assertEqual([0, 0, 0xFF, 0x0F] * PwmLedBank.CHANNELS_PER_WRITE, writes[-1][0][1])
+
 # ------------------------------------------------------------------------------
 class PushButtonMonitorTestCase(unittest.TestCase):
     """
@@ -328,6 +510,87 @@ class PushButtonMonitorTestCase(unittest.TestCase):
         self.Target.stopListening()
         # TODO
 
+# ------------------------------------------------------------------------------
+class PortPushButtonMonitorTestCase(unittest.TestCase):
+    """
+    Tests the debouncing of the whole button port.
+    """
+
+    # --------------------------------------------------------------------------
+    def setUp(self):
+        """Creates a listening monitor with a mock plate and a press handler.
+        """
+        self.Target = PortPushButtonMonitor()
+        self.Device = Mock(spec=['_mcp'])
+        self.Device._mcp = Mock(spec=['_device'])
+        self.Device._mcp._device = Mock(spec=['readU8', 'write8'])
+        self.Target.setDevice(self.Device)
+        self.Pressed = []
+        for name in PortPushButtonMonitor.BUTTON_NAMES:
+            config = Mock()
+            config.HwKeyPress = name
+            self.Target.registerPushButton(name, self.Pressed.append, config)
+
+    # --------------------------------------------------------------------------
+    def tearDown(self):
+        """Stops the monitor thread.
+        """
+        self.Target.__exit__(None, None, None)
+
+    # --------------------------------------------------------------------------
+    def poll(self, *samples):
+        """Polls the monitor once for each raw GPIOA value in samples.
+        """
+        for sample in samples:
+            self.Device._mcp._device.readU8.return_value = sample
+            self.Target.pollPushButtons()
+
+    # --------------------------------------------------------------------------
+    def test_pressNeedsTwoSamples(self):
+        """A press is delivered once two samples in a row agree.
+        """
+        self.poll(0xff, 0xfe)  # SELECT pulls bit 0 low
+        self.assertEqual([], self.Pressed)
+        self.poll(0xfe, 0xfe)
+        self.assertEqual(["SELECT"], self.Pressed)
+
+    # --------------------------------------------------------------------------
+    def test_bounceIsIgnored(self):
+        """A pin that changes on every sample is not delivered.
+        """
+        self.poll(0xf7, 0xff, 0xf7, 0xff)
+        self.assertEqual([], self.Pressed)
+
+    # --------------------------------------------------------------------------
+    def test_buttonsChangeTogether(self):
+        """Buttons pressed together are delivered from the same samples.
+        """
+        self.poll(0xe9, 0xe9)  # RIGHT, DOWN and LEFT
+        self.assertEqual(["RIGHT", "DOWN", "LEFT"], self.Pressed)
+        self.poll(0xff, 0xff, 0xfd, 0xfd)
+        self.assertEqual(["RIGHT", "DOWN", "LEFT", "RIGHT"], self.Pressed)
+
+    # --------------------------------------------------------------------------
+    def test_setInterruptPin(self):
+        """Interrupt-on-change is enabled for the button pins of the plate.
+        """
+        self.Target.setInterruptPin(17)
+        self.Device._mcp._device.write8.assert_has_calls(
+            [call(PortPushButtonMonitor.INTCONA, 0),
+             call(PortPushButtonMonitor.GPINTENA, 0x1f)])
+        self.Device._mcp._device.readU8.assert_called_with(PortPushButtonMonitor.GPIOA)
+
+    # --------------------------------------------------------------------------
+    def test_edgeTime(self):
+        """A change is stamped with the time of the first interrupt.
+        """
+        self.Target.onInterrupt(17)
+        edgeTime = self.Target._edgeTimes[0]
+        self.Target.onInterrupt(17)
+        self.poll(0xf7, 0xf7)
+        self.assertEqual(edgeTime, self.Target.lastEdgeTime)
+        self.assertEqual([], self.Target._edgeTimes)
+
 # ------------------------------------------------------------------------------
 class VibrationMotorTestCase(unittest.TestCase):
     """
@@ -0,0 +1,101 @@
+# ------------------------------------------------------------------------------
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+# ------------------------------------------------------------------------------
+"""
+Unit tests for the I2C bus scheduler.
+"""
+
+from mock import patch
+import threading
+import unittest
+
+from station import i2cbus
+from station.i2cbus import I2cBus
+
+# ------------------------------------------------------------------------------
+class I2cBusTestCase(unittest.TestCase):
+    """
+    Queues transactions while the bus thread is held up by a blocking one.
+    """
+
+    # --------------------------------------------------------------------------
+    def setUp(self):
+        """Create a bus and a list that the transactions append to."""
+        self.Target = I2cBus()
+        self.ran = []
+
+    # --------------------------------------------------------------------------
+    def tearDown(self):
+        """Stop the bus."""
+        self.Target.close(5.0)
+
+    # --------------------------------------------------------------------------
+    def holdBus(self):
+        """Block the bus thread until the returned Event is set."""
+        release = threading.Event()
+        started = threading.Event()
+        def hold():
+            started.set()
+            release.wait(5.0)
+        self.Target.post(I2cBus.LEDS, hold)
+        self.assertTrue(started.wait(5.0))
+        return release
+
+    # --------------------------------------------------------------------------
+    def test_priorityOrder(self):
+        """Waiting transactions run by priority, then in the order queued."""
+        release = self.holdBus()
+        self.Target.post(I2cBus.LEDS, lambda: self.ran.append('led'))
+        self.Target.post(I2cBus.DISPLAY, lambda: self.ran.append('display 1'))
+        self.Target.post(I2cBus.DISPLAY, lambda: self.ran.append('display 2'))
+        self.Target.post(I2cBus.BUTTONS, lambda: self.ran.append('buttons'))
+        release.set()
+        self.Target.drain(5.0)
+        self.assertEqual(['buttons', 'display 1', 'display 2', 'led'], self.ran)
+
+    # --------------------------------------------------------------------------
+    def test_keyedPostsCoalesce(self):
+        """Only the latest of the waiting posts with the same key runs."""
+        release = self.holdBus()
+        for value in range(5):
+            self.Target.post(I2cBus.LEDS, lambda value=value: self.ran.append(value), key=3)
+        self.Target.post(I2cBus.LEDS, lambda: self.ran.append('other'), key=4)
+        release.set()
+        self.Target.drain(5.0)
+        self.assertEqual([4, 'other'], self.ran)
+        self.assertEqual(4, self.Target.stats()['coalesced'])
+
+    # --------------------------------------------------------------------------
+    def test_submitResults(self):
+        """submit() and call() return the transaction's result or exception."""
+        self.assertEqual(42, self.Target.submit(I2cBus.BUTTONS, lambda: 42).result(5.0))
+        def fail():
+            raise IOError('no ACK')
+        self.assertRaises(IOError, self.Target.call, I2cBus.BUTTONS, fail, 5.0)
+        stats = self.Target.stats()
+        self.assertEqual(2, stats['transactions']['buttons'])
+        self.assertEqual(1, stats['errors'])
+
+    # --------------------------------------------------------------------------
+    def test_sharedBusStats(self):
+        """The shared bus's stats are reported once a device has used it."""
+        with patch.object(i2cbus, '_sharedBus', None):
+            self.assertIsNone(i2cbus.sharedBusStats())
+        with patch.object(i2cbus, '_sharedBus', self.Target):
+            self.Target.call(I2cBus.LEDS, lambda: None)
+            self.assertEqual(1, i2cbus.sharedBusStats()['transactions']['leds'])
+
+# ------------------------------------------------------------------------------
+if __name__ == '__main__':
+    unittest.main()
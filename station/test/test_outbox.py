@@ -0,0 +1,118 @@
+# ------------------------------------------------------------------------------
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+# ------------------------------------------------------------------------------
+"""
+Unit tests for the durable outbox of messages to the MS.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from station.outbox import Outbox
+
+# ------------------------------------------------------------------------------
+class OutboxTestCase(unittest.TestCase):
+    """
+    Queues messages in an outbox file and delivers them with a fake sender.
+    """
+
+    # --------------------------------------------------------------------------
+    def setUp(self):
+        """Create an empty outbox in a temporary directory."""
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'data', 'outbox.sqlite')
+        self.Target = Outbox(self.path, retryDelay=lambda attempt: 0.01)
+        self.delivered = []
+        self.done = threading.Event()
+
+    # --------------------------------------------------------------------------
+    def tearDown(self):
+        """Close the outbox and remove its file."""
+        self.Target.close()
+        shutil.rmtree(self.dir)
+
+    # --------------------------------------------------------------------------
+    def deliverAfter(self, failures, count):
+        """Return a deliver function that fails the given number of times, then
+        records each message and sets self.done after count deliveries."""
+        state = {'failures' : failures}
+        def deliver(message):
+            if state['failures'] > 0:
+                state['failures'] -= 1
+                raise IOError('MS unreachable')
+            self.delivered.append(message.messageId)
+            if len(self.delivered) == count:
+                self.done.set()
+            return True
+        return deliver
+
+    # --------------------------------------------------------------------------
+    def test_deliversInOrderAfterFailures(self):
+        """Messages are retried until sent, and sent oldest first."""
+        ids = [self.Target.put('submit', 'http://ms/submit', '{}') for i in range(3)]
+        self.Target.start(self.deliverAfter(2, 3))
+        self.assertTrue(self.done.wait(5.0))
+        self.assertEqual(ids, self.delivered)
+        self.Target.stop(5.0)
+        self.assertEqual(0, self.Target.pendingCount())
+
+    # --------------------------------------------------------------------------
+    def test_duplicateIgnored(self):
+        """A message id already in the outbox is not queued again."""
+        self.Target.put('submit', 'http://ms/submit', '{"a": 1}', 'abc')
+        self.Target.put('submit', 'http://ms/submit', '{"a": 2}', 'abc')
+        self.assertEqual(1, self.Target.pendingCount())
+        self.assertEqual('{"a": 1}', self.Target.next().body)
+
+    # --------------------------------------------------------------------------
+    def test_rejectedNotRetried(self):
+        """A message the receiver rejects is dropped from the pending queue."""
+        self.Target.put('submit', 'http://ms/submit', '{}', 'bad')
+        self.Target.put('submit', 'http://ms/submit', '{}', 'good')
+        def deliver(message):
+            self.delivered.append(message.messageId)
+            if message.messageId == 'good':
+                self.done.set()
+            return message.messageId == 'good'
+        self.Target.start(deliver)
+        self.assertTrue(self.done.wait(5.0))
+        self.Target.stop(5.0)
+        self.assertEqual(['bad', 'good'], self.delivered)
+        self.assertIsNone(self.Target.next())
+
+    # --------------------------------------------------------------------------
+    def test_survivesRestart(self):
+        """Unsent messages are still pending when the outbox is reopened."""
+        self.Target.put('submit', 'http://ms/submit', '{}', 'first')
+        self.Target.put('time_expired', 'http://ms/time_expired', '{}', 'second')
+        oldBootId = self.Target.bootId
+        self.Target.close()
+
+        self.Target = Outbox(self.path, retryDelay=lambda attempt: 0.01)
+        self.assertNotEqual(oldBootId, self.Target.bootId)
+        self.assertEqual(2, self.Target.pendingCount())
+        message = self.Target.next()
+        self.assertEqual(('first', 'submit', oldBootId), (message.messageId, message.kind, message.bootId))
+
+        self.Target.start(self.deliverAfter(0, 2))
+        self.assertTrue(self.done.wait(5.0))
+        self.assertEqual(['first', 'second'], self.delivered)
+
+
+# ------------------------------------------------------------------------------
+if __name__ == '__main__':
+    unittest.main()
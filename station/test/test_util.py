@@ -16,8 +16,12 @@
 TODO module description
 """
 
+import threading
 import unittest
 
+from station.util import Future
+from station.util import FutureTimeout
+from station.util import LatencyHistogram
 from station.util import NonBlockingConsole
 
 # ------------------------------------------------------------------------------
@@ -126,6 +130,87 @@ class NonBlockingConsoleTestCase(unittest.TestCase):
         #self.assertEqual(1, output.read())
 
 
+# ------------------------------------------------------------------------------
+class LatencyHistogramTestCase(unittest.TestCase):
+    """
+    Tests the bucket counts and percentile estimates of LatencyHistogram.
+    """
+
+    # --------------------------------------------------------------------------
+    def test_empty(self):
+        """An empty histogram has no percentiles."""
+        target = LatencyHistogram()
+        self.assertIsNone(target.percentile(50))
+        self.assertEqual(0, target.summary()['count'])
+
+    # --------------------------------------------------------------------------
+    def test_record(self):
+        """Latencies land in the right buckets, and errors are kept apart."""
+        target = LatencyHistogram()
+        for latencyMs in (1.0, 5.0, 7.0, 30.0, 20000.0):
+            target.record(latencyMs)
+        target.record(3000.0, ok=False)
+
+        summary = target.summary()
+        self.assertEqual(5, summary['count'])
+        self.assertEqual(1, summary['errors'])
+        self.assertEqual(1.0, summary['min_ms'])
+        self.assertEqual(20000.0, summary['max_ms'])
+        self.assertEqual(('5', 2), tuple(summary['buckets'][0]))
+        self.assertEqual(('10', 1), tuple(summary['buckets'][1]))
+        self.assertEqual(('inf', 1), tuple(summary['buckets'][-1]))
+
+    # --------------------------------------------------------------------------
+    def test_percentile(self):
+        """Percentiles are the upper bound of their bucket, capped at the max."""
+        target = LatencyHistogram()
+        for i in range(90):
+            target.record(8.0)
+        for i in range(10):
+            target.record(400.0)
+        self.assertEqual(10, target.percentile(50))
+        self.assertEqual(10, target.percentile(90))
+        self.assertEqual(400.0, target.percentile(99))
+
+
+# ------------------------------------------------------------------------------
+class FutureTestCase(unittest.TestCase):
+    """
+    Completes Futures from other threads and checks what the waiters see.
+    """
+
+    # --------------------------------------------------------------------------
+    def test_resultFromThread(self):
+        """A result set on another thread wakes the waiter and the callbacks."""
+        target = Future()
+        called = []
+        target.addDoneCallback(lambda f: called.append(f.result()))
+        threading.Timer(0.01, target.setResult, ('True',)).start()
+        self.assertEqual('True', target.result(5.0))
+        self.assertTrue(target.done())
+        self.assertEqual(['True'], called)
+
+    # --------------------------------------------------------------------------
+    def test_firstCompletionWins(self):
+        """Only the first setResult() or setException() has any effect."""
+        target = Future()
+        self.assertTrue(target.setException(ValueError('late')))
+        self.assertFalse(target.setResult('True'))
+        self.assertRaises(ValueError, target.result)
+        self.assertIsInstance(target.exception(), ValueError)
+
+        called = []
+        target.addDoneCallback(called.append)
+        self.assertEqual([target], called)
+
+    # --------------------------------------------------------------------------
+    def test_timeout(self):
+        """Waiting for a Future that is not done times out."""
+        target = Future()
+        self.assertRaises(FutureTimeout, target.result, 0.01)
+        self.assertFalse(target.done())
+
+
 # ------------------------------------------------------------------------------
 if __name__ == '__main__':
     unittest.main()
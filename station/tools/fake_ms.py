@@ -0,0 +1,573 @@
+#!/usr/bin/python
+# ------------------------------------------------------------------------------
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+# ------------------------------------------------------------------------------
+"""
+A stand-in for the Master Server, and a load generator that runs many stations
+in one process against it.
+
+FakeMasterServer implements the MS side of the protocol in
+station/connection.py: it accepts join, leave, submit, time_expired and
+heartbeat messages, and sends start_challenge, post_challenge and reset to
+the stations that have joined.
+
+LoadTest starts N StationLoaders in this process.  Each runs a LoadTestStation
+(defined here) on the station.console hardware module, with its own
+TornadoConnectionManager, listen port and outbox.  Each round, the fake MS
+starts a challenge on every station; a LoadTestStation answers it with
+submitAsync() after a think time, and the fake MS replies that the answer is
+correct, which moves the station to PASSED.  The report gives the latency of
+each step and the throughput.
+
+Usage:
+    python -m station.tools.fake_ms --stations 50 --rounds 5
+    python -m station.tools.fake_ms --serveOnly --port 8080   (just the MS)
+"""
+from __future__ import print_function
+
+from abc import ABCMeta
+from abc import abstractmethod
+import argparse
+from datetime import datetime
+import json
+import logging
+import logging.handlers
+import os
+import shutil
+import tempfile
+from threading import Lock
+from threading import Thread
+from threading import Timer
+from time import sleep
+from time import time
+
+from tornado import gen
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpclient import HTTPError
+from tornado.httpclient import HTTPRequest
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+from tornado.web import Application
+from tornado.web import RequestHandler
+
+from station.interfaces import IStation
+from station.main import StationLoader
+from station.util import Config
+from station.util import Future
+from station.util import LatencyHistogram
+
+PIN = 31415
+
+
+# ------------------------------------------------------------------------------
+class FakeMasterServer(object):
+    """
+    A Master Server that keeps everything in memory.
+
+    The HTTP server and client run on an IOLoop in a thread of their own.
+    The methods that send messages to stations may be called from any
+    thread; they return a station.util.Future of (status, latencyMs).
+    """
+
+    # --------------------------------------------------------------------------
+    def __init__(self, port, onSubmit=None):
+        """Create the server (call start() to run it).
+
+        Args:
+            port (int): the port for the /piservice/... URLs
+            onSubmit (callable): onSubmit(stationId, body, receivedTime) is
+                called on the IOLoop for each new submission
+        """
+        self.port = port
+        self.onSubmit = onSubmit
+        self.stations = {}      # station id -> join message body
+        self.heartbeats = {}    # station id -> last heartbeat body
+        self.submissions = {}   # message id -> submit message body
+        self.counts = dict.fromkeys(('join', 'leave', 'submit', 'duplicate', 'time_expired', 'heartbeat'), 0)
+        self.outboundLatency = LatencyHistogram()  # MS -> station messages
+        self._lock = Lock()
+        self._ioLoop = IOLoop(make_current=False)
+        self._thread = None
+
+    # --------------------------------------------------------------------------
+    @property
+    def url(self):
+        """The base URL of the MS (e.g. for runstation.conf's ms_ip)."""
+        return 'http://127.0.0.1:%d' % (self.port)
+
+    # --------------------------------------------------------------------------
+    def start(self):
+        """Start serving on a thread of its own."""
+        started = Future()
+        self._thread = Thread(target=self.run, args=(started,))
+        self._thread.daemon = True
+        self._thread.start()
+        started.result(5.0)
+
+    # --------------------------------------------------------------------------
+    def run(self, started):
+        """Run the IOLoop until stop() is called (the MS thread)."""
+        self._ioLoop.make_current()
+        self._httpClient = AsyncHTTPClient(max_clients=100)
+        handlerArgs = dict(ms=self)
+        app = Application([
+            (r'/piservice/join/?', JoinHandler, handlerArgs),
+            (r'/piservice/leave/?', LeaveHandler, handlerArgs),
+            (r'/piservice/submit/?', SubmitHandler, handlerArgs),
+            (r'/piservice/time_expired/?', TimeExpiredHandler, handlerArgs),
+            (r'/piservice/heartbeat/?', HeartbeatHandler, handlerArgs),
+        ])
+        server = HTTPServer(app)
+        server.listen(self.port)
+        started.setResult(True)
+        self._ioLoop.start()
+        server.stop()
+        self._httpClient.close()
+
+    # --------------------------------------------------------------------------
+    def stop(self):
+        """Stop serving."""
+        self._ioLoop.add_callback(self._ioLoop.stop)
+        self._thread.join(5.0)
+
+    # --------------------------------------------------------------------------
+    def count(self, kind):
+        with self._lock:
+            self.counts[kind] += 1
+
+    # --------------------------------------------------------------------------
+    def joined(self):
+        """Return the ids of the stations that have joined."""
+        with self._lock:
+            return sorted(self.stations)
+
+    # --------------------------------------------------------------------------
+    def startChallenge(self, stationId, body):
+        """Send start_challenge to a station."""
+        return self.send(stationId, '/start_challenge', body)
+
+    # --------------------------------------------------------------------------
+    def postChallenge(self, stationId, body):
+        """Send post_challenge to a station."""
+        return self.send(stationId, '/post_challenge', body)
+
+    # --------------------------------------------------------------------------
+    def reset(self, stationId):
+        """Send reset to a station."""
+        return self.send(stationId, '/reset/%d' % (PIN), {})
+
+    # --------------------------------------------------------------------------
+    def send(self, stationId, path, body):
+        """Send a message to a station (any thread).
+
+        Returns:
+            A Future of (response status, latency in ms); the status is 599
+            if the station could not be reached
+        """
+        with self._lock:
+            url = self.stations[stationId]['station_url'] + path
+        future = Future()
+        self._ioLoop.add_callback(self.fetch, future, url, body)
+        return future
+
+    # --------------------------------------------------------------------------
+    @gen.coroutine
+    def fetch(self, future, url, body):
+        """POST a message to a station, and complete the future (the MS thread)."""
+        body = dict(body, message_version=0, message_timestamp=timestamp())
+        request = HTTPRequest(url, method='POST', body=json.dumps(body),
+                              headers={'Content-Type' : 'application/json'},
+                              connect_timeout=5.0, request_timeout=10.0)
+        startTime = time()
+        try:
+            response = yield self._httpClient.fetch(request)
+            status = response.code
+        except HTTPError, e:
+            status = e.code
+        except Exception, e:
+            logger.warning('Sending to %s failed: %s' % (url, e))
+            status = 599
+        latencyMs = (time() - startTime) * 1000.0
+        self.outboundLatency.record(latencyMs, ok=status < 500)
+        future.setResult((status, latencyMs))
+
+    # --------------------------------------------------------------------------
+    def summary(self):
+        """Return the message counts and the outbound latency as a dict."""
+        with self._lock:
+            return {
+                     'stations'         : len(self.stations),
+                     'counts'           : dict(self.counts),
+                     'outbound_latency' : self.outboundLatency.summary(),
+                   }
+
+
+# ------------------------------------------------------------------------------
+class MsHandler(RequestHandler):
+    """
+    Base class of the fake MS request handlers.
+    """
+    __metaclass__ = ABCMeta
+
+    def initialize(self, ms):
+        self.ms = ms
+
+    def post(self):
+        try:
+            body = json.loads(self.request.body)
+        except ValueError:
+            self.set_status(400)
+            self.finish({'error' : 'body is not JSON'})
+            return
+        self.finish(self.handle(body))
+
+    @abstractmethod
+    def handle(self, body):
+        """Handle the message body; return the reply body."""
+        pass
+
+# ------------------------------------------------------------------------------
+class JoinHandler(MsHandler):
+    def handle(self, body):
+        with self.ms._lock:
+            self.ms.stations[body['station_id']] = body
+        self.ms.count('join')
+        return {'station_id' : body['station_id']}
+
+# ------------------------------------------------------------------------------
+class LeaveHandler(MsHandler):
+    def handle(self, body):
+        with self.ms._lock:
+            self.ms.stations.pop(body['station_id'], None)
+        self.ms.count('leave')
+        return {}
+
+# ------------------------------------------------------------------------------
+class SubmitHandler(MsHandler):
+    def handle(self, body):
+        messageId = body.get('message_id')
+        with self.ms._lock:
+            duplicate = messageId is not None and messageId in self.ms.submissions
+            if not duplicate:
+                self.ms.submissions[messageId or len(self.ms.submissions)] = body
+        self.ms.count('duplicate' if duplicate else 'submit')
+        if not duplicate and self.ms.onSubmit:
+            self.ms.onSubmit(body['station_id'], body, time())
+        return {
+                 'message_version'    : 0,
+                 'message_timestamp'  : timestamp(),
+                 'challenge_complete' : str(body.get('is_correct')),
+                 'theatric_delay_ms'  : 0,
+               }
+
+# ------------------------------------------------------------------------------
+class TimeExpiredHandler(MsHandler):
+    def handle(self, body):
+        self.ms.count('time_expired')
+        return {}
+
+# ------------------------------------------------------------------------------
+class HeartbeatHandler(MsHandler):
+    def handle(self, body):
+        with self.ms._lock:
+            self.ms.heartbeats[body['station_id']] = body
+        self.ms.count('heartbeat')
+        return {}
+
+
+# ------------------------------------------------------------------------------
+class LoadTestStation(IStation):
+    """
+    A station that answers each challenge by itself, for load tests.
+
+    start_challenge must carry a team_name.  After ThinkSec, the station
+    submits the team name as its answer, marked correct.  The result (PASSED
+    or FAILED) is reported to config.OnResult(name, state, args).
+    """
+
+    # --------------------------------------------------------------------------
+    def __init__(self, config, hwModule):
+        """Create the station on the hardware module's Display (if any)."""
+        self._name = config.Name
+        self._thinkSec = config.ThinkSec
+        self._onResult = config.OnResult
+        self._display = hwModule.Display(config.Display) if hwModule else None
+        self.ConnectionManager = None
+
+    @property
+    def stationTypeId(self):
+        return "LOAD"
+
+    def start(self):
+        self.show('Starting')
+
+    def stop(self, signal):
+        self.show('Stopping')
+
+    def onReady(self):
+        self.show('Ready')
+
+    def onProcessing(self, args):
+        teamName = args['team_name']
+        self.show(teamName)
+        Timer(self._thinkSec, self.submit, (teamName,)).start()
+
+    def submit(self, teamName):
+        self.ConnectionManager.submitAsync(candidateAnswer=teamName,
+                                           isCorrect="True",
+                                           failMessage="")
+
+    def onProcessing2(self, args):
+        self.show('Processing2')
+
+    def onProcessingCompleted(self, args):
+        self.show('Completed')
+
+    def onFailed(self, args):
+        self.show('Failed')
+        self._onResult(self._name, 'FAILED', args)
+
+    def onPassed(self, args):
+        self.show('Passed')
+        self._onResult(self._name, 'PASSED', args)
+
+    def onUnexpectedState(self, value):
+        logger.critical('LOAD station %s transitioned to unexpected state %s' % (self._name, value))
+
+    def show(self, text):
+        if self._display:
+            self._display.setLine1Text(self._name)
+            self._display.setLine2Text(text)
+
+
+# ------------------------------------------------------------------------------
+class LoadTest(object):
+    """
+    Runs N stations in this process against a FakeMasterServer.
+    """
+
+    # --------------------------------------------------------------------------
+    def __init__(self, count, msPort, basePort, thinkSec, hardwareModule):
+        self._count = count
+        self._basePort = basePort
+        self._thinkSec = thinkSec
+        self._hardwareModule = hardwareModule
+        self._dataDir = tempfile.mkdtemp(prefix='fake_ms.')
+        self._loaders = []
+        self._lock = Lock()
+        self._challenges = {}  # team name -> dict of times
+        self.ms = FakeMasterServer(msPort, onSubmit=self.submitted)
+        self.submitLatency = LatencyHistogram()     # start_challenge sent -> submit received, less think time
+        self.endToEndLatency = LatencyHistogram()   # start_challenge sent -> station PASSED
+
+    # --------------------------------------------------------------------------
+    def stationConfig(self, index):
+        """Return the runstation.conf Config for station number index."""
+        name = 'load%02d' % (index + 1)
+        s = Config()
+        s.ConnectionModuleName = 'station.connection'
+        s.HardwareModuleName = self._hardwareModule
+        s.StationType = 'station.tools.fake_ms'
+        s.StationClassName = 'LoadTestStation'
+        s.ConnectionManagerClassName = 'TornadoConnectionManager'
+
+        c = s.ConnectionManager = Config()
+        c.StationId = name
+        c.NetInterface = 'lo'
+        c.ListenPort = self._basePort + index
+        c.JoinUrl = self.ms.url + '/piservice/join/'
+        c.LeaveUrl = self.ms.url + '/piservice/leave/'
+        c.TimeExpiredUrl = self.ms.url + '/piservice/time_expired/'
+        c.SubmitUrl = self.ms.url + '/piservice/submit/'
+        c.HeartbeatUrl = self.ms.url + '/piservice/heartbeat/'
+        c.ArriveUrl = self.ms.url + '/piservice/start_challenge/' + name + '/'
+        c.DockUrl = self.ms.url + '/piservice/dock/' + name + '/'
+        c.LatchUrl = self.ms.url + '/piservice/latch/' + name + '/'
+        c.OutboxPath = os.path.join(self._dataDir, 'outbox-' + name + '.sqlite')
+        c.ConnectionCheckSec = 1.0
+        c.HeartbeatSec = 5.0
+        c.ResetUrlRule = '/rpi/reset/<int:pin>'
+        c.StartChallengeUrlRule = '/rpi/start_challenge'
+        c.PostChallengeUrlRule = '/rpi/post_challenge'
+        c.ShutdownUrlRule = '/rpi/shutdown/<int:pin>'
+        c.StatusUrlRule = '/rpi/status'
+        c.ResetPIN = PIN
+        c.ShutdownPIN = PIN
+        c.ReallyShutdown = False
+
+        t = s.StationTypeConfig = Config()
+        t.Name = name
+        t.ThinkSec = self._thinkSec
+        t.OnResult = self.finished
+        t.Display = Config()
+        t.Display.lineWidth = 16
+        return s
+
+    # --------------------------------------------------------------------------
+    def startStations(self, timeoutSec=30.0):
+        """Start the fake MS and the stations, and wait for them all to join.
+
+        Returns:
+            The number of stations that joined
+        """
+        self.ms.start()
+        for i in range(self._count):
+            loader = StationLoader(self.stationConfig(i))
+            thread = Thread(target=loader.start)
+            thread.daemon = True
+            thread.start()
+            self._loaders.append(loader)
+
+        deadline = time() + timeoutSec
+        while len(self.ms.joined()) < self._count and time() < deadline:
+            sleep(0.1)
+        return len(self.ms.joined())
+
+    # --------------------------------------------------------------------------
+    def runRound(self, roundNumber, timeoutSec):
+        """Start a challenge on every station and wait for the results.
+
+        Returns:
+            The number of challenges that finished in time
+        """
+        futures = []
+        for stationId in self.ms.joined():
+            teamName = 'team-%s-%d' % (stationId, roundNumber)
+            with self._lock:
+                self._challenges[teamName] = {'start' : time()}
+            futures.append(self.ms.startChallenge(stationId, {'team_name' : teamName}))
+
+        deadline = time() + timeoutSec
+        while time() < deadline:
+            with self._lock:
+                pending = [c for c in self._challenges.values() if 'passed' not in c]
+            if not pending:
+                break
+            sleep(0.05)
+        for future in futures:
+            future.result(max(0.0, deadline - time()))
+
+        for stationId in self.ms.joined():
+            self.ms.reset(stationId).result(10.0)
+        with self._lock:
+            done = len([c for c in self._challenges.values() if 'passed' in c])
+            self._challenges.clear()
+        return done
+
+    # --------------------------------------------------------------------------
+    def submitted(self, stationId, body, receivedTime):
+        """Record a submission received by the fake MS (onSubmit callback)."""
+        with self._lock:
+            challenge = self._challenges.get(body.get('candidate_answer'))
+            if challenge is not None:
+                challenge['submit'] = receivedTime
+                self.submitLatency.record((receivedTime - challenge['start'] - self._thinkSec) * 1000.0)
+
+    # --------------------------------------------------------------------------
+    def finished(self, name, state, args):
+        """Record a station result (LoadTestStation OnResult callback)."""
+        now = time()
+        with self._lock:
+            for teamName, challenge in self._challenges.items():
+                if teamName.startswith('team-%s-' % (name)) and 'passed' not in challenge:
+                    challenge['passed'] = now
+                    self.endToEndLatency.record((now - challenge['start']) * 1000.0, ok=(state == 'PASSED'))
+
+    # --------------------------------------------------------------------------
+    def stopStations(self):
+        """Stop the stations (they send leave) and the fake MS."""
+        for loader in self._loaders:
+            loader.stop(None)
+        deadline = time() + 10.0
+        while self.ms.joined() and time() < deadline:
+            sleep(0.1)
+        for loader in self._loaders:
+            loader._connectionManager.__exit__(None, None, None)  # stop its threads
+        self.ms.stop()
+        shutil.rmtree(self._dataDir, ignore_errors=True)
+
+
+# ------------------------------------------------------------------------------
+def timestamp():
+    """The current time as "YYYY-MM-DD HH:MM:SS", as in the MS messages."""
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+# ------------------------------------------------------------------------------
+def formatLatency(title, summary):
+    """Format a LatencyHistogram summary as one report line."""
+    if not summary['count']:
+        return '%-30s none (%d errors)' % (title, summary['errors'])
+    return '%-30s n=%-5d mean=%7.1f p50<=%7.1f p90<=%7.1f p99<=%7.1f max=%7.1f ms  errors=%d' % (
+        title, summary['count'], summary['mean_ms'], summary['p50_ms'],
+        summary['p90_ms'], summary['p99_ms'], summary['max_ms'], summary['errors'])
+
+# ------------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description='Run a fake Master Server, and optionally load-test stations against it.')
+    parser.add_argument('--port', type=int, default=18080, help='fake MS port (default: 18080)')
+    parser.add_argument('--serveOnly', action='store_true', help='just run the fake MS until interrupted')
+    parser.add_argument('--stations', type=int, default=10, help='number of stations to run (default: 10)')
+    parser.add_argument('--basePort', type=int, default=15000, help='listen port of the first station (default: 15000)')
+    parser.add_argument('--rounds', type=int, default=3, help='challenges per station (default: 3)')
+    parser.add_argument('--thinkSec', type=float, default=0.5, help='time a station takes to answer (default: 0.5)')
+    parser.add_argument('--roundTimeoutSec', type=float, default=30.0, help='time allowed for a round (default: 30)')
+    parser.add_argument('--hardware', default='station.console', help='station hardware module (default: station.console)')
+    args = parser.parse_args()
+
+    if args.serveOnly:
+        ms = FakeMasterServer(args.port)
+        ms.start()
+        print('Fake MS listening on', ms.url)
+        try:
+            while True:
+                sleep(10)
+                print(json.dumps(ms.summary()['counts']))
+        except KeyboardInterrupt:
+            ms.stop()
+        return
+
+    test = LoadTest(args.stations, args.port, args.basePort, args.thinkSec, args.hardware)
+    joined = test.startStations()
+    print('%d of %d stations joined' % (joined, args.stations))
+
+    startTime = time()
+    completed = 0
+    for roundNumber in range(args.rounds):
+        done = test.runRound(roundNumber, args.roundTimeoutSec)
+        completed += done
+        print('round %d: %d of %d challenges completed' % (roundNumber + 1, done, joined))
+    elapsed = time() - startTime
+
+    test.stopStations()
+    summary = test.ms.summary()
+    print()
+    print('Stations %d, rounds %d, think time %.2f s' % (args.stations, args.rounds, args.thinkSec))
+    print('Completed %d of %d challenges in %.1f s: %.1f challenges/s' % (
+        completed, joined * args.rounds, elapsed, completed / elapsed if elapsed else 0.0))
+    print('MS messages received: %s' % (json.dumps(summary['counts'], sort_keys=True)))
+    print(formatLatency('MS -> station request', summary['outbound_latency']))
+    print(formatLatency('challenge -> submit (- think)', test.submitLatency.summary()))
+    print(formatLatency('challenge -> PASSED', test.endToEndLatency.summary()))
+
+
+# ------------------------------------------------------------------------------
+# Module Initialization
+# ------------------------------------------------------------------------------
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.handlers.SysLogHandler(address = '/dev/log')
+logger.addHandler(handler)
+
+if __name__ == '__main__':
+    main()
@@ -376,18 +376,12 @@ class Station(IStation):
                 if elapsed_time < self._goTimeBeforeFinalLight or self._nextLed == 15:
                     # The series of LEDs '0' to ending with last light '15'
                     if self._nextLed < 16 and self._ledTimes[str(self._nextLed)] <= elapsed_time:
-                        # time to set it off
-                        # self._leds[str(self._nextLed)].fade(100,0,self._ledDecay)
-                        self._leds[str(self._nextLed)].turnOn()
+                        # time to set it off; the LED bank runs the fade at a
+                        # fixed frame rate so it appears a constant velocity
+                        self._leds[str(self._nextLed)].fade(100,0,self._ledDecay)
                         #logger.debug('nextLED = %s nextTime = %s elapsed = %s' %(self._nextLed, self._ledTimes[str(self._nextLed)], elapsed_time) )
                         self._nextLed = self._nextLed + 1
 
-                #time.sleep(0.001)
-                if self._nextLed >= 0:
-                  # Yes this could be optimized down but leaving needless calls for consistent timing
-                  # this is to ensure it appears a constant velocity
-                  for j in range(15, -1, -1):
-                    self._leds[str(j)].decay()
                 #logger.debug('elapsed = %s' %(elapsed_time) )
 
                 if windowIsOpenNotReported and elapsed_time > self._minTimeForFlashStart:
@@ -650,21 +644,9 @@ class Station(IStation):
           # Have the green lights go in reverse back to the start at minimum
           resetStepInSeconds = 3.0 / 15.0 # TODO change 3 to theatric delay
           for i in range(15, -1, -1):
-            #fade is taking too much cpu with 16 threads so keeping in one loop
-            #self._leds[str(i)].fade(100,0,resetStepInSeconds*2)
-            #time.sleep(resetStepInSeconds)
-            self._leds[str(i)].turnOn()
-            nextStepTime = time.time() + resetStepInSeconds
-            while (time.time() < nextStepTime):
-              # Yes we could tighten this loop but leaving as is so overall timing
-              # is more consistent to stick with idea of constant velocity
-              for j in range(15, -1, -1):
-                self._leds[str(j)].decay()
-                self._leds[str(j)].decay()
-                self._leds[str(j)].decay()
-                self._leds[str(j)].decay()
-                self._leds[str(j)].decay()
-                self._leds[str(j)].decay()
+            # the LED bank animates all the fades from one frame thread
+            self._leds[str(i)].fade(100,0,resetStepInSeconds*2)
+            time.sleep(resetStepInSeconds)
         else:
           # All done so have the main thread go back to waiting state
           self._isRunning = False
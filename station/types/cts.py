@@ -78,6 +78,9 @@ class Station(IStation):
         logger.info('Initializing pushButtonMonitor')
         self._pushButtonMonitor = pushButtonMonitorClass()
         self._pushButtonMonitor.setDevice(self._display._lcd)
+        interruptPin = getattr(config, 'PushButtonInterruptPin', None)
+        if interruptPin is not None:
+            self._pushButtonMonitor.setInterruptPin(interruptPin)
 
         for i in config.PushButtons:
             logger.info('  Setting button {}'.format(i))
@@ -266,8 +269,9 @@ class Station(IStation):
         s = self._combo.toString()
         self._centerOffset = (self._display.lineWidth() - len(s)) // 2  # amount of space before s
         s = "{0:>{width}}".format(s, width=len(s) + self._centerOffset)
-        self._display.setLine2Text(s)
-        self._display.setCursor(1, self._combo.formattedPosition() + self._centerOffset)
+        with self._display.batch():
+            self._display.setLine2Text(s)
+            self._display.setCursor(1, self._combo.formattedPosition() + self._centerOffset)
 
     # --------------------------------------------------------------------------
     def enterState(self, newState):
@@ -583,13 +587,14 @@ class Station(IStation):
         """ onTick callback to be attached to polling loop to animate bg color
             and time message display
         """
-        if self._colorToggle:
-            self._colorToggle.next()
-        
-        if self._timedMsg:
-            if not self._timedMsg.next():
-                self._timedMsg = None
-                self.enterState(self._timedMsgNextState)
+        with self._display.batch():
+            if self._colorToggle:
+                self._colorToggle.next()
+
+            if self._timedMsg:
+                if not self._timedMsg.next():
+                    self._timedMsg = None
+                    self.enterState(self._timedMsgNextState)
         
     # --------------------------------------------------------------------------
     def submitCombination(self):
@@ -603,7 +608,7 @@ class Station(IStation):
         isCorrect = self._combo.isMatch()
         
         logger.info('Submitting combo: {} , match = {}'.format(repr(combo), isCorrect))
-        self.ConnectionManager.submitCtsComboToMS(combo, isCorrect)
+        self.ConnectionManager.submitAsync(combo, str(isCorrect), self._failedText)
     
 
 # ------------------------------------------------------------------------------
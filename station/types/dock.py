@@ -20,13 +20,16 @@ from __future__ import print_function, division
 #import operator
 #import logging
 import logging.handlers
-#import time
-from multiprocessing import Process, Queue
+from time import time
+from threading import Thread
+from multiprocessing import Process
 from collections import namedtuple
 
 from station.interfaces import IStation
+from station.state import State
 from flight_profile.FlightProfile import FlightProfileApp
 from flight_profile.DockSim import FlightParams
+from flight_profile.RenderChannel import RenderChannel
 
 
 # ------------------------------------------------------------------------------
@@ -58,7 +61,9 @@ class Station(IStation):
         self._flightSim.stationCallbackObj = None
         
         self._simProcess = None  # sim graphics will run as a separate process
-        self._simQueue   = None  # main process will pass data to sim process through this queue
+        self._simChannel = None  # commands go to the sim process, and results come back, through this channel
+        self._eventThread = None # receives events from the sim process
+        self.lastLatency = None  # the latency dict from the last FIRST_FRAME event
 
     # --------------------------------------------------------------------------
     @property
@@ -76,16 +81,20 @@ class Station(IStation):
         logger.info('Starting DOCK.')
 
         # Spawn sim process
+        # (the sim reports its result on the channel, and the event thread
+        # changes the state here, in the station process)
         logger.info("ConnectionManager._callback is {}".format(repr(self.ConnectionManager._callback)))
-        self._flightSim.stationCallbackObj = self.ConnectionManager._callback
         self._flightSim.setQrUrls(self.ConnectionManager._arriveUrl,
                                   self.ConnectionManager._dockDockUrl,
                                   self.ConnectionManager._dockLatchUrl)
 
-        if self._simQueue is None:
-            self._simQueue = Queue()
-            self._simProcess = Process(target=self._flightSim.runFromQueue, args=(self._simQueue,))
+        if self._simChannel is None:
+            self._simChannel = RenderChannel()
+            self._simProcess = Process(target=self._flightSim.runFromChannel, args=(self._simChannel,))
             self._simProcess.start()
+            self._eventThread = Thread(target=self._receiveEvents, args=(self._simChannel,))
+            self._eventThread.daemon = True
+            self._eventThread.start()
 
     # --------------------------------------------------------------------------
     def stop(self, signal):
@@ -93,28 +102,65 @@ class Station(IStation):
         logger.info('Received signal "%s". Stopping DOCK.', signal)
 
         # Shutdown sim process
-        if self._simQueue:
-            self._simQueue.put((FlightProfileApp.QUIT_CMD, ""))
+        if self._simChannel:
+            self._simChannel.sendCommand(FlightProfileApp.QUIT_CMD)
             self._simProcess.join()
+            self._eventThread.join()
             self._simProcess = None
-            self._simQueue = None
+            self._simChannel = None
+            self._eventThread = None
+
+    # --------------------------------------------------------------------------
+    def _receiveEvents(self, channel):
+        """ Handle events from the sim process until it stops
+
+        Runs in its own thread in the station process.  The pass/fail result
+        moves the station to the ProcessingCompleted state, and the latency
+        of each command is logged when its first frame is displayed.
+
+        Args:
+            channel: the RenderChannel shared with the sim process
+        """
+        while True:
+            event = channel.pollEvent(1.0)
+            if event is None:
+                if not self._simProcess or not self._simProcess.is_alive():
+                    logger.critical('DOCK sim process exited unexpectedly')
+                    return
+                continue
+
+            kind, data = event
+            if kind == RenderChannel.RESULT:
+                callback = self.ConnectionManager._callback
+                callback.args = data
+                callback.State = State.PROCESSING_COMPLETED
+            elif kind == RenderChannel.FIRST_FRAME:
+                self.lastLatency = data
+                logger.info('DOCK {} command to first frame: {:.1f} ms (request to sim {:.1f} ms, sim to display {:.1f} ms)'.format(
+                            data["cmd"], data["totalMs"], data["queueMs"], data["renderMs"]))
+            elif kind == RenderChannel.STARTED:
+                logger.info('DOCK sim display started')
+            elif kind == RenderChannel.STOPPED:
+                logger.info('DOCK sim display stopped')
+                return
 
     # --------------------------------------------------------------------------
     def onReady(self):
         """ Put the application in its initial starting state """
         logger.info('DOCK transitioned to Ready state.')
-        if self._simQueue:
-            self._simQueue.put((FlightProfileApp.READY_CMD, ""))
+        if self._simChannel:
+            self._simChannel.sendCommand(FlightProfileApp.READY_CMD)
 
     # --------------------------------------------------------------------------
     def onProcessing(self, args):
         """ Accept parameters to run the dock simulation, and start the sim. """
+        tRequest = time()
         logger.info('DOCK transitioned to Processing state with args {}.'.format(repr(args)))
-        if self._simQueue:
+        if self._simChannel:
             if "kiosk_text" in args:
-                self._simQueue.put((FlightProfileApp.KIOSK_CMD, args["kiosk_text"]))
+                self._simChannel.sendCommand(FlightProfileApp.KIOSK_CMD, args["kiosk_text"], tRequest)
             else:
-                self._simQueue.put((FlightProfileApp.WELCOME_CMD, args["team_name"]))
+                self._simChannel.sendCommand(FlightProfileApp.WELCOME_CMD, args["team_name"], tRequest)
 
     # --------------------------------------------------------------------------
     def onProcessing2(self, args):
@@ -124,9 +170,10 @@ class Station(IStation):
             a namedtuple containing all the flight parameters
             TODO: list the flight parameters
         """
+        tRequest = time()  # called from the post_challenge handler
         logger.info('DOCK transitioned to Processing2 state.' )
 
-        if self._simQueue:
+        if self._simChannel:
             flightProfile = FlightParams(tAft=float(args.t_aft),
                                          tCoast=float(args.t_coast),
                                          tFore=float(args.t_fore),
@@ -140,14 +187,14 @@ class Station(IStation):
                                          vInit=float(args.v_init),
                                          tSim=int(args.t_sim),
                                         )
-            self._simQueue.put((FlightProfileApp.RUN_CMD, flightProfile))
+            self._simChannel.sendCommand(FlightProfileApp.RUN_CMD, flightProfile, tRequest)
      
     # --------------------------------------------------------------------------
     def onProcessingCompleted(self, args):
         """Transition station to the ProcessingCompleted state
  
-        This state will be entered when the graphics thread sets the state
-        to ProcessingCompleted.
+        This state will be entered when the sim process sends its result,
+        and is called from the event thread in the station process.
          
         Args:
             isCorrect
@@ -158,9 +205,9 @@ class Station(IStation):
         logger.info('TODO implement method body.' )
         isCorrect,elapsedTimeSec,failMsg = args
         logger.info('Submitting isCorrect: {} , simTimeSec: {}, failMsg: {}'.format(isCorrect, elapsedTimeSec, failMsg))
-        self.ConnectionManager.submit(candidateAnswer=elapsedTimeSec,
-                                      isCorrect=isCorrect,
-                                      failMessage=failMsg)
+        self.ConnectionManager.submitAsync(candidateAnswer=elapsedTimeSec,
+                                           isCorrect=isCorrect,
+                                           failMessage=failMsg)
         logger.debug('Submitted')
 
     # --------------------------------------------------------------------------
@@ -82,6 +82,9 @@ class Station(IStation):
         logger.info('Initializing pushButtonMonitor')
         self._pushButtonMonitor = pushButtonMonitorClass()
         self._pushButtonMonitor.setDevice(self._display._lcd)
+        interruptPin = getattr(config, 'PushButtonInterruptPin', None)
+        if interruptPin is not None:
+            self._pushButtonMonitor.setInterruptPin(interruptPin)
 
         for i in config.PushButtons:
             logger.info('  Setting button {}'.format(i))
@@ -199,12 +202,13 @@ class Station(IStation):
             lines[index] = "{0:>{width}}".format(lines[index], 
                                                  width=len(lines[index]) + centerOffset[index])
 
-        self._display.setLine1Text(lines[0])
-        self._display.setLine2Text(lines[1])
+        with self._display.batch():
+            self._display.setLine1Text(lines[0])
+            self._display.setLine2Text(lines[1])
 
-        curLine = self._angle.positionLine()
-        self._display.setCursor(curLine,
-                                self._angle.formattedPosition() + centerOffset[curLine])
+            curLine = self._angle.positionLine()
+            self._display.setCursor(curLine,
+                                    self._angle.formattedPosition() + centerOffset[curLine])
 
     # --------------------------------------------------------------------------
     def enterState(self, newState):
@@ -511,13 +515,14 @@ class Station(IStation):
         """ onTick callback to be attached to polling loop to animate bg color
             and time message display
         """
-        if self._colorToggle:
-            self._colorToggle.next()
-        
-        if self._timedMsg:
-            if not self._timedMsg.next():
-                self._timedMsg = None
-                self.enterState(self._timedMsgNextState)
+        with self._display.batch():
+            if self._colorToggle:
+                self._colorToggle.next()
+
+            if self._timedMsg:
+                if not self._timedMsg.next():
+                    self._timedMsg = None
+                    self.enterState(self._timedMsgNextState)
         
     # --------------------------------------------------------------------------
     def submitAngles(self):
@@ -531,7 +536,7 @@ class Station(IStation):
         isCorrect = self._angle.isMatch()
         
         logger.info('Submitting angle: {} , match = {}'.format(repr(angle), isCorrect))
-        self.ConnectionManager.submit(angle, str(isCorrect), self._failedText)
+        self.ConnectionManager.submitAsync(angle, str(isCorrect), self._failedText)
 
 
 # ------------------------------------------------------------------------------
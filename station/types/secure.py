@@ -16,6 +16,7 @@
 Provides the definitions needed for the SECURE station type.
 """
 
+from functools import partial
 from multiprocessing import Process
 import logging
 import logging.handlers
@@ -36,6 +37,8 @@ import ImageFont
 sys.path.append('/user/lib/python2.7/dist-packages')
 import pygame
 
+from station.i2cbus import I2cBus
+from station.i2cbus import sharedBus
 from station.interfaces import IStation
 from station.state import State  # TODO: get rid of this dependency!!
 
@@ -240,9 +243,9 @@ class Station(IStation):
 
         logger.debug('Submitted')
         logger.info('Submitting code: {} , match = {}, {}'.format(repr(code), isCorrect, error_msg))
-        self.ConnectionManager.submit(candidateAnswer=code,
-                                      isCorrect=isCorrect,
-                                      failMessage=error_msg)
+        self.ConnectionManager.submitAsync(candidateAnswer=code,
+                                           isCorrect=isCorrect,
+                                           failMessage=error_msg)
 
      
 
@@ -349,16 +352,8 @@ class LCDdisplay:
         # driver for 128x32 OLED display via I2C interface
         # self._disp = Adafruit_SSD1306.SSD1306_128_32(rst=self._RST)
         self._disp = Adafruit_SSD1306.SSD1306_128_64(rst=self._RST, i2c_address=self._address)
-        # Initialize the didplay library.
-        self._disp.begin()
-        # Non-Invert display
-        self._disp.command(0xA6)
-        # Invert display
-        #self._disp.command(0xA7)
-
-        # Clear display.
-        self._disp.clear()
-        self._disp.display()
+        self._bus = sharedBus()
+        self._bus.call(I2cBus.DISPLAY, self._begin)
 
         # Create blank image for drawing.
         # Make sure to create image with mode '1' for 1-bit color.
@@ -396,9 +391,26 @@ class LCDdisplay:
         self._draw.text((x, self._top+40), Line2,  font=self._font_bot, fill=255)
 
         # Display image.
+        self._bus.post(I2cBus.DISPLAY, partial(self._show, self._image.rotate(180)), key=self)
+
+    def _begin(self):
+        """Initializes and clears the display (runs on the I2C bus thread)."""
+        # Initialize the didplay library.
+        self._disp.begin()
+        # Non-Invert display
+        self._disp.command(0xA6)
+        # Invert display
+        #self._disp.command(0xA7)
+
+        # Clear display.
+        self._disp.clear()
+        self._disp.display()
+
+    def _show(self, image):
+        """Sends an image to the display (runs on the I2C bus thread)."""
         self._disp.clear()
         self._disp.display()
-        self._disp.image(self._image.rotate(180))
+        self._disp.image(image)
         self._disp.display()
 
 
@@ -23,6 +23,7 @@ import select
 import socket
 import struct
 import sys
+import threading
 # TODO There should be no problem with termios on a non-Pi
 import termios  # @UnresolvedImport when not on R-Pi
 import tty
@@ -145,6 +146,196 @@ def get_ip_address(ifname):
     logger.info('IP address of interface %s is %s.' % (ifname, result))
     return result
 
+# ------------------------------------------------------------------------------
+class LatencyHistogram(object):
+    """
+    Counts request latencies in fixed buckets.
+
+    Bucket i counts the latencies that are at most BUCKETS_MS[i] and more than
+    the bucket before it; the last bucket counts everything slower.  Failed
+    requests are counted separately and are not in the buckets.  The methods
+    may be called from any thread.
+    """
+
+    BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    # --------------------------------------------------------------------------
+    def __init__(self):
+        """Create an empty histogram."""
+        self._lock = threading.Lock()
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.count = 0
+        self.errors = 0
+        self.totalMs = 0.0
+        self.minMs = None
+        self.maxMs = None
+
+    # --------------------------------------------------------------------------
+    def record(self, latencyMs, ok=True):
+        """Add one request to the histogram.
+
+        Args:
+            latencyMs (float): how long the request took, in ms
+            ok (bool): False if the request failed
+        """
+        with self._lock:
+            if not ok:
+                self.errors += 1
+                return
+            i = 0
+            while i < len(self.BUCKETS_MS) and latencyMs > self.BUCKETS_MS[i]:
+                i += 1
+            self.counts[i] += 1
+            self.count += 1
+            self.totalMs += latencyMs
+            self.minMs = latencyMs if self.minMs is None else min(self.minMs, latencyMs)
+            self.maxMs = latencyMs if self.maxMs is None else max(self.maxMs, latencyMs)
+
+    # --------------------------------------------------------------------------
+    def percentile(self, pct):
+        """Estimate a latency percentile from the buckets.
+
+        Args:
+            pct (float): the percentile, 0-100
+        Returns:
+            The upper bound of the bucket holding the percentile (or the
+            maximum latency, if that is smaller), in ms; None if empty
+        """
+        with self._lock:
+            if not self.count:
+                return None
+            rank = max(1, int(-(-pct * self.count // 100)))
+            seen = 0
+            for i, n in enumerate(self.counts):
+                seen += n
+                if seen >= rank:
+                    break
+            if i < len(self.BUCKETS_MS):
+                return min(self.BUCKETS_MS[i], self.maxMs)
+            return self.maxMs
+
+    # --------------------------------------------------------------------------
+    def summary(self):
+        """Return the histogram as a dict that can be logged or sent as JSON."""
+        p50, p90, p99 = [self.percentile(p) for p in (50, 90, 99)]
+        with self._lock:
+            return {
+                'count'   : self.count,
+                'errors'  : self.errors,
+                'mean_ms' : self.totalMs / self.count if self.count else None,
+                'min_ms'  : self.minMs,
+                'max_ms'  : self.maxMs,
+                'p50_ms'  : p50,
+                'p90_ms'  : p90,
+                'p99_ms'  : p99,
+                'buckets' : list(zip([str(b) for b in self.BUCKETS_MS] + ['inf'], self.counts)),
+            }
+
+# ------------------------------------------------------------------------------
+class FutureTimeout(Exception):
+    """
+    Raised by Future.result() when the result is not ready in time.
+    """
+    pass
+
+# ------------------------------------------------------------------------------
+class Future(object):
+    """
+    The result of an operation that finishes on another thread.
+
+    The thread doing the work calls setResult() or setException() once; any
+    thread can wait for the result, or register a callback to be called with
+    the Future when it is done.  Callbacks run on the thread that completes
+    the Future (or immediately, if it is already done), so they should be
+    quick.
+    """
+
+    # --------------------------------------------------------------------------
+    def __init__(self):
+        """Create a Future that is not done."""
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+
+    # --------------------------------------------------------------------------
+    def done(self):
+        """Return True if the Future has a result or an exception."""
+        return self._done.is_set()
+
+    # --------------------------------------------------------------------------
+    def result(self, timeoutSec=None):
+        """Wait for the result.
+
+        Args:
+            timeoutSec (float): how long to wait (default: forever)
+        Returns:
+            The value passed to setResult()
+        Raises:
+            FutureTimeout: if the Future is not done in time
+            Exception: the exception passed to setException()
+        """
+        if not self._done.wait(timeoutSec):
+            raise FutureTimeout('Result not ready after %s sec' % (timeoutSec))
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    # --------------------------------------------------------------------------
+    def exception(self, timeoutSec=None):
+        """Wait for the Future, and return its exception (None if it succeeded).
+
+        Raises:
+            FutureTimeout: if the Future is not done in time
+        """
+        if not self._done.wait(timeoutSec):
+            raise FutureTimeout('Result not ready after %s sec' % (timeoutSec))
+        return self._exception
+
+    # --------------------------------------------------------------------------
+    def addDoneCallback(self, callback):
+        """Call callback(future) when the Future is done."""
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    # --------------------------------------------------------------------------
+    def setResult(self, result):
+        """Complete the Future with a result.
+
+        Returns:
+            False if the Future was already done (and is unchanged)
+        """
+        return self._complete(result, None)
+
+    # --------------------------------------------------------------------------
+    def setException(self, exception):
+        """Complete the Future with an exception.
+
+        Returns:
+            False if the Future was already done (and is unchanged)
+        """
+        return self._complete(None, exception)
+
+    # --------------------------------------------------------------------------
+    def _complete(self, result, exception):
+        with self._lock:
+            if self._done.is_set():
+                return False
+            self._result = result
+            self._exception = exception
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception:
+                logger.exception('Future callback failed')
+        return True
+
 # ------------------------------------------------------------------------------
 class NonBlockingConsole(object):
     """